@@ -0,0 +1,322 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+import socketio
+from aiohttp import web
+
+import Utils
+from Utils import logger, ScanProgress, current_cancel_event, current_deadline, impactedFiles
+from AsyncUtils import (
+    llm_client, buildSnapshotAsync, fullRepoAnalysisAsync, incrementalRepoAnalysisAsync,
+    analyzeRepositoryForContextAndReportAsync, analyzeASetOfFilesForContextAndReportAsync,
+    analyzeRepositoryForContextAndComplianceReportAsync, analyzeASetOfFilesForContextAndComplianceReportAsync,
+    analyzeRepositoryForContextAndCombinedReportAsync, analyzeCommitRangeAsync, loadRepoManifestAsync
+)
+from GitRepos import error_sink, create_directory, clone_private_repo, pull_latest_commit, getLatestCommitAffectedFiles, fetch_latest_commits, ensure_commit
+from Jobs import QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED, FINISHED_STATUSES, JOB_TTL_SECONDS, JOB_MAX_WORKERS, reportedCount
+from Metrics import registry, job_seconds, CONTENT_TYPE
+
+# asyncio execution mode of the socket server (SERVER_MODE=async python main.py).
+# Every check runs as a task on one event loop, with the same events and job
+# semantics as the threaded server. Git operations (including reading files of a
+# commit range from the object database) and Bandit still block, so they are awaited
+# through asyncio.to_thread.
+
+sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins="*")
+app = web.Application()
+sio.attach(app)
+
+jobs = {}
+# Like the threaded server's worker pool, at most JOB_MAX_WORKERS checks run at once; the others stay queued
+job_slots = asyncio.Semaphore(JOB_MAX_WORKERS)
+# The event loop serving the app, for emits made from worker threads
+server_loop = [None]
+
+
+async def home(request):
+    return web.json_response({"message": "Hello from Flask on Docker!"})
+
+app.router.add_get('/', home)
+
+
+async def llmStats(request):
+    return web.json_response(Utils.llm_client.stats())
+
+app.router.add_get('/llmStats', llmStats)
+
+
+async def metrics(request):
+    return web.Response(body=registry.render(), headers={'Content-Type': CONTENT_TYPE})
+
+app.router.add_get('/metrics', metrics)
+
+
+def activeJobs():
+    return [('scanner_active_jobs', 'gauge', 'Jobs running in this process, by job type', {
+        (('type', job_type),): sum(1 for job in list(jobs.values()) if job['type'] == job_type and job['status'] == RUNNING)
+        for job_type in RUNNERS
+    })]
+
+
+async def runSetup(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch) = list(data.values())[:6]
+    await asyncio.to_thread(create_directory, clone_location)
+    await asyncio.to_thread(clone_private_repo, repo_url, clone_location, username, token, branch)
+    update('Repository cloned')
+    return None
+
+
+async def runFullSecurityCheck(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch) = list(data.values())[:6]
+    snapshot = await buildSnapshotAsync(clone_location)
+    repo_analysis = await fullRepoAnalysisAsync(clone_location, snapshot=snapshot)
+    update('Repo analysis complete')
+    return await analyzeRepositoryForContextAndReportAsync(clone_location, repo_analysis, snapshot=snapshot, progress=progress)
+
+
+async def runCommitSecurityCheck(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch) = list(data.values())[:6]
+    await asyncio.to_thread(pull_latest_commit, clone_location, username, token, branch)
+    affected_files = await asyncio.to_thread(getLatestCommitAffectedFiles, clone_location, branch)
+    snapshot = await buildSnapshotAsync(clone_location)
+    repo_analysis = await incrementalRepoAnalysisAsync(clone_location, snapshot=snapshot)
+    impacted_files = await asyncio.to_thread(impactedFiles, clone_location, affected_files, repo_analysis, snapshot)
+    return await analyzeASetOfFilesForContextAndReportAsync(clone_location, impacted_files, repo_analysis, snapshot=snapshot, progress=progress)
+
+
+async def runFullComplianceCheck(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch, userCompText) = list(data.values())[:7]
+    snapshot = await buildSnapshotAsync(clone_location)
+    repo_analysis = await fullRepoAnalysisAsync(clone_location, snapshot=snapshot)
+    return await analyzeRepositoryForContextAndComplianceReportAsync(clone_location, repo_analysis, userCompText, snapshot=snapshot, progress=progress)
+
+
+async def runCommitComplianceCheck(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch, userCompText) = list(data.values())[:7]
+    await asyncio.to_thread(pull_latest_commit, clone_location, username, token, branch)
+    affected_files = await asyncio.to_thread(getLatestCommitAffectedFiles, clone_location, branch)
+    snapshot = await buildSnapshotAsync(clone_location)
+    repo_analysis = await incrementalRepoAnalysisAsync(clone_location, snapshot=snapshot)
+    impacted_files = await asyncio.to_thread(impactedFiles, clone_location, affected_files, repo_analysis, snapshot)
+    return await analyzeASetOfFilesForContextAndComplianceReportAsync(clone_location, impacted_files, repo_analysis, userCompText, snapshot=snapshot, progress=progress)
+
+
+async def runFullSecurityAndComplianceCheck(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch, userCompText) = list(data.values())[:7]
+    snapshot = await buildSnapshotAsync(clone_location)
+    repo_analysis = await fullRepoAnalysisAsync(clone_location, snapshot=snapshot)
+    update('Repo analysis complete')
+    return await analyzeRepositoryForContextAndCombinedReportAsync(clone_location, repo_analysis, userCompText, snapshot=snapshot, progress=progress)
+
+
+async def runCommitRange(data, progress, update):
+    (repo_url, containerId,clone_location, username, token, branch) = list(data.values())[:6]
+    await asyncio.to_thread(fetch_latest_commits, clone_location, username, token, branch)
+
+    # Defaults: everything pushed since the last analyzed commit, up to the fetched branch
+    head = data.get('head') or f'origin/{branch}'
+    base = data.get('base')
+    if not base:
+        manifest = await loadRepoManifestAsync(clone_location)
+        base = manifest['commit'] if manifest else f'{head}~1'
+    await asyncio.to_thread(ensure_commit, clone_location, base)
+    checks = tuple(data.get('checks') or (('security', 'compliance') if data.get('userCompText') else ('security',)))
+    update(f'Analyzing {base}..{head}')
+    return await analyzeCommitRangeAsync(clone_location, base, head, checks, data.get('userCompText'), progress=progress)
+
+
+RUNNERS = {
+    'setup': runSetup,
+    'checkFullSecurity': runFullSecurityCheck,
+    'checkCommitSecurity': runCommitSecurityCheck,
+    'checkFullCompliance': runFullComplianceCheck,
+    'checkCommitCompliance': runCommitComplianceCheck,
+    'checkFullSecurityAndCompliance': runFullSecurityAndComplianceCheck,
+    'checkCommitRange': runCommitRange,
+}
+
+
+def jobStatus(job):
+    return {key: value for key, value in job.items() if key not in ('params', 'report', 'task', 'cancelEvent')}
+
+
+def emitLater(event, payload, room):
+    # ScanProgress listeners are plain callbacks; the emit itself is scheduled on the loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Called from a worker thread, e.g. a stage of a report pipeline
+        asyncio.run_coroutine_threadsafe(sio.emit(event, payload, to=room), server_loop[0])
+        return
+    loop.create_task(sio.emit(event, payload, to=room))
+
+
+async def runJob(job):
+    try:
+        async with job_slots:
+            await executeJob(job)
+    except asyncio.CancelledError:
+        if job['status'] != QUEUED:
+            raise
+        # Cancelled while waiting for a slot
+        job['status'] = CANCELLED
+        job['finishedAt'] = time.time()
+        await sio.emit('jobStatus', jobStatus(job), to=job['id'])
+        await sio.emit('processComplete', {'jobId': job['id'], 'action': job['type'], 'status': CANCELLED, 'summary': None}, to=job['id'])
+
+
+async def executeJob(job):
+    job_id = job['id']
+    server_loop[0] = asyncio.get_running_loop()
+    job['status'] = RUNNING
+    job['startedAt'] = time.time()
+    await sio.emit('jobStatus', jobStatus(job), to=job_id)
+
+    def update(message):
+        emitLater('processUpdate', {'jobId': job_id, 'message': message}, job_id)
+
+    def reportProgress(snapshot):
+        job['progress'] = snapshot
+        emitLater('progress', dict(snapshot, jobId=job_id, action=job['type']), job_id)
+
+    progress = ScanProgress(
+        on_result=lambda entry: emitLater('fileResult', {'jobId': job_id, 'action': job['type'], 'result': entry}, job_id),
+        on_progress=reportProgress
+    )
+    # The task runs in its own copy of the context, so these only apply to this job
+    current_cancel_event.set(job['cancelEvent'])
+    error_sink.set(lambda message: update(f"Error: {message}"))
+    deadline_seconds = job['params'].get('deadlineSeconds')
+    current_deadline.set((time.monotonic(), float(deadline_seconds)) if deadline_seconds else None)
+
+    report = None
+    try:
+        report = await RUNNERS[job['type']](job['params'], progress, update)
+        job['status'] = CANCELLED if job['cancelEvent'].is_set() else COMPLETED
+    except asyncio.CancelledError:
+        job['status'] = CANCELLED
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        job['status'] = FAILED
+        job['error'] = str(e)
+    job_seconds.observe(time.time() - job['startedAt'], job['type'])
+    job['summary'] = progress.snapshot()
+    job['summary']['reported'] = reportedCount(report)
+    job['summary']['pendingFiles'] = progress.pendingFiles()
+    job['report'] = report
+    job['finishedAt'] = time.time()
+
+    await sio.emit('jobStatus', jobStatus(job), to=job_id)
+    complete = {'jobId': job_id, 'action': job['type'], 'status': job['status'], 'summary': job['summary']}
+    if report is not None and not job['params'].get('stream'):
+        complete['report'] = str(report)
+    if job['status'] == FAILED:
+        complete['error'] = job['error']
+    await sio.emit('processComplete', complete, to=job_id)
+
+
+def pruneJobs():
+    # Finished jobs are kept for JOB_TTL_SECONDS, like the records of the job store
+    expired = time.time() - JOB_TTL_SECONDS
+    for job_id, job in list(jobs.items()):
+        if job['finishedAt'] is not None and job['finishedAt'] < expired:
+            del jobs[job_id]
+
+
+async def submitJob(sid, action, data):
+    pruneJobs()
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'type': action,
+        'params': data,
+        'owner': None if data.get('detach') else sid,
+        'status': QUEUED,
+        'progress': None,
+        'summary': None,
+        'error': None,
+        'createdAt': time.time(),
+        'startedAt': None,
+        'finishedAt': None,
+        'cancelEvent': threading.Event(),
+    }
+    jobs[job_id] = job
+    await sio.enter_room(sid, job_id)
+    await sio.emit('jobSubmitted', {'jobId': job_id, 'action': action}, to=sid)
+    job['task'] = asyncio.get_running_loop().create_task(runJob(job))
+    return {'jobId': job_id}
+
+
+def cancelJob(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['status'] in FINISHED_STATUSES:
+        return False
+    # Running scans stop issuing LLM requests; requests already in flight are abandoned
+    job['cancelEvent'].set()
+    job['task'].cancel()
+    return True
+
+
+def registerCheck(action):
+    async def handler(sid, data):
+        return await submitJob(sid, action, data)
+    sio.on(action, handler)
+
+
+for action in RUNNERS:
+    registerCheck(action)
+
+# Replaces the threaded server's job gauge, whose worker pool doesn't run in this mode
+registry.collector('jobs', activeJobs)
+
+
+@sio.on('jobStatus')
+async def handleJobStatus(sid, data):
+    job = jobs.get(data.get('jobId'))
+    if job is None:
+        await sio.emit('error', {'message': 'Unknown job'}, to=sid)
+        return None
+    await sio.emit('jobStatus', jobStatus(job), to=sid)
+    return jobStatus(job)
+
+
+@sio.on('subscribeJob')
+async def handleSubscribeJob(sid, data):
+    job = jobs.get(data.get('jobId'))
+    if job is None:
+        await sio.emit('error', {'message': 'Unknown job'}, to=sid)
+        return None
+    await sio.enter_room(sid, job['id'])
+    await sio.emit('jobStatus', jobStatus(job), to=sid)
+    return jobStatus(job)
+
+
+@sio.on('cancelJob')
+async def handleCancelJob(sid, data):
+    cancelled = cancelJob(data.get('jobId'))
+    if not cancelled:
+        await sio.emit('error', {'message': 'Job is unknown or already finished'}, to=sid)
+    return {'cancelled': cancelled}
+
+
+@sio.on('disconnect')
+async def handleDisconnect(sid, *args):
+    for job in list(jobs.values()):
+        if job['owner'] == sid:
+            cancelJob(job['id'])
+
+
+async def closeClients(app):
+    await llm_client.close()
+
+app.on_cleanup.append(closeClients)
+
+
+def run(host="0.0.0.0", port=80):
+    web.run_app(app, host=host, port=port)
+
+
+if __name__ == '__main__':
+    run(port=int(os.getenv('PORT', 80)))
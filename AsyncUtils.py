@@ -0,0 +1,642 @@
+import os
+import json
+import time
+import asyncio
+import aiohttp
+import redis
+import redis.asyncio as aioredis
+
+from Utils import (
+    logger, analysis_cache, redis_host, redis_port, LLM_SERVICE_URL, CACHE_PIPELINE_BATCH,
+    RepoSnapshot, CommitSnapshot, FileMapTransport, getCommitBlobs, getCommitRangeChanges, manifestKey,
+    scanCancelled, selectRepoFiles, FMAP_TRANSPORT, LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS, LLM_MAX_RETRIES,
+    IDEMPOTENT_LLM_ENDPOINTS, RETRYABLE_STATUS_CODES, retryDelay,
+    deadlineReached, deadlineRemaining, REPO_ANALYSIS_DEADLINE_SHARE, RISK_FIRST_SCHEDULING, scheduleFiles,
+    needsChunking, splitIntoChunks, mergeChunkResults, chunkTextDigest, encodeJson,
+    impactedFiles, REPORT_ENTRY_VERSION, REPORT_CHECKS, ReportScan
+)
+from Metrics import timed, llm_request_bytes
+import Utils
+
+# asyncio counterparts of the scan functions in Utils. Every LLM request and Redis
+# round-trip is awaited on the event loop instead of holding a thread, so one process
+# can keep thousands of LLM requests in flight. The synchronous functions in Utils
+# remain the default path; results and cache entries are interchangeable between both.
+
+# Upper bound on open connections to the LLM service, shared by every scan of the process
+ASYNC_LLM_MAX_CONNECTIONS = int(os.getenv('ASYNC_LLM_MAX_CONNECTIONS', 1024))
+# Maximum number of files of one scan analyzed at the same time
+ASYNC_SCAN_CONCURRENCY = int(os.getenv('ASYNC_SCAN_CONCURRENCY', 64))
+# Total timeout of a single LLM request, in seconds
+ASYNC_LLM_TIMEOUT_SECONDS = float(os.getenv('ASYNC_LLM_TIMEOUT_SECONDS', 600))
+
+async_redis_client = aioredis.Redis(host=redis_host, port=redis_port)
+
+
+class LLMResponse:
+    """
+    Status and decoded JSON body of an LLM service response.
+    """
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class AsyncLLMClient:
+    """
+    Shared aiohttp session for the LLM service. The session is created lazily on the
+    running event loop and its connector caps the number of open connections.
+
+    Timeouts, retries and the circuit breaker follow Utils.LLMClient; the breaker and
+    the per-endpoint latency are shared with it, so both paths see the same service health.
+    """
+
+    def __init__(self, base_url=LLM_SERVICE_URL, max_connections=ASYNC_LLM_MAX_CONNECTIONS):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.breaker = Utils.llm_client.breaker
+        self.latency = Utils.llm_client.latency
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(
+                    total=ASYNC_LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS, sock_read=LLM_READ_TIMEOUT_SECONDS
+                )
+            )
+        return self._session
+
+    async def post(self, endpoint, json=None, data=None):
+        """
+        Posts to an LLM service endpoint. data is an already encoded JSON body.
+
+        Returns:
+        - response (LLMResponse): Raises aiohttp.ClientError on connection errors and error statuses.
+        """
+        if json is not None:
+            # Encoded once here rather than by aiohttp on every attempt, which also gives its size
+            data, json = encodeJson(json), None
+        headers = {'Content-Type': 'application/json'} if data is not None else None
+        llm_request_bytes.observe(len(data) if data else 0, endpoint)
+        retries = LLM_MAX_RETRIES if endpoint in IDEMPOTENT_LLM_ENDPOINTS else 0
+        for attempt in range(retries + 1):
+            permit = self.breaker.allow()
+            if not permit:
+                raise aiohttp.ClientConnectionError(f"LLM service circuit breaker is open, not calling {endpoint}")
+            try:
+                # A check with a time budget doesn't wait for answers past its deadline
+                remaining = deadlineRemaining()
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError(f"Time budget of the check used up, not calling {endpoint}")
+                timeout = None
+                if remaining is not None:
+                    timeout = aiohttp.ClientTimeout(
+                        total=min(ASYNC_LLM_TIMEOUT_SECONDS, remaining), connect=LLM_CONNECT_TIMEOUT_SECONDS, sock_read=LLM_READ_TIMEOUT_SECONDS
+                    )
+
+                started = time.monotonic()
+                try:
+                    async with self.session().post(f'{self.base_url}/{endpoint}', json=json, data=data, headers=headers, timeout=timeout) as response:
+                        status = response.status
+                        body = await response.json(content_type=None) if status == 200 else None
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.latency.record(endpoint, time.monotonic() - started, error=True)
+                    if deadlineReached():
+                        # Cut short by the check's deadline, which says nothing about the service's health
+                        raise
+                    self.breaker.failed()
+                    if attempt == retries or scanCancelled():
+                        raise
+                    logger.warning(f"{endpoint} request failed ({e!r}), retrying")
+                else:
+                    failed = status in RETRYABLE_STATUS_CODES or status >= 500
+                    self.latency.record(endpoint, time.monotonic() - started, error=failed)
+                    if failed:
+                        self.breaker.failed()
+                    else:
+                        self.breaker.succeeded()
+                    if status not in RETRYABLE_STATUS_CODES or attempt == retries or scanCancelled() or deadlineReached():
+                        if status != 200 and status != 404:
+                            raise aiohttp.ClientResponseError(response.request_info, (), status=status, message=f"{endpoint} returned {status}")
+                        return LLMResponse(status, body)
+                    logger.warning(f"{endpoint} returned {status}, retrying")
+            finally:
+                self.breaker.abandoned(permit)
+
+            self.latency.retried(endpoint)
+            await asyncio.sleep(retryDelay(attempt))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+llm_client = AsyncLLMClient()
+
+
+class AsyncAnalysisCache:
+    """
+    Awaitable front for the shared AnalysisCache: the in-process LRU and the counters
+    are the same as the synchronous path's, Redis is reached through redis.asyncio.
+    Writes are buffered per scan and sent in pipelined batches by flush().
+    """
+
+    def __init__(self, cache, client):
+        self.cache = cache
+        self.client = client
+        self._pending_writes = {}
+
+    async def get_many(self, family, digests, version=None):
+        found, remote = self.cache.local_lookup(family, digests, version)
+        for start in range(0, len(remote), CACHE_PIPELINE_BATCH):
+            batch = remote[start:start + CACHE_PIPELINE_BATCH]
+            try:
+                with timed("redis_mget"):
+                    values = await self.client.mget([self.cache.key(family, digest, version) for digest in batch])
+            except redis.RedisError as e:
+                logger.error(f"Redis batch lookup failed for {family}: {e}")
+                values = [None] * len(batch)
+            found.update(self.cache.remember_fetched(family, batch, values, version))
+        return found
+
+    async def prefetch(self, lookups):
+        return {family: await self.get_many(family, digests) for family, digests in lookups.items()}
+
+    async def set(self, family, digest, value, version=None):
+        self.cache.remember(family, digest, value, version)
+        self._pending_writes[self.cache.key(family, digest, version)] = value
+        if len(self._pending_writes) >= CACHE_PIPELINE_BATCH:
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending_writes = self._pending_writes, {}
+        if not pending:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in pending.items():
+                    pipe.set(key, json.dumps(value))
+                with timed("redis_write"):
+                    await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Redis write failed for {len(pending)} key(s): {e}")
+
+
+async def runConcurrentlyAsync(items, worker, concurrency=None, on_done=None):
+    """
+    Awaits worker(item) for every item with at most `concurrency` running at once.
+
+    Returns:
+    - results (list): The worker results, in the order of items.
+    """
+    semaphore = asyncio.Semaphore(concurrency or ASYNC_SCAN_CONCURRENCY)
+
+    async def run(item):
+        async with semaphore:
+            result = await worker(item)
+        if on_done is not None:
+            on_done(item, result)
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+async def buildSnapshotAsync(repo_path, file_paths=None):
+    """
+    Builds a RepoSnapshot and reads its files off the event loop.
+    """
+    if file_paths is None:
+        snapshot = await asyncio.to_thread(RepoSnapshot.build, repo_path)
+    else:
+        snapshot = RepoSnapshot(repo_path, file_paths)
+    await asyncio.to_thread(snapshot.files, file_paths)
+    return snapshot
+
+
+async def analyzeInChunksAsync(cache, file_path, family, chunks, chunk_digest, request):
+    """
+    asyncio version of Utils.analyzeInChunks; the missing chunks are requested side by side.
+    """
+    # Report digests hash the related files, read through the snapshot, so they are computed off the loop
+    digests = await asyncio.to_thread(lambda: [chunk_digest(first_line, text) for first_line, text in chunks])
+    found = await cache.get_many(family, list(set(digests)))
+    missing = [index for index, digest in enumerate(digests) if digest not in found]
+    logger.info(f"Analyzing {file_path} for {family} in {len(chunks)} chunks, {len(chunks) - len(missing)} cached")
+
+    async def analyze(index):
+        if scanCancelled() or deadlineReached():
+            return None
+        first_line, text = chunks[index]
+        result = await request(first_line, text)
+        if result is not None:
+            await cache.set(family, digests[index], result)
+        return result
+
+    results = await asyncio.gather(*(analyze(index) for index in missing))
+    for index, result in zip(missing, results):
+        if result is None:
+            logger.warning(f"Chunk at line {chunks[index][0]} of {file_path} could not be analyzed for {family}")
+            return None
+        found[digests[index]] = result
+    return mergeChunkResults([(first_line, found[digest]) for (first_line, _), digest in zip(chunks, digests)])
+
+
+async def postRepoCodeRequestAsync(file_path, file_content):
+    data = {'fileName': os.path.basename(file_path), 'filePath': file_path, 'fileContent': file_content}
+    try:
+        response = await llm_client.post('analyze_repo_code', json=data)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Error sending request to the API for {file_path}: {e}")
+        return None
+
+    analysis_result = response.json() if response.status_code == 200 else None
+    if analysis_result is None:
+        logger.warning(f"Failed to analyze {file_path}, Status Code: {response.status_code}")
+    return analysis_result
+
+
+async def analyzeRepoFileAsync(cache, file_path, file_content, content_hash, prefetched):
+    cached_analysis = cache.cache.get("repoAnalysis", content_hash, prefetched=prefetched)
+    if cached_analysis is not None:
+        return cached_analysis
+    # With a time budget, part of it is kept for the report itself
+    if scanCancelled() or deadlineReached(REPO_ANALYSIS_DEADLINE_SHARE):
+        return None
+
+    if needsChunking(file_content):
+        analysis_result = await analyzeInChunksAsync(
+            cache, file_path, "repoAnalysis", splitIntoChunks(file_content), chunkTextDigest,
+            lambda first_line, text: postRepoCodeRequestAsync(file_path, text)
+        )
+    else:
+        analysis_result = await postRepoCodeRequestAsync(file_path, file_content)
+    if analysis_result is not None:
+        await cache.set("repoAnalysis", content_hash, analysis_result)
+    return analysis_result
+
+
+async def analyzeFilesAsync(cache, files):
+    """
+    Runs the repo-code analysis for (path, content, hash) tuples.
+
+    Returns:
+    - analyzed (list): One result (or None) per file, in order.
+    """
+    prefetched = await cache.prefetch({"repoAnalysis": [content_hash for _, _, content_hash in files]})
+
+    async def analyze(source_file):
+        file_path, file_content, content_hash = source_file
+        try:
+            logger.info(f"Analyzing {file_path}...")
+            return await analyzeRepoFileAsync(cache, file_path, file_content, content_hash, prefetched)
+        except Exception as e:
+            logger.error(f"Error reading or analyzing file {file_path}: {e}")
+            return None
+
+    try:
+        return await runConcurrentlyAsync(files, analyze)
+    finally:
+        await cache.flush()
+
+
+async def fullRepoAnalysisAsync(repoPath, snapshot=None):
+    """
+    asyncio version of Utils.fullRepoAnalysis.
+    """
+    if not os.path.isdir(repoPath):
+        logger.error(f"Repository {repoPath} not found!")
+        return {}
+
+    if snapshot is None:
+        snapshot = await buildSnapshotAsync(repoPath)
+    files = await asyncio.to_thread(snapshot.files)
+    if RISK_FIRST_SCHEDULING:
+        # Files are started riskiest first, so an interrupted or time-budgeted scan covers those
+        ordered = await asyncio.to_thread(scheduleFiles, repoPath, [file_path for file_path, _, _ in files], snapshot)
+        files = await asyncio.to_thread(snapshot.files, ordered)
+    analyzed = await analyzeFilesAsync(AsyncAnalysisCache(analysis_cache, async_redis_client), files)
+    return {
+        file_path: analysis_result
+        for (file_path, _, _), analysis_result in zip(files, analyzed) if analysis_result is not None
+    }
+
+
+async def incrementalRepoAnalysisAsync(repoPath, snapshot=None, commit='HEAD', previous_commit='latest'):
+    """
+    asyncio version of Utils.incrementalRepoAnalysis; reads and writes the same manifests.
+    """
+    repo_path = repoPath
+    if not os.path.isdir(repo_path):
+        logger.error(f"Repository {repoPath} not found!")
+        return {}
+
+    in_working_tree = commit == 'HEAD'
+    commit, blobs = await asyncio.to_thread(getCommitBlobs, repo_path, commit)
+    if commit is None:
+        return await fullRepoAnalysisAsync(repo_path)
+
+    cache = AsyncAnalysisCache(analysis_cache, async_redis_client)
+    previous = await loadRepoManifestAsync(repo_path, previous_commit)
+    if previous is None and previous_commit != 'latest':
+        previous = await loadRepoManifestAsync(repo_path)
+    previous = previous or {"commit": None, "files": {}}
+    previous_files = previous["files"]
+
+    unchanged = {}
+    for relative_path, blob_hash in blobs.items():
+        entry = previous_files.get(relative_path)
+        if entry and entry["blob"] == blob_hash and entry["key"] == analysis_cache.key("repoAnalysis", entry["sha256"]):
+            unchanged[relative_path] = entry
+    reused = await cache.get_many("repoAnalysis", [entry["sha256"] for entry in unchanged.values()])
+
+    results = {}
+    manifest_files = {}
+    changed_paths = []
+    for relative_path in blobs:
+        entry = unchanged.get(relative_path)
+        if entry and entry["sha256"] in reused:
+            results[relative_path] = reused[entry["sha256"]]
+            manifest_files[relative_path] = entry
+        else:
+            changed_paths.append(relative_path)
+    logger.info(
+        f"Incremental analysis of {repo_path} at {commit} (previous: {previous['commit']}): "
+        f"{len(results)} reused, {len(changed_paths)} to analyze"
+    )
+
+    changed_files = [os.path.join(repo_path, relative_path) for relative_path in changed_paths]
+    if snapshot is None:
+        snapshot = await buildSnapshotAsync(repo_path, changed_files) if in_working_tree else CommitSnapshot(repo_path, commit, blobs)
+    files = await asyncio.to_thread(snapshot.files, changed_files)
+    analyzed = await analyzeFilesAsync(cache, files)
+
+    for (file_path, _, content_hash), analysis_result in zip(files, analyzed):
+        if analysis_result is None:
+            continue
+        relative_path = os.path.relpath(file_path, repo_path)
+        results[relative_path] = analysis_result
+        manifest_files[relative_path] = {
+            "blob": blobs[relative_path],
+            "sha256": content_hash,
+            "key": analysis_cache.key("repoAnalysis", content_hash)
+        }
+
+    await saveRepoManifestAsync(repo_path, commit, manifest_files)
+    return {
+        os.path.join(repo_path, relative_path): results[relative_path]
+        for relative_path in blobs if relative_path in results
+    }
+
+
+async def loadRepoManifestAsync(repo_path, commit='latest'):
+    try:
+        if commit == 'latest':
+            latest = await async_redis_client.get(manifestKey(repo_path, 'latest'))
+            if latest is None:
+                return None
+            commit = latest.decode('utf-8')
+        stored = await async_redis_client.get(manifestKey(repo_path, commit))
+    except redis.RedisError as e:
+        logger.error(f"Could not load manifest for {repo_path}@{commit}: {e}")
+        return None
+    return json.loads(stored) if stored else None
+
+
+async def saveRepoManifestAsync(repo_path, commit, files):
+    manifest = {"commit": commit, "files": files}
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(manifestKey(repo_path, commit), json.dumps(manifest))
+            pipe.set(manifestKey(repo_path, 'latest'), commit)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Could not save manifest for {repo_path}@{commit}: {e}")
+
+
+async def createFileMapTransportAsync(repo_analysis):
+    """
+    Builds the scan's FileMapTransport, registering the fMap without blocking the loop in handle mode.
+    """
+    if FMAP_TRANSPORT != 'handle':
+        return FileMapTransport(repo_analysis)
+    handle = await registerFileMapAsync(repo_analysis)
+    if handle is None:
+        return FileMapTransport(repo_analysis, mode='inline')
+    return FileMapTransport(repo_analysis, mode='handle', handle=handle)
+
+
+async def registerFileMapAsync(fmap):
+    try:
+        response = await llm_client.post('register_fmap', json={'fMap': fmap})
+        return response.json().get('handle') if response.json() else None
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logger.warning(f"Could not register the fMap with the LLM service: {e}")
+        return None
+
+
+async def postContextRequestAsync(fmap_transport, filename, file_content):
+    response = await llm_client.post('analyze_context', data=fmap_transport.body(filename, file_content))
+    if response.status_code == 404 and fmap_transport.mode == 'handle':
+        fmap_transport.useHandle(await registerFileMapAsync(fmap_transport.repo_analysis))
+        response = await llm_client.post('analyze_context', data=fmap_transport.body(filename, file_content))
+    return response
+
+
+class AsyncReportScan(ReportScan):
+    """
+    ReportScan whose LLM requests and Redis round-trips are awaited on the event loop.
+    The read and sast stages, prompt assembly and report digests read files (or run
+    Bandit), so they run in threads. Construct it off the loop too: it schedules the
+    files and builds the import graph.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = AsyncAnalysisCache(analysis_cache, async_redis_client)
+
+    async def lookupContext(self, tasks):
+        unresolved = self.unresolvedContext(tasks)
+        hashes = [task["hash"] for task in unresolved]
+        self.useCached(unresolved, "context", hashes, await self.cache.get_many("context", hashes))
+        return tasks
+
+    async def lookupReports(self, tasks):
+        await asyncio.to_thread(self.reportDigests, tasks)
+        for family in self.families:
+            digests = [task["digests"][family] for task in tasks]
+            self.useCached(tasks, family, digests, await self.cache.get_many(family, digests, version=REPORT_ENTRY_VERSION))
+        return tasks
+
+    async def context(self, task):
+        if self.knownContext(task):
+            return task
+        if not self.proceed(task):
+            return None
+        if task["chunks"] is not None:
+            context_analysis = await analyzeInChunksAsync(
+                self.cache, task["path"], "context", task["chunks"], chunkTextDigest,
+                lambda first_line, text: self.requestContext(task["path"], text)
+            )
+        else:
+            context_analysis = await self.requestContext(task["path"], task["content"])
+        if self.useContext(task, context_analysis) is None:
+            return None
+        await self.cache.set("context", task["hash"], task["context"])
+        return task
+
+    async def requestContext(self, file_path, content):
+        try:
+            response = await postContextRequestAsync(self.fmap_transport, os.path.basename(file_path), content)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error sending context request to the API for {file_path}: {e}")
+            return None
+        return self.answer("context", file_path, response)
+
+    def checkWorker(self, check):
+        family, endpoint, _ = REPORT_CHECKS[check]
+
+        async def request(file_path, codes):
+            try:
+                response = await llm_client.post(endpoint, json=self.requestData(check, file_path, codes))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Error sending {family} request to the API for {file_path}: {e}")
+                return None
+            return self.answer(family, file_path, response)
+
+        async def requestChunk(task, first_line, text):
+            codes = await asyncio.to_thread(self.chunkPrompt, task, check, first_line, text)
+            return await request(task["path"], codes)
+
+        async def run(task):
+            cached = self.cachedReport(task, check)
+            if cached is not None:
+                return self.record(task, check, *cached)
+            if not self.proceed(task):
+                return self.record(task, check, None, None)
+            # Related files are read through the snapshot (disk or git), so prompts are built off the loop
+            if task["chunks"] is None:
+                codes, budget = await asyncio.to_thread(self.prompt, task, check)
+                c_report = await request(task["path"], codes)
+            else:
+                budget = await asyncio.to_thread(self.chunkBudget, task, check)
+                c_report = await analyzeInChunksAsync(
+                    self.cache, task["path"], family, task["chunks"],
+                    lambda first_line, text: self.chunkDigest(task, check, first_line, text),
+                    lambda first_line, text: requestChunk(task, first_line, text)
+                )
+            if c_report is not None:
+                await self.cache.set(family, task["digests"][family], {"report": c_report, "promptBudget": budget}, version=REPORT_ENTRY_VERSION)
+            return self.record(task, check, c_report, budget)
+
+        return run
+
+    async def run(self, progress=None):
+        """
+        asyncio version of ReportScan.run.
+        """
+        self.fmap_transport = await createFileMapTransportAsync(self.repo_analysis)
+        pipeline = self.pipeline()
+        on_done = self.track(progress)
+        try:
+            tasks = await pipeline.runAsync(self.file_paths, on_done)
+        finally:
+            await self.cache.flush()
+        return self.report(pipeline, tasks)
+
+
+async def analyzeForContextAndReportAsync(repoPath, repo_analysis, file_paths=None, userCompText=None, snapshot=None, progress=None, checks=None, annotations=None):
+    """
+    asyncio version of Utils.runReportPipeline: the same stages, with the LLM stages
+    running ASYNC_SCAN_CONCURRENCY requests each on the event loop.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysisAsync.
+    - file_paths (list): Absolute paths of the files to analyze; the whole snapshot if omitted.
+    - userCompText (str): The user's policies, for the compliance check.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+    - checks (tuple): "security" and/or "compliance". Defaults to compliance when userCompText is set, security otherwise.
+    - annotations (dict): Optional {absolute file path: {field: value}}, extra fields added to that file's report entries.
+
+    Returns:
+    - report (list): The file reports of a single check, or {check: [...]} when several checks run.
+    """
+    if checks is None:
+        checks = ("compliance",) if userCompText is not None else ("security",)
+    if not os.path.isdir(repoPath):
+        logger.error(f"Repository {repoPath} not found!")
+        return [] if len(checks) == 1 else {check: [] for check in checks}
+
+    if snapshot is None:
+        snapshot = await buildSnapshotAsync(repoPath, file_paths)
+    scan = await asyncio.to_thread(
+        AsyncReportScan, repoPath, repo_analysis, checks, file_paths, userCompText, snapshot, annotations, ASYNC_SCAN_CONCURRENCY
+    )
+    return await scan.run(progress)
+
+
+async def analyzeRepositoryForContextAndReportAsync(repoPath, repo_analysis, snapshot=None, progress=None):
+    return await analyzeForContextAndReportAsync(repoPath, repo_analysis, snapshot=snapshot, progress=progress)
+
+
+async def analyzeASetOfFilesForContextAndReportAsync(repoPath, filepathsArr, repo_analysis, snapshot=None, progress=None):
+    file_paths = selectRepoFiles(repoPath, filepathsArr)
+    return await analyzeForContextAndReportAsync(repoPath, repo_analysis, file_paths, snapshot=snapshot, progress=progress)
+
+
+async def analyzeRepositoryForContextAndComplianceReportAsync(repoPath, repo_analysis, userCompText, snapshot=None, progress=None):
+    return await analyzeForContextAndReportAsync(repoPath, repo_analysis, userCompText=userCompText, snapshot=snapshot, progress=progress)
+
+
+async def analyzeASetOfFilesForContextAndComplianceReportAsync(repoPath, filepathsArr, repo_analysis, userCompText, snapshot=None, progress=None):
+    file_paths = selectRepoFiles(repoPath, filepathsArr)
+    return await analyzeForContextAndReportAsync(repoPath, repo_analysis, file_paths, userCompText, snapshot=snapshot, progress=progress)
+
+
+async def analyzeRepositoryForContextAndCombinedReportAsync(repoPath, repo_analysis, userCompText, filepathsArr=None, snapshot=None, progress=None):
+    file_paths = selectRepoFiles(repoPath, filepathsArr) if filepathsArr is not None else None
+    return await analyzeForContextAndReportAsync(
+        repoPath, repo_analysis, file_paths, userCompText, snapshot=snapshot, progress=progress, checks=("security", "compliance")
+    )
+
+
+async def analyzeCommitRangeAsync(repoPath, base, head, checks=("security",), userCompText=None, progress=None):
+    """
+    asyncio version of Utils.analyzeCommitRange. Files are read from the git object
+    database; git itself and Bandit run off the loop, the LLM requests on it.
+    """
+    head_commit, blobs = await asyncio.to_thread(getCommitBlobs, repoPath, head)
+    base_commit, _ = await asyncio.to_thread(getCommitBlobs, repoPath, base)
+    if head_commit is None or base_commit is None:
+        logger.error(f"Could not resolve {base}..{head} in {repoPath}")
+        return None
+    changes = await asyncio.to_thread(getCommitRangeChanges, repoPath, base_commit, head_commit)
+    if changes is None:
+        return None
+
+    snapshot = CommitSnapshot(repoPath, head_commit, blobs)
+    repo_analysis = await incrementalRepoAnalysisAsync(repoPath, snapshot, commit=head_commit, previous_commit=base_commit)
+    analyzed = [change for change in changes if change["status"] != 'deleted']
+    logger.info(f"Commit range {base_commit[:12]}..{head_commit[:12]} of {repoPath}: {len(analyzed)} changed file(s), {len(changes) - len(analyzed)} deleted")
+
+    changed_paths = [path for change in changes for path in (change["path"], change["previousPath"]) if path]
+    impacted = [
+        path for path in await asyncio.to_thread(impactedFiles, repoPath, changed_paths, repo_analysis, snapshot)
+        if os.path.join(repoPath, path) in snapshot
+    ]
+    file_paths = [os.path.join(repoPath, path) for path in impacted]
+    dependents = [path for path in impacted if path not in set(changed_paths)]
+    renamed_from = {
+        os.path.join(repoPath, change["path"]): {"renamedFrom": change["previousPath"]} for change in analyzed if change["previousPath"]
+    }
+    report = await analyzeForContextAndReportAsync(
+        repoPath, repo_analysis, file_paths, userCompText, snapshot=snapshot, progress=progress, checks=tuple(checks), annotations=renamed_from
+    )
+    return {"base": base_commit, "head": head_commit, "changes": changes, "dependents": dependents, "report": report}
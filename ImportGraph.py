@@ -0,0 +1,420 @@
+import os
+import re
+import sys
+import logging
+import posixpath
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Number of parsed files remembered between scans; a file is parsed again only when it changes
+IMPORT_PARSE_CACHE_SIZE = int(os.getenv('IMPORT_PARSE_CACHE_SIZE', 50000))
+
+LANGUAGES = {
+    '.py': 'python',
+    '.js': 'javascript', '.ts': 'javascript',
+    '.c': 'c', '.cpp': 'c',
+    '.java': 'jvm', '.kt': 'jvm',
+    '.cs': 'csharp',
+    '.go': 'go',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.rs': 'rust',
+}
+
+PYTHON_IMPORT = re.compile(r"^[ \t]*import[ \t]+([\w., \t]+)", re.M)
+PYTHON_FROM_IMPORT = re.compile(r"^[ \t]*from[ \t]+(\.*)([\w.]*)[ \t]+import[ \t]+(\([^)]*\)|[^\n#]+)", re.M)
+JS_IMPORT = re.compile(
+    r"""(?:\b(?:import|export)\b[^'";]*?\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"\n]+)['"]"""
+)
+C_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*"([^"\n]+)"', re.M)
+JVM_PACKAGE = re.compile(r"^[ \t]*package[ \t]+([\w.]+)", re.M)
+JVM_IMPORT = re.compile(r"^[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+?)(\.\*)?[ \t]*(?:as[ \t]+\w+)?[ \t]*;?[ \t]*$", re.M)
+CSHARP_NAMESPACE = re.compile(r"^[ \t]*namespace[ \t]+([\w.]+)", re.M)
+CSHARP_USING = re.compile(r"^[ \t]*(?:global[ \t]+)?using[ \t]+(?:static[ \t]+)?([\w.]+)[ \t]*;", re.M)
+GO_PACKAGE = re.compile(r"^package[ \t]+(\w+)", re.M)
+GO_IMPORT_BLOCK = re.compile(r"^import[ \t]*\(([^)]*)\)", re.M)
+GO_IMPORT = re.compile(r'^import[ \t]+(?:[\w.]+[ \t]+)?"([^"]+)"', re.M)
+GO_DEFINITION = re.compile(r"^(?:func[ \t]+(?:\([^)]*\)[ \t]*)?|type[ \t]+|var[ \t]+|const[ \t]+)(\w+)", re.M)
+RUBY_REQUIRE = re.compile(r"""^[ \t]*(require_relative|require|load)[ \t(]+['"]([^'"\n]+)['"]""", re.M)
+PHP_INCLUDE = re.compile(r"""\b(?:require|include)(?:_once)?[ \t(]*(__DIR__[ \t]*\.[ \t]*)?['"]([^'"\n]+)['"]""")
+PHP_USE = re.compile(r"^[ \t]*use[ \t]+([\w\\]+)(?:[ \t]+as[ \t]+\w+)?[ \t]*;", re.M)
+RUST_MOD = re.compile(r"^[ \t]*(?:pub(?:\([^)]*\))?[ \t]+)?mod[ \t]+(\w+)[ \t]*;", re.M)
+RUST_USE = re.compile(r"^[ \t]*(?:pub(?:\([^)]*\))?[ \t]+)?use[ \t]+((?:crate|self|super)(?:::\w+)*)", re.M)
+TYPE_IDENTIFIER = re.compile(r"\b[A-Z]\w*")
+IDENTIFIER = re.compile(r"\b[A-Za-z_]\w*")
+
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def parseImports(file_path, content):
+    """
+    Extracts what a file imports, with regular expressions per language.
+
+    Returns:
+    - parsed (dict): {"language", "imports", "package", "identifiers", "definitions"}; imports
+      are (kind, spec) tuples, interpreted by ImportGraph. Only the fields a language needs are set.
+    """
+    language = LANGUAGES.get(os.path.splitext(file_path)[1].lower())
+    parsed = {"language": language, "imports": [], "package": None, "identifiers": None, "definitions": None}
+    imports = parsed["imports"]
+
+    if language == 'python':
+        for match in PYTHON_IMPORT.finditer(content):
+            for name in match.group(1).split(','):
+                name = name.split(' as ')[0].strip()
+                if name:
+                    imports.append(('absolute', (name, ())))
+        for match in PYTHON_FROM_IMPORT.finditer(content):
+            names = tuple(name.split(' as ')[0].strip() for name in match.group(3).strip('() \t').split(','))
+            names = tuple(name for name in names if name and name != '*')
+            if match.group(1):
+                imports.append(('relative', (len(match.group(1)), match.group(2), names)))
+            elif match.group(2):
+                imports.append(('absolute', (match.group(2), names)))
+    elif language == 'javascript':
+        imports += [('path', spec) for spec in JS_IMPORT.findall(content)]
+    elif language == 'c':
+        imports += [('include', spec) for spec in C_INCLUDE.findall(content)]
+    elif language in ('jvm', 'csharp'):
+        pattern = JVM_PACKAGE if language == 'jvm' else CSHARP_NAMESPACE
+        package = pattern.search(content)
+        parsed["package"] = package.group(1) if package else ''
+        if language == 'jvm':
+            imports += [('wildcard' if wildcard else 'type', name) for name, wildcard in JVM_IMPORT.findall(content)]
+        else:
+            imports += [('wildcard', name) for name in CSHARP_USING.findall(content)]
+        parsed["identifiers"] = frozenset(TYPE_IDENTIFIER.findall(content))
+    elif language == 'go':
+        package = GO_PACKAGE.search(content)
+        parsed["package"] = package.group(1) if package else ''
+        for block in GO_IMPORT_BLOCK.findall(content):
+            imports += [('package', spec) for spec in re.findall(r'"([^"]+)"', block)]
+        imports += [('package', spec) for spec in GO_IMPORT.findall(content)]
+        parsed["identifiers"] = frozenset(IDENTIFIER.findall(content))
+        parsed["definitions"] = frozenset(GO_DEFINITION.findall(content))
+    elif language == 'ruby':
+        imports += [('relative' if kind == 'require_relative' else 'path', spec) for kind, spec in RUBY_REQUIRE.findall(content)]
+    elif language == 'php':
+        imports += [('include', spec.lstrip('/') if from_dir else spec) for from_dir, spec in PHP_INCLUDE.findall(content)]
+        imports += [('namespace', name) for name in PHP_USE.findall(content)]
+    elif language == 'rust':
+        imports += [('mod', name) for name in RUST_MOD.findall(content)]
+        imports += [('use', path) for path in RUST_USE.findall(content)]
+    return parsed
+
+
+def parseCached(version, file_path, read):
+    """
+    parseImports with an LRU cache keyed on the file's version (a git blob hash, or its
+    size and modification time on disk), so unchanged files are neither read nor parsed again.
+    """
+    key = (version, file_path) if version is not None else None
+    if key is not None:
+        with _parsed_lock:
+            if key in _parsed:
+                _parsed.move_to_end(key)
+                return _parsed[key], True
+    content = read(file_path)
+    if content is None:
+        return None, False
+    parsed = parseImports(file_path, content)
+    if key is not None:
+        with _parsed_lock:
+            _parsed[key] = parsed
+            while len(_parsed) > IMPORT_PARSE_CACHE_SIZE:
+                _parsed.popitem(last=False)
+    return parsed, False
+
+
+class ImportGraph:
+    """
+    Static dependency index of a repository: which files each file imports or includes.
+
+    Built once per scan over the files of the fMap, from per-file parses that survive
+    between scans, so a commit check only parses the files the commit changed. Imports
+    are resolved to repository files per language (Python, JavaScript/TypeScript, C/C++,
+    Java/Kotlin, C#, Go, Ruby, PHP, Rust). Imports that clearly point outside the
+    repository (standard library, packages) are ignored.
+
+    A file is only answered from the index when every import that looks local
+    resolved; otherwise (and for Swift) related() returns None and the caller falls
+    back to the /analyze_context LLM call.
+    """
+
+    def __init__(self, repo_path, parsed_files):
+        self.repo_path = repo_path
+        self.files = {}
+        for file_path, parsed in parsed_files.items():
+            if parsed is not None:
+                self.files[self._relative(file_path)] = (file_path, parsed)
+        self._index()
+        self._resolved = 0
+        self._unresolved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, snapshot, file_paths):
+        """
+        Indexes file_paths (normally the fMap's files), reading them through the snapshot.
+
+        Parameters:
+        - snapshot (RepoSnapshot): Provides file versions and contents.
+        - file_paths (iterable): Absolute paths of the files to index.
+        """
+        parsed_files = {}
+        reused = 0
+        for file_path in file_paths:
+            if os.path.splitext(file_path)[1].lower() not in LANGUAGES and not file_path.endswith('.swift'):
+                continue
+            parsed, hit = parseCached(snapshot.version(file_path), file_path, snapshot.read)
+            parsed_files[file_path] = parsed
+            reused += hit
+        logger.info(f"Import graph of {snapshot.repo_path}: {len(parsed_files)} files, {len(parsed_files) - reused} parsed")
+        return cls(snapshot.repo_path, parsed_files)
+
+    def _relative(self, file_path):
+        return os.path.relpath(file_path, self.repo_path).replace(os.sep, '/')
+
+    def _index(self):
+        self.python_modules = {}
+        self.python_roots = set()
+        self.without_extension = {}
+        self.stems_by_name = {}
+        self.jvm_types = {}
+        self.packages = {}
+        self.directories = {}
+        self.directories_by_name = {}
+        for relative_path, (_, parsed) in self.files.items():
+            stem, _ = posixpath.splitext(relative_path)
+            directory = posixpath.dirname(relative_path)
+            self.without_extension.setdefault(stem, []).append(relative_path)
+            self.stems_by_name.setdefault(posixpath.basename(stem), set()).add(stem)
+            self.directories.setdefault(directory, []).append(relative_path)
+            self.directories_by_name.setdefault(posixpath.basename(directory), set()).add(directory)
+            language = parsed["language"]
+            if language == 'python':
+                for name in self._pythonNames(relative_path):
+                    self.python_modules.setdefault(name, relative_path)
+                    self.python_roots.add(name.split('.')[0])
+            elif language in ('jvm', 'csharp') and parsed["package"] is not None:
+                self.packages.setdefault((language, parsed["package"]), []).append(relative_path)
+                qualified = f"{parsed['package']}.{posixpath.basename(stem)}".lstrip('.')
+                self.jvm_types.setdefault((language, qualified), relative_path)
+
+    def _pythonNames(self, relative_path):
+        # Importable from the repository root or from any directory above the file's package
+        # (src/ layouts, scripts folders, namespace packages), never from inside a package
+        parts = posixpath.splitext(relative_path)[0].split('/')
+        if parts[-1] == '__init__':
+            parts = parts[:-1]
+        if not parts:
+            return []
+        start = len(parts) - 1
+        while start > 0 and '/'.join(parts[:start]) + '/__init__.py' in self.files:
+            start -= 1
+        return ['.'.join(parts[index:]) for index in range(start + 1)]
+
+    def _existing(self, candidates):
+        return [candidate for candidate in candidates if candidate in self.files]
+
+    def _bySuffix(self, stem):
+        # Files whose path without extension ends with the given one, e.g. "include/util" for "util"
+        stem = posixpath.normpath(stem)
+        exact = self.without_extension.get(stem)
+        if exact:
+            return exact
+        suffix = '/' + stem
+        candidates = self.stems_by_name.get(posixpath.basename(stem), ())
+        return [path for known in sorted(candidates) if known.endswith(suffix) for path in self.without_extension[known]]
+
+    def _resolvePython(self, relative_path, kind, spec):
+        if kind == 'relative':
+            level, module, names = spec
+            base = posixpath.dirname(relative_path).split('/') if posixpath.dirname(relative_path) else []
+            base = base[:len(base) - (level - 1)] if level > 1 else base
+            target = '/'.join(base + (module.split('.') if module else []))
+            found = []
+            for name in names:
+                found += self._existing([posixpath.join(target, name + '.py'), posixpath.join(target, name, '__init__.py')])
+            if not found:
+                found = self._existing([target + '.py', posixpath.join(target, '__init__.py')])
+            return found if found or not module else None
+        module, names = spec
+        found = [self.python_modules[f"{module}.{name}"] for name in names if f"{module}.{name}" in self.python_modules]
+        if not found and module in self.python_modules:
+            found = [self.python_modules[module]]
+        if found:
+            return found
+        root = module.split('.')[0]
+        if root in sys.stdlib_module_names or root not in self.python_roots:
+            return []
+        return None
+
+    def _resolveJavascript(self, relative_path, spec):
+        if not spec.startswith(('.', '/')):
+            # Path aliases need the bundler configuration; other bare specifiers are packages
+            return None if spec.startswith(('@/', '~/')) else []
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(relative_path), spec) if spec.startswith('.') else spec.lstrip('/'))
+        stem, extension = posixpath.splitext(base)
+        candidates = [base, base + '.js', base + '.ts', base + '/index.js', base + '/index.ts']
+        if extension == '.js':
+            # TypeScript sources are imported with the extension of their compiled output
+            candidates.append(stem + '.ts')
+        found = self._existing(candidates)
+        return found[:1] or None
+
+    def _resolveInclude(self, relative_path, spec):
+        stem = posixpath.splitext(spec)[0]
+        local = posixpath.normpath(posixpath.join(posixpath.dirname(relative_path), stem))
+        # Headers aren't analyzed, so an include maps to the sources sharing its name (util.h -> util.c)
+        return self.without_extension.get(local) or self._bySuffix(stem)
+
+    def _resolveTypes(self, relative_path, parsed, kind, name):
+        language = parsed["language"]
+        identifiers = parsed["identifiers"] or frozenset()
+        if kind == 'wildcard':
+            members = self.packages.get((language, name))
+            if members is not None:
+                return [member for member in members if posixpath.basename(posixpath.splitext(member)[0]) in identifiers]
+        else:
+            # a.b.Type, or a.b.Type.member for static imports
+            for qualified in (name, name.rpartition('.')[0]):
+                if (language, qualified) in self.jvm_types:
+                    return [self.jvm_types[(language, qualified)]]
+        # Names outside every package of the repository belong to libraries
+        prefix = '.'.join(name.split('.')[:2])
+        known = any(package == prefix or package.startswith(prefix + '.') for lang, package in self.packages if lang == language and package)
+        return None if known else []
+
+    def _resolveGo(self, spec):
+        # Go packages are directories; the import path ends with the package's directory in the repository
+        candidates = self.directories_by_name.get(posixpath.basename(spec), ())
+        matches = [directory for directory in candidates if directory and (spec == directory or spec.endswith('/' + directory))]
+        if not matches:
+            return []
+        directory = max(matches, key=len)
+        return [path for path in self.directories[directory] if path.endswith('.go') and not path.endswith('_test.go')]
+
+    def _resolveRuby(self, relative_path, kind, spec):
+        if kind == 'relative':
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(relative_path), spec))
+            return self._existing([target if target.endswith('.rb') else target + '.rb']) or None
+        return [path for path in self._bySuffix(posixpath.splitext(spec)[0] if spec.endswith('.rb') else spec) if path.endswith('.rb')]
+
+    def _resolvePhp(self, relative_path, kind, spec):
+        if kind == 'include':
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(relative_path), spec))
+            return self._existing([target]) or [path for path in self._bySuffix(posixpath.splitext(spec)[0]) if path.endswith('.php')] or None
+        # PSR-4: Vendor\Package\Class lives in <some root>/Package/Class.php
+        segments = spec.split('\\')
+        for start in range(len(segments) - 1 if len(segments) > 1 else 1):
+            found = [path for path in self._bySuffix('/'.join(segments[start:])) if path.endswith('.php')]
+            if found:
+                return found
+        return []
+
+    def _resolveRust(self, relative_path, kind, spec):
+        directory = posixpath.dirname(relative_path)
+        stem = posixpath.splitext(posixpath.basename(relative_path))[0]
+        module_directory = directory if stem in ('mod', 'lib', 'main') else posixpath.join(directory, stem)
+        if kind == 'mod':
+            return self._existing([posixpath.join(module_directory, spec + '.rs'), posixpath.join(module_directory, spec, 'mod.rs')]) or None
+
+        segments = spec.split('::')
+        if segments[0] == 'crate':
+            root = directory
+            while root and not self._existing([posixpath.join(root, 'lib.rs'), posixpath.join(root, 'main.rs')]):
+                root = posixpath.dirname(root)
+            base = root
+        elif segments[0] == 'super':
+            base = posixpath.dirname(module_directory)
+        else:
+            base = module_directory
+        path = segments[1:]
+        # The longest prefix of the path that is a module; the rest are items inside it
+        for end in range(len(path), 0, -1):
+            target = posixpath.join(base, *path[:end])
+            found = self._existing([target + '.rs', posixpath.join(target, 'mod.rs')])
+            if found:
+                return found
+        return [] if not path else None
+
+    def _sameScope(self, relative_path, parsed):
+        # Java, Kotlin, C# and Go code uses its own package's files without importing them
+        language = parsed["language"]
+        identifiers = parsed["identifiers"] or frozenset()
+        if language in ('jvm', 'csharp'):
+            members = self.packages.get((language, parsed["package"]), [])
+            return [member for member in members if posixpath.basename(posixpath.splitext(member)[0]) in identifiers]
+        if language == 'go':
+            siblings = []
+            for path in self.directories.get(posixpath.dirname(relative_path), []):
+                sibling = self.files[path][1]
+                if sibling["language"] == 'go' and sibling["package"] == parsed["package"] and sibling["definitions"] & (identifiers - {parsed["package"]}):
+                    siblings.append(path)
+            return siblings
+        return []
+
+    def _resolve(self, relative_path, parsed, kind, spec):
+        language = parsed["language"]
+        if language == 'python':
+            return self._resolvePython(relative_path, kind, spec)
+        if language == 'javascript':
+            return self._resolveJavascript(relative_path, spec)
+        if language == 'c':
+            return self._resolveInclude(relative_path, spec)
+        if language in ('jvm', 'csharp'):
+            return self._resolveTypes(relative_path, parsed, kind, spec)
+        if language == 'go':
+            return self._resolveGo(spec)
+        if language == 'ruby':
+            return self._resolveRuby(relative_path, kind, spec)
+        if language == 'php':
+            return self._resolvePhp(relative_path, kind, spec)
+        if language == 'rust':
+            return self._resolveRust(relative_path, kind, spec)
+        return None
+
+    def related(self, file_path):
+        """
+        Returns the absolute paths of the repository files a file depends on, or None when
+        the index can't tell (unsupported language, or a local-looking import it couldn't resolve).
+        """
+        relative_path = self._relative(file_path)
+        entry = self.files.get(relative_path)
+        resolved = entry is not None and entry[1]["language"] is not None
+        found = []
+        if resolved:
+            parsed = entry[1]
+            for kind, spec in parsed["imports"]:
+                targets = self._resolve(relative_path, parsed, kind, spec)
+                if targets is None:
+                    resolved = False
+                    break
+                found += targets
+            found += self._sameScope(relative_path, parsed) if resolved else []
+
+        with self._lock:
+            if resolved:
+                self._resolved += 1
+            else:
+                self._unresolved += 1
+        if not resolved:
+            return None
+        return [self.files[path][0] for path in dict.fromkeys(found) if path != relative_path]
+
+    def relatedFiles(self, file_path):
+        """
+        related() in the format of an /analyze_context response.
+        """
+        related = self.related(file_path)
+        if related is None:
+            return None
+        return [{"relatedFileName": os.path.basename(path), "relatedFilePath": path} for path in related]
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self.files), 'resolved': self._resolved, 'unresolved': self._unresolved}
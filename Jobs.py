@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import redis
+
+from Utils import redis_client, logger, current_cancel_event, ScanProgress
+from Metrics import job_seconds
+
+
+# Number of checks run side by side by one process
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 2))
+# Where job records and cancellation requests live: "redis" (shared between processes) or "local".
+# Jobs always run in the process that accepted them; with "redis", any process can report on
+# or cancel them, and events reach clients connected to any process through the socket
+# server's Redis message queue.
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'redis')
+# How long finished job records (including their report) are kept
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', 24 * 3600))
+# How often running jobs look for a cancellation requested from another process
+JOB_CANCEL_POLL_SECONDS = float(os.getenv('JOB_CANCEL_POLL_SECONDS', 1))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = {COMPLETED, FAILED, CANCELLED}
+
+# Request parameters that are never written to the job store; they only live in the memory of the process running the job
+SECRET_PARAMS = {'username', 'token'}
+
+
+class RedisJobStore:
+    """
+    Job records kept in Redis, shared by every process using the same server.
+    """
+
+    def __init__(self, client, prefix='jobs'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def save(self, job):
+        self.client.set(self._key(job['id']), json.dumps(job), ex=JOB_TTL_SECONDS)
+
+    def load(self, job_id):
+        stored = self.client.get(self._key(job_id))
+        return json.loads(stored) if stored else None
+
+    def requestCancel(self, job_id):
+        # Kept apart from the record so that status updates can't overwrite it
+        self.client.set(f"{self._key(job_id)}:cancel", 1, ex=JOB_TTL_SECONDS)
+
+    def cancelRequested(self, job_id):
+        return bool(self.client.exists(f"{self._key(job_id)}:cancel"))
+
+
+class LocalJobStore:
+    """
+    In-process stand-in for RedisJobStore, for tests and single-process setups.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job['id']] = json.loads(json.dumps(job))
+
+    def load(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def requestCancel(self, job_id):
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def cancelRequested(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+
+class JobManager:
+    """
+    Runs checks in the background on a bounded pool of worker threads.
+
+    The queue is in memory: a job runs in the process that accepted it, which is the only
+    place its credentials (SECRET_PARAMS) are kept. The store only ever sees the other
+    parameters.
+
+    Runners are registered per job type and called as runner(params, progress, update),
+    where progress is a ScanProgress and update(message) reports a free-form step.
+    Events are delivered through emit(event, payload, job_id): fileResult, progress,
+    processUpdate, jobStatus and finally processComplete.
+
+    Cancelling a job sets the cancellation flag seen by Utils.scanCancelled(), so the
+    analysis stops issuing LLM requests and the job ends as cancelled.
+    """
+
+    def __init__(self, store, emit=None, max_workers=JOB_MAX_WORKERS):
+        self.store = store
+        self.emit = emit or (lambda event, payload, job_id: None)
+        self.max_workers = max_workers
+        self.runners = {}
+        self._running = {}
+        self._owned = {}
+        self._types = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def register(self, job_type, runner):
+        self.runners[job_type] = runner
+
+    def start(self):
+        """
+        Starts the worker threads and the cancellation watcher. Safe to call more than once.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for index in range(self.max_workers):
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True).start()
+        threading.Thread(target=self._watchCancellations, name="job-cancel-watcher", daemon=True).start()
+
+    def submit(self, job_type, params, owner=None, job_id=None):
+        """
+        Queues a job and returns its ID immediately. Callers that need to subscribe to the
+        job's events before it can start pass the ID they generated.
+        """
+        if job_type not in self.runners:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = {
+            'id': job_id or uuid.uuid4().hex,
+            'type': job_type,
+            'params': {key: value for key, value in params.items() if key not in SECRET_PARAMS},
+            'owner': owner,
+            'status': QUEUED,
+            'progress': None,
+            'summary': None,
+            'report': None,
+            'error': None,
+            'createdAt': time.time(),
+            'startedAt': None,
+            'finishedAt': None,
+        }
+        self.store.save(job)
+        if owner is not None:
+            with self._lock:
+                self._owned.setdefault(owner, set()).add(job['id'])
+        self._queue.put((job['id'], params))
+        self.start()
+        return job['id']
+
+    def status(self, job_id, include_report=False):
+        """
+        Returns the public view of a job record, or None for unknown jobs.
+        """
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        job.pop('params', None)
+        if not include_report:
+            job.pop('report', None)
+        job['cancelRequested'] = self.store.cancelRequested(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Requests cancellation. Queued jobs never start; running jobs stop issuing LLM calls.
+
+        Returns:
+        - cancelled (bool): False if the job is unknown or already finished.
+        """
+        job = self.store.load(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return False
+        self.store.requestCancel(job_id)
+        if job['status'] == QUEUED:
+            self._update(job_id, status=CANCELLED, finishedAt=time.time())
+        with self._lock:
+            cancel_event = self._running.get(job_id)
+        if cancel_event is not None:
+            cancel_event.set()
+        self.emit('jobStatus', self.status(job_id), job_id)
+        return True
+
+    def activeJobs(self):
+        """
+        Returns the number of jobs this process is running, by job type.
+        """
+        with self._lock:
+            types = list(self._types.values())
+        return {job_type: types.count(job_type) for job_type in self.runners}
+
+    def cancelOwnedBy(self, owner):
+        """
+        Cancels the unfinished jobs an owner (e.g. a disconnected client) submitted through this process.
+        """
+        with self._lock:
+            job_ids = self._owned.pop(owner, set())
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def _update(self, job_id, **fields):
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self.store.save(job)
+        return job
+
+    def _work(self):
+        while True:
+            job_id, params = self._queue.get()
+            try:
+                self._run(job_id, params)
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed: {e}")
+
+    def _run(self, job_id, params):
+        job = self.store.load(job_id)
+        if job is None or job['status'] != QUEUED or self.store.cancelRequested(job_id):
+            return
+
+        cancel_event = threading.Event()
+        with self._lock:
+            self._running[job_id] = cancel_event
+            self._types[job_id] = job['type']
+        job = self._update(job_id, status=RUNNING, startedAt=time.time())
+        self.emit('jobStatus', self.status(job_id), job_id)
+
+        progress = ScanProgress(
+            on_result=lambda entry: self.emit('fileResult', {'jobId': job_id, 'action': job['type'], 'result': entry}, job_id),
+            on_progress=lambda snapshot: self._reportProgress(job_id, job['type'], snapshot)
+        )
+
+        def update(message):
+            self.emit('processUpdate', {'jobId': job_id, 'message': message}, job_id)
+
+        token = current_cancel_event.set(cancel_event)
+        try:
+            report = self.runners[job['type']](params, progress, update)
+            summary = progress.snapshot()
+            summary['reported'] = reportedCount(report)
+            summary['pendingFiles'] = progress.pendingFiles()
+            status = CANCELLED if cancel_event.is_set() else COMPLETED
+            self._update(job_id, status=status, summary=summary, report=report, finishedAt=time.time())
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            status = FAILED
+            self._update(job_id, status=status, error=str(e), finishedAt=time.time())
+        finally:
+            current_cancel_event.reset(token)
+            job_seconds.observe(time.time() - job['startedAt'], job['type'])
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._types.pop(job_id, None)
+                self._owned.get(job['owner'], set()).discard(job_id)
+
+        final = self.status(job_id, include_report=True)
+        report = final.pop('report', None)
+        self.emit('jobStatus', final, job_id)
+        complete = {'jobId': job_id, 'action': job['type'], 'status': status, 'summary': final['summary']}
+        # Clients that don't stream results still get the whole report, as with synchronous checks
+        if report is not None and not params.get('stream'):
+            complete['report'] = str(report)
+        if status == FAILED:
+            complete['error'] = final['error']
+        self.emit('processComplete', complete, job_id)
+
+    def _reportProgress(self, job_id, job_type, snapshot):
+        self._update(job_id, progress=snapshot)
+        self.emit('progress', dict(snapshot, jobId=job_id, action=job_type), job_id)
+
+    def _watchCancellations(self):
+        # Picks up cancellations requested through another process sharing the store
+        while True:
+            time.sleep(JOB_CANCEL_POLL_SECONDS)
+            with self._lock:
+                running = dict(self._running)
+            for job_id, cancel_event in running.items():
+                if cancel_event.is_set():
+                    continue
+                try:
+                    if self.store.cancelRequested(job_id):
+                        cancel_event.set()
+                except redis.RedisError as e:
+                    logger.error(f"Could not poll job {job_id} for cancellation: {e}")
+
+
+def reportedCount(report):
+    """
+    Number of file reports in a check's result; combined checks return one list per check.
+    """
+    if report is None:
+        return 0
+    if isinstance(report, dict) and 'report' in report:
+        # Commit-range checks wrap the report with the range and its changes
+        return reportedCount(report['report'])
+    if isinstance(report, dict):
+        return sum(len(entries) for entries in report.values())
+    return len(report)
+
+
+def createJobStore():
+    if JOB_BACKEND == 'local':
+        return LocalJobStore()
+    return RedisJobStore(redis_client)
@@ -0,0 +1,111 @@
+from flask import Flask, jsonify, request
+import os
+import re
+import uuid
+import threading
+
+# Local stand-in for the llama3_1CodeSecu_service, for testing without a GPU.
+# Answers are deterministic heuristics, not real analyses. Point the scanner at it with
+#   LLM_SERVICE_URL=http://localhost:8000 python main.py
+
+app = Flask(__name__)
+
+registered_fmaps = {}
+request_stats = {}
+stats_lock = threading.Lock()
+
+RISKY_PATTERNS = {
+    r'\beval\(': 'Use of eval on possibly untrusted input',
+    r'\bexec\(': 'Use of exec on possibly untrusted input',
+    r'os\.system\(': 'Shell command execution',
+    r'shell\s*=\s*True': 'Subprocess call with shell=True',
+    r'pickle\.loads?\(': 'Deserialization of untrusted data with pickle',
+    r'(password|secret|token)\s*=\s*[\'"][^\'"]+[\'"]': 'Hard-coded credential',
+}
+
+
+@app.before_request
+def record_request():
+    with stats_lock:
+        endpoint_stats = request_stats.setdefault(request.path, {'requests': 0, 'bytes': 0})
+        endpoint_stats['requests'] += 1
+        endpoint_stats['bytes'] += request.content_length or 0
+
+
+@app.route('/stats')
+def stats():
+    with stats_lock:
+        return jsonify(request_stats)
+
+
+@app.route('/analyze_repo_code', methods=['POST'])
+def analyze_repo_code():
+    data = request.get_json()
+    content = data.get('fileContent', '')
+    symbols = re.findall(r'^\s*(?:def|class|function|func|fn)\s+(\w+)', content, re.M)
+    first_line = next((line.strip() for line in content.splitlines() if line.strip()), '')
+    return jsonify({
+        'summary': f"{data.get('fileName')}: {first_line[:120]}",
+        'symbols': symbols,
+    })
+
+
+@app.route('/register_fmap', methods=['POST'])
+def register_fmap():
+    handle = uuid.uuid4().hex
+    registered_fmaps[handle] = request.get_json().get('fMap', {})
+    return jsonify({'handle': handle})
+
+
+@app.route('/analyze_context', methods=['POST'])
+def analyze_context():
+    data = request.get_json()
+    if 'fMapHandle' in data:
+        if data['fMapHandle'] not in registered_fmaps:
+            return jsonify({'error': 'Unknown fMap handle'}), 404
+        fmap = registered_fmaps[data['fMapHandle']]
+    else:
+        fmap = data.get('fMap', {})
+
+    # A file is related when its module name shows up in an import/include line
+    content = data.get('fileContent', '')
+    imported = set()
+    for line in content.splitlines():
+        if re.match(r'\s*(import|from|#include|require|use|using)\b', line) or 'require(' in line:
+            imported.update(re.findall(r'[A-Za-z_]\w*', line))
+
+    related = []
+    for file_path in fmap:
+        name = os.path.basename(file_path)
+        if name != data.get('fileName') and os.path.splitext(name)[0] in imported:
+            related.append({'relatedFileName': name, 'relatedFilePath': file_path})
+    return jsonify(related)
+
+
+def find_risks(content):
+    findings = []
+    for pattern, description in RISKY_PATTERNS.items():
+        for match in re.finditer(pattern, content):
+            line_number = content.count('\n', 0, match.start()) + 1
+            findings.append({'issue': description, 'line': line_number})
+    return findings
+
+
+@app.route('/analyze_vulnerabilities', methods=['POST'])
+def analyze_vulnerabilities():
+    data = request.get_json()
+    return jsonify({'fileName': data.get('fileName'), 'vulnerabilities': find_risks(data.get('fileContent', ''))})
+
+
+@app.route('/analyze_compliance', methods=['POST'])
+def analyze_compliance():
+    data = request.get_json()
+    return jsonify({
+        'fileName': data.get('fileName'),
+        'policies': data.get('userDefinedPolicies'),
+        'violations': find_risks(data.get('fileContent', '')),
+    })
+
+
+if __name__ == '__main__':
+    app.run(host="0.0.0.0", port=int(os.getenv('PORT', 8000)), threaded=True)
@@ -0,0 +1,174 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Set to false to stop recording measurements; /metrics then only reports the collected gauges
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Upper bounds, in bytes, of the buckets of the request size histograms
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labelText(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic count per combination of label values.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labelText(list(zip(self.label_names, labels)))} {_number(value)}" for labels, value in sorted(values.items())]
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per combination of label values.
+
+    An observation is a bisect and three additions under a lock, cheap enough to
+    record every file read, Redis round-trip and LLM request.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one for values above every bound), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        lines = []
+        for labels, (counts, total, count) in sorted(series.items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labelText(pairs + [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labelText(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labelText(pairs)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labelText(pairs)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The process's metrics, rendered in the Prometheus text format.
+
+    Counters and histograms are updated as the work happens. Values that already
+    live elsewhere (cache counters, running jobs) are read by collectors only when
+    the metrics are rendered; a collector returns (name, type, help, samples) tuples,
+    samples mapping tuples of (label, value) pairs to a value. Registering a collector
+    under a name already in use replaces the previous one.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def collector(self, name, collect):
+        with self._lock:
+            self.collectors[name] = collect
+        return collect
+
+    def render(self):
+        with self._lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors.values())
+        lines = []
+        for metric in metrics:
+            lines += [f"# HELP {metric.name} {metric.help_text}", f"# TYPE {metric.name} {metric.kind}"]
+            lines += metric.lines()
+        for collect in collectors:
+            for name, kind, help_text, samples in collect():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for labels, value in samples.items():
+                    lines.append(f"{name}{_labelText(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'scanner_stage_seconds', 'Time spent per unit of work, by stage (pipeline stages, redis, bandit, git, file reads)', ('stage',)
+)
+llm_request_seconds = registry.histogram('scanner_llm_request_seconds', 'Latency of LLM service requests, by endpoint', ('endpoint',))
+llm_requests_total = registry.counter('scanner_llm_requests_total', 'LLM service requests, by endpoint', ('endpoint',))
+llm_errors_total = registry.counter('scanner_llm_errors_total', 'Failed LLM service requests (connection errors, timeouts, 5xx), by endpoint', ('endpoint',))
+llm_retries_total = registry.counter('scanner_llm_retries_total', 'Retried LLM service requests, by endpoint', ('endpoint',))
+llm_request_bytes = registry.histogram('scanner_llm_request_bytes', 'Size of LLM service request bodies, by endpoint', ('endpoint',), SIZE_BUCKETS)
+job_seconds = registry.histogram('scanner_job_seconds', 'Duration of finished jobs, by job type', ('type',))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@contextmanager
+def timed(stage):
+    """
+    Records the time spent in the block under scanner_stage_seconds{stage=...}.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.monotonic() - started, stage)
@@ -0,0 +1,226 @@
+import os
+import re
+import time
+import fcntl
+import base64
+import shutil
+import subprocess
+from contextlib import contextmanager
+
+from Utils import logger, string_to_sha256
+
+# Directory holding the shared bare mirrors; empty disables the pool and every setup clones from scratch
+MIRROR_ROOT = os.getenv('MIRROR_ROOT', '')
+# Mirrors without worktrees that haven't been used for this long are deleted
+MIRROR_IDLE_SECONDS = int(os.getenv('MIRROR_IDLE_SECONDS', 7 * 24 * 3600))
+# Upper bound on the number of mirrors kept; the least recently used ones without worktrees go first
+MIRROR_MAX_COUNT = int(os.getenv('MIRROR_MAX_COUNT', 50))
+
+LOCK_FILE = 'pool.lock'
+
+
+def withoutCredentials(repo_url):
+    """
+    Returns the URL without the user and token embedded in it.
+    """
+    return re.sub(r'^(\w+://)[^/@]+@', r'\1', repo_url.strip())
+
+
+def credentialEnvironment(auth_url):
+    """
+    Environment passing the credentials of auth_url to a single git command as an HTTP
+    header, so they are never written to the mirror's config, which every worktree shares.
+    """
+    match = re.match(r'^\w+://([^/@]+)@', auth_url.strip())
+    if not match:
+        return None
+    credentials = base64.b64encode(match.group(1).encode('utf-8')).decode('ascii')
+    return dict(
+        os.environ, GIT_CONFIG_COUNT='1',
+        GIT_CONFIG_KEY_0='http.extraHeader', GIT_CONFIG_VALUE_0=f"Authorization: Basic {credentials}"
+    )
+
+
+def remoteKey(repo_url):
+    """
+    Identifies a remote independently of the credentials embedded in its URL.
+    """
+    url = withoutCredentials(repo_url).rstrip('/')
+    if url.endswith('.git'):
+        url = url[:-len('.git')]
+    scheme, separator, rest = url.partition('://')
+    if separator:
+        host, _, path = rest.partition('/')
+        url = f"{scheme.lower()}://{host.lower()}/{path}"
+    return url
+
+
+class MirrorPool:
+    """
+    One bare mirror per remote, shared by every container watching that remote.
+
+    Each container gets a `git worktree` of the mirror at its clone location: a checkout
+    plus a few kilobytes of metadata, while objects and refs live in the mirror. Branches
+    are fetched into refs/remotes/origin/* of the mirror, so each update only brings the
+    new commits, and every worktree sees them. Worktrees keep a detached HEAD, since git
+    doesn't let two worktrees check out the same branch.
+
+    Mirror updates hold a file lock, so processes sharing the root don't fetch into the
+    same mirror at once. Lock files are never deleted: a process waiting on one would
+    otherwise end up holding a lock nobody else sees.
+
+    The mirror's origin URL carries no credentials; each fetch gets the caller's own
+    through credentialEnvironment.
+    """
+
+    def __init__(self, root, idle_seconds=MIRROR_IDLE_SECONDS, max_mirrors=MIRROR_MAX_COUNT):
+        self.root = os.path.abspath(root)
+        self.idle_seconds = idle_seconds
+        self.max_mirrors = max_mirrors
+        os.makedirs(self.root, exist_ok=True)
+
+    def mirrorPath(self, repo_url):
+        return os.path.join(self.root, f"{string_to_sha256(remoteKey(repo_url))[:24]}.git")
+
+    def owns(self, git_common_dir):
+        """
+        Whether a repository's common git directory is one of the pool's mirrors.
+        """
+        return os.path.dirname(os.path.abspath(git_common_dir)) == self.root
+
+    @contextmanager
+    def _locked(self, mirror_path, blocking=True):
+        with open(f"{mirror_path}.{LOCK_FILE}", 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(self, *args, env=None):
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True, env=env).stdout
+
+    def _touch(self, mirror_path):
+        # The lock file's modification time records when the mirror was last used
+        os.utime(f"{mirror_path}.{LOCK_FILE}")
+
+    def _update(self, mirror_path, auth_url, branch, blob_filter):
+        # Called with the mirror's lock held
+        remote_url = withoutCredentials(auth_url)
+        if not os.path.isdir(mirror_path):
+            self._git("init", "-q", "--bare", mirror_path)
+            self._git("-C", mirror_path, "remote", "add", "origin", remote_url)
+            self._git("-C", mirror_path, "config", "remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*")
+        else:
+            # Also drops credentials stored in the config by older versions
+            self._git("-C", mirror_path, "remote", "set-url", "origin", remote_url)
+        fetch = ["-C", mirror_path, "fetch", "-q", "--no-tags"]
+        if blob_filter:
+            # Only takes effect on the first fetch, which turns the mirror into a partial clone
+            fetch.append(f"--filter={blob_filter}")
+        self._git(*fetch, "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}", env=credentialEnvironment(auth_url))
+        self._touch(mirror_path)
+
+    def update(self, mirror_path, auth_url, branch, blob_filter=''):
+        """
+        Creates the mirror if needed and fetches one branch into refs/remotes/origin/<branch>.
+        The credentials in auth_url are only used for this fetch.
+        """
+        with self._locked(mirror_path):
+            self._update(mirror_path, auth_url, branch, blob_filter)
+
+    def checkout(self, clone_location, auth_url, branch):
+        """
+        Moves a worktree to origin/<branch> (detached). The credentials in auth_url serve
+        the blobs a partial mirror downloads on checkout.
+        """
+        self._git("-C", clone_location, "checkout", "-q", "--detach", f"origin/{branch}", env=credentialEnvironment(auth_url))
+
+    def addWorktree(self, repo_url, auth_url, clone_location, branch='main', blob_filter='', sparse_patterns=None):
+        """
+        Gives a container its own worktree of the remote's mirror, fetching only what the
+        mirror doesn't have yet.
+
+        Parameters:
+        - repo_url (str): The remote, used to pick the mirror.
+        - auth_url (str): The URL to fetch from, with credentials.
+        - clone_location (str): Where the worktree goes; must not exist or be empty.
+        - branch (str): The branch to check out (detached).
+        - blob_filter (str): Partial-clone filter used when the mirror is created.
+        - sparse_patterns (list): Non-cone sparse-checkout patterns for the worktree, or None for a full checkout.
+
+        Returns:
+        - mirror_path (str): The mirror backing the worktree.
+        """
+        self.evictIdle()
+        mirror_path = self.mirrorPath(repo_url)
+        # One lock from the fetch to the new worktree, so the mirror can't be evicted in between
+        with self._locked(mirror_path):
+            self._update(mirror_path, auth_url, branch, blob_filter)
+            # Forget worktrees whose directories were removed, e.g. by a container that went away
+            self._git("-C", mirror_path, "worktree", "prune")
+            self._git("-C", mirror_path, "worktree", "add", "-q", "--detach", "--no-checkout",
+                      os.path.abspath(clone_location), f"origin/{branch}")
+        if sparse_patterns:
+            self._git("-C", clone_location, "sparse-checkout", "set", "--no-cone", *sparse_patterns, env=credentialEnvironment(auth_url))
+        self._git("-C", clone_location, "reset", "-q", "--hard", f"origin/{branch}", env=credentialEnvironment(auth_url))
+        return mirror_path
+
+    def removeWorktree(self, clone_location):
+        """
+        Deletes a container's worktree and unregisters it from its mirror.
+        """
+        common_dir = self._git("-C", clone_location, "rev-parse", "--path-format=absolute", "--git-common-dir").strip()
+        with self._locked(common_dir):
+            self._git("-C", common_dir, "worktree", "remove", "--force", os.path.abspath(clone_location))
+
+    def _worktreeCount(self, mirror_path):
+        self._git("-C", mirror_path, "worktree", "prune")
+        worktrees = os.path.join(mirror_path, "worktrees")
+        return len(os.listdir(worktrees)) if os.path.isdir(worktrees) else 0
+
+    def evictIdle(self):
+        """
+        Deletes mirrors no worktree uses any more, once they have been idle for idle_seconds,
+        or sooner, least recently used first, while there are more than max_mirrors.
+
+        Returns:
+        - evicted (list): The paths of the deleted mirrors.
+        """
+        mirrors = []
+        for name in os.listdir(self.root):
+            lock_path = os.path.join(self.root, f"{name}.{LOCK_FILE}")
+            if name.endswith('.git') and os.path.exists(lock_path):
+                mirrors.append((os.path.getmtime(lock_path), os.path.join(self.root, name)))
+        mirrors.sort()
+
+        evicted = []
+        now = time.time()
+        for last_used, mirror_path in mirrors:
+            over_capacity = len(mirrors) - len(evicted) > self.max_mirrors
+            if not over_capacity and now - last_used < self.idle_seconds:
+                continue
+            # Mirrors being updated or checked out right now are skipped
+            with self._locked(mirror_path, blocking=False) as locked:
+                # Another process may have evicted it since the listing
+                if not locked or not os.path.isdir(mirror_path):
+                    continue
+                try:
+                    if self._worktreeCount(mirror_path):
+                        continue
+                    # The lock file stays: other processes may be waiting on it
+                    shutil.rmtree(mirror_path)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    logger.error(f"Could not evict mirror {mirror_path}: {e}")
+                    continue
+            evicted.append(mirror_path)
+            logger.info(f"Evicted idle mirror {mirror_path}")
+        return evicted
+
+
+def createMirrorPool():
+    return MirrorPool(MIRROR_ROOT) if MIRROR_ROOT else None
@@ -0,0 +1,252 @@
+import os
+import time
+import queue
+import asyncio
+import inspect
+import logging
+import threading
+import contextvars
+
+from Metrics import stage_seconds
+
+logger = logging.getLogger(__name__)
+
+# Default capacity of the queue in front of each stage
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 64))
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    Parameters:
+    - name (str): Used in logs and stats.
+    - worker (callable): worker(item) returns the item to pass on, or None to drop it.
+      With batch_size > 1 it is called with a list of items and returns the list to pass on.
+      Under Pipeline.runAsync it may be a coroutine function.
+    - concurrency (int): Number of threads (or asyncio tasks, under runAsync) running the worker.
+    - queue_size (int): Capacity of the bounded queue feeding the stage. Defaults to PIPELINE_QUEUE_SIZE.
+    - batch_size (int): Maximum number of items handed to the worker at once. A batch holds
+      whatever is queued when a worker becomes free, so it never waits for more items.
+    """
+
+    def __init__(self, name, worker, concurrency=1, queue_size=None, batch_size=1):
+        self.name = name
+        self.worker = worker
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.batch_size = max(1, batch_size)
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker threads, so different items are in different
+    stages at the same time (e.g. Bandit scans the next files while earlier ones
+    wait on the LLM), and a full queue makes the stages before it wait rather
+    than pile up work. Workers run in a copy of the caller's context, so context
+    variables such as the job's cancellation flag still apply.
+
+    runAsync drives the same stages from an event loop: coroutine workers are
+    awaited on the loop, the others run in threads through asyncio.to_thread.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self._stats = {stage.name: {'processed': 0, 'dropped': 0, 'busySeconds': 0.0} for stage in stages}
+        self._lock = threading.Lock()
+
+    def run(self, items, on_done=None):
+        """
+        Pushes every item through the stages.
+
+        Parameters:
+        - items (list): The items to process.
+        - on_done (callable): Optional on_done(item, result) callback, called in the
+          calling thread as each item leaves the pipeline (result is None if it was dropped).
+
+        Returns:
+        - results (list): The output of the last stage for each item (None if dropped), in the order of items.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        finished = queue.Queue()
+        threads = []
+        for position, stage in enumerate(self.stages):
+            remaining = [stage.concurrency]
+            for index in range(stage.concurrency):
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._work, position, queues, finished, remaining),
+                    name=f"pipeline-{stage.name}-{index}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            for index, item in enumerate(items):
+                queues[0].put((index, item))
+            for _ in range(self.stages[0].concurrency):
+                queues[0].put(_STOP)
+
+        threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+
+        for _ in range(len(items)):
+            index, result = finished.get()
+            results[index] = result
+            if on_done is not None:
+                on_done(items[index], result)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _work(self, position, queues, finished, remaining):
+        stage = self.stages[position]
+        last = position == len(self.stages) - 1
+        while True:
+            batch = [queues[position].get()]
+            # Take whatever else is already waiting, up to the batch size
+            while len(batch) < stage.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(queues[position].get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                self._process(stage, batch, queues[position + 1] if not last else None, finished)
+            if stopping:
+                break
+
+        with self._lock:
+            remaining[0] -= 1
+            done = remaining[0] == 0
+        # The last worker of a stage to stop tells the next stage there is nothing more to come
+        if done and not last:
+            for _ in range(self.stages[position + 1].concurrency):
+                queues[position + 1].put(_STOP)
+
+    async def runAsync(self, items, on_done=None):
+        """
+        asyncio version of run(); on_done is called on the event loop.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        finished = asyncio.Queue()
+        remaining = [stage.concurrency for stage in self.stages]
+        tasks = [
+            asyncio.create_task(self._workAsync(position, queues, finished, remaining))
+            for position, stage in enumerate(self.stages) for _ in range(stage.concurrency)
+        ]
+
+        async def feed():
+            for index, item in enumerate(items):
+                await queues[0].put((index, item))
+            for _ in range(self.stages[0].concurrency):
+                await queues[0].put(_STOP)
+
+        tasks.append(asyncio.create_task(feed()))
+        try:
+            for _ in range(len(items)):
+                index, result = await finished.get()
+                results[index] = result
+                if on_done is not None:
+                    on_done(items[index], result)
+        finally:
+            # Only left running when the caller is cancelled or on_done raised
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    async def _workAsync(self, position, queues, finished, remaining):
+        stage = self.stages[position]
+        last = position == len(self.stages) - 1
+        while True:
+            batch = [await queues[position].get()]
+            while len(batch) < stage.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(queues[position].get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                started = time.monotonic()
+                try:
+                    argument = [item for _, item in batch] if stage.batch_size > 1 else batch[0][1]
+                    if inspect.iscoroutinefunction(stage.worker):
+                        outputs = await stage.worker(argument)
+                    else:
+                        outputs = await asyncio.to_thread(stage.worker, argument)
+                    if stage.batch_size == 1:
+                        outputs = [outputs]
+                except Exception as e:
+                    logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                    outputs = [None] * len(batch)
+                for index, output, passed_on in self._route(stage, batch, outputs, last, started):
+                    await (queues[position + 1] if passed_on else finished).put((index, output))
+            if stopping:
+                break
+
+        remaining[position] -= 1
+        if remaining[position] == 0 and not last:
+            for _ in range(self.stages[position + 1].concurrency):
+                await queues[position + 1].put(_STOP)
+
+    def _process(self, stage, batch, next_queue, finished):
+        started = time.monotonic()
+        try:
+            if stage.batch_size > 1:
+                outputs = stage.worker([item for _, item in batch])
+            else:
+                outputs = [stage.worker(batch[0][1])]
+        except Exception as e:
+            logger.error(f"Pipeline stage {stage.name} failed: {e}")
+            outputs = [None] * len(batch)
+        for index, output, passed_on in self._route(stage, batch, outputs, next_queue is None, started):
+            (next_queue if passed_on else finished).put((index, output))
+
+    def _route(self, stage, batch, outputs, last, started):
+        """
+        Pairs a batch with the stage's outputs and records the stage's stats.
+
+        Returns:
+        - routes (list): (index, output, passed on to the next stage) for each item of the batch.
+        """
+        if len(outputs) != len(batch):
+            # Every item must leave the pipeline, or run() would wait for it forever
+            logger.error(f"Pipeline stage {stage.name} returned {len(outputs)} output(s) for {len(batch)} item(s), dropping the missing ones")
+            outputs = list(outputs)[:len(batch)] + [None] * (len(batch) - len(outputs))
+
+        routes = [(index, output, output is not None and not last) for (index, _), output in zip(batch, outputs)]
+        dropped = sum(1 for _, output, _ in routes if output is None)
+        elapsed = time.monotonic() - started
+        stage_seconds.observe(elapsed, f"pipeline_{stage.name}")
+        with self._lock:
+            stats = self._stats[stage.name]
+            stats['processed'] += len(batch)
+            stats['dropped'] += dropped
+            stats['busySeconds'] += elapsed
+        return routes
+
+    def stats(self):
+        """
+        Returns per-stage counters: items processed, items dropped and total worker time.
+        """
+        with self._lock:
+            return {name: dict(stats, busySeconds=round(stats['busySeconds'], 3)) for name, stats in self._stats.items()}
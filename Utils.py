@@ -6,6 +6,20 @@ import hashlib
 import json
 import subprocess
 import re
+import threading
+import contextvars
+import tempfile
+import time
+import random
+import math
+import requests.adapters
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Pipeline import Pipeline, Stage
+from ImportGraph import ImportGraph
+from Metrics import registry, timed, llm_request_seconds, llm_requests_total, llm_errors_total, llm_retries_total, llm_request_bytes
 
 
 def generateSaastReport(file_path):
@@ -95,20 +109,175 @@ def get_code_snippet(file_path, line_number, context_lines=2):
     """
     try:
         with open(file_path, 'r') as file:
-            lines = file.readlines()
-            start = max(line_number - context_lines - 1, 0)
-            end = min(line_number + context_lines, len(lines))
-            return ''.join(lines[start:end]).strip()
+            return snippet_from_lines(file.readlines(), line_number, context_lines)
     except Exception as e:
         print(f"Error reading file {file_path} for code snippet: {e}")
         return None
 
 
+def snippet_from_lines(lines, line_number, context_lines=2):
+    """
+    Same as get_code_snippet, for a file whose lines (with line endings) are already loaded.
+    """
+    start = max(line_number - context_lines - 1, 0)
+    end = min(line_number + context_lines, len(lines))
+    return ''.join(lines[start:end]).strip()
+
+
+# Number of files passed to a single Bandit process in batch mode
+BANDIT_BATCH_SIZE = int(os.getenv('BANDIT_BATCH_SIZE', 200))
+# Number of Bandit processes run side by side in batch mode
+BANDIT_MAX_PROCESSES = int(os.getenv('BANDIT_MAX_PROCESSES', 4))
+
+
+def _runBanditShard(file_paths):
+    """
+    Runs one Bandit process over a shard of files and returns its parsed JSON output.
+    """
+    with timed("bandit"):
+        result = subprocess.run(
+            ["bandit", "-f", "json", "-q", *file_paths],
+            capture_output=True,
+            text=True
+        )
+    # Bandit exits with 1 when it found issues, so rely on the output instead
+    return json.loads(result.stdout)
+
+
+@lru_cache(maxsize=1)
+def banditVersion():
+    """
+    Returns the installed Bandit version, used to namespace cached SAST results,
+    or None if Bandit can't be run.
+    """
+    try:
+        result = subprocess.run(["bandit", "--version"], capture_output=True, text=True)
+    except OSError:
+        return None
+    match = re.search(r"bandit\s+(\S+)", result.stdout)
+    return match.group(1) if match else None
+
+
+def generateSaastReports(file_paths, snapshot=None, max_processes=None):
+    """
+    Runs Bandit once per shard of BANDIT_BATCH_SIZE files instead of once per file.
+
+    Findings are parsed from Bandit's JSON output and indexed by file, in the same
+    format as generateSaastReport. Code snippets are cut from the snapshot's
+    already-loaded content rather than by reopening the file.
+
+    Results are cached under sast:<bandit-version>:<sha256>, so unchanged files
+    are never rescanned, whatever branch, clone or container they come from.
+
+    Parameters:
+    - file_paths (list): Files to scan. Non-Python and missing files are ignored.
+    - snapshot (RepoSnapshot): Optional snapshot holding the files' contents.
+    - max_processes (int): Bandit processes run side by side. Defaults to BANDIT_MAX_PROCESSES.
+
+    Returns:
+    - reports (dict): File path -> list of issues, for every Python file that was scanned.
+      Files in a shard whose Bandit run failed are left out.
+    """
+    if snapshot is None:
+        python_files = [path for path in dict.fromkeys(file_paths) if path.endswith(".py") and os.path.isfile(path)]
+        if not python_files:
+            return {}
+        snapshot = RepoSnapshot(os.path.commonpath(python_files), python_files)
+    else:
+        python_files = [path for path in dict.fromkeys(file_paths) if path.endswith(".py") and snapshot.exists(path)]
+        if not python_files:
+            return {}
+
+    version = banditVersion()
+    content_hashes = {}
+    for file_path in python_files:
+        loaded = snapshot.load(file_path)
+        if loaded is not None:
+            content_hashes[file_path] = loaded[1]
+
+    reports = {}
+    cached = analysis_cache.get_many("sast", content_hashes.values(), version=version) if version else {}
+    for file_path, content_hash in content_hashes.items():
+        if content_hash not in cached:
+            continue
+        reports[file_path] = []
+        for issue in cached[content_hash]:
+            # The cached location points at whichever clone scanned the file first
+            _, line_number, column = issue["location"].rsplit(":", 2)
+            reports[file_path].append(dict(issue, location=f"{file_path}:{line_number}:{column}"))
+    to_scan = [file_path for file_path in python_files if file_path not in reports]
+    if to_scan:
+        logger.info(f"SAST cache: {len(reports)} hit(s), scanning {len(to_scan)} file(s) with Bandit")
+
+    shards = [to_scan[start:start + BANDIT_BATCH_SIZE] for start in range(0, len(to_scan), BANDIT_BATCH_SIZE)]
+
+    def scan(shard):
+        try:
+            return shard, _runBanditShard(shard)
+        except FileNotFoundError:
+            print("Error: Bandit is not installed. Install it with `pip install bandit`.")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return shard, None
+
+    file_lines = {}
+    scanned = []
+    # Files of a commit snapshot are written to a temporary directory for Bandit
+    with snapshot.materialized(to_scan) as scan_paths:
+        by_path = {os.path.normpath(scan_paths[path]): path for path in to_scan}
+        shard_outputs = runConcurrently([[scan_paths[path] for path in shard] for shard in shards], scan, max_processes or BANDIT_MAX_PROCESSES)
+    for shard, (_, output) in zip(shards, shard_outputs):
+        if output is None:
+            continue
+        for file_path in shard:
+            reports[file_path] = []
+        scanned.extend(shard)
+        for result in output.get("results", []):
+            file_path = by_path.get(os.path.normpath(result["filename"]))
+            if file_path is None:
+                continue
+            line_number = result["line_number"]
+            issue = {
+                "issue": f"[{result['test_id']}:{result['test_name']}] {result['issue_text']}",
+                "severity": result["issue_severity"].capitalize(),
+                "confidence": result["issue_confidence"].capitalize(),
+            }
+            cwe = result.get("issue_cwe") or {}
+            if cwe.get("id"):
+                issue["cwe"] = f"CWE-{cwe['id']}"
+                issue["cwe_url"] = cwe.get("link")
+            issue["more_info"] = result.get("more_info")
+            issue["location"] = f"{file_path}:{line_number}:{result.get('col_offset', 0)}"
+            issue["line_number"] = line_number
+
+            # Retrieve the code snippet from the loaded content when possible
+            if file_path not in file_lines:
+                loaded = snapshot.load(file_path)
+                file_lines[file_path] = loaded[0].splitlines(keepends=True) if loaded else None
+            if file_lines[file_path] is not None:
+                issue["code_snippet"] = snippet_from_lines(file_lines[file_path], line_number)
+            else:
+                issue["code_snippet"] = get_code_snippet(file_path, line_number)
+            reports[file_path].append(issue)
+
+    if version:
+        with analysis_cache.batched_writes():
+            for file_path in scanned:
+                if file_path in content_hashes:
+                    analysis_cache.set("sast", content_hashes[file_path], reports[file_path], version=version)
+    return reports
+
+
 
 redis_host = os.getenv('REDIS_HOST', 'redis_server')
 redis_port = os.getenv('REDIS_PORT', 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port)
 
+# Base URL of the llama analysis service
+LLM_SERVICE_URL = os.getenv('LLM_SERVICE_URL', 'http://llama3_1CodeSecu_service:8000')
+# Worker threads per LLM stage of an analysis run; requests actually in flight are capped by LLM_MAX_IN_FLIGHT
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', 4))
+
 def test_redis_connection():
     try:
         # Attempt to set and get a test key
@@ -142,6 +311,261 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Bump this whenever the shape of cached analysis results changes
+CACHE_SCHEMA_VERSION = os.getenv('CACHE_SCHEMA_VERSION', 'v1')
+# Number of entries kept in the in-process LRU in front of Redis
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 4096))
+# Number of keys sent to Redis per pipelined MGET/SET batch
+CACHE_PIPELINE_BATCH = int(os.getenv('CACHE_PIPELINE_BATCH', 500))
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for analysis results.
+
+    Entries are keyed by "<family>:<version>:<sha256>", where family is one of
+    repoAnalysis, context, vulnerability or compliance (whose digest is prefixed
+    with the policy hash, see complianceDigest). Hot entries live in a
+    bounded in-process LRU; everything else falls back to Redis.
+    """
+
+    def __init__(self, client, max_entries=ANALYSIS_CACHE_SIZE, version=CACHE_SCHEMA_VERSION):
+        self.client = client
+        self.max_entries = max_entries
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Write buffer of the enclosing batched_writes() block, seen by the threads it starts
+        self._write_batch = contextvars.ContextVar(f'write_batch_{id(self)}', default=None)
+
+    def key(self, family, digest, version=None):
+        return f"{family}:{version or self.version}:{digest}"
+
+    def _count(self, family, counter):
+        family_stats = self._stats.setdefault(family, {'localHits': 0, 'redisHits': 0, 'misses': 0})
+        family_stats[counter] += 1
+
+    def _remember(self, key, value):
+        # Caller must hold self._lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, family, digest, version=None, prefetched=None):
+        """
+        Returns the cached value for the given family and content hash, or None on a miss.
+
+        When prefetched (the result of prefetch()) covers the family, it is
+        authoritative and Redis is not consulted again.
+        """
+        if prefetched is not None and family in prefetched:
+            return prefetched[family].get(digest)
+
+        key = self.key(family, digest, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count(family, 'localHits')
+                return self._entries[key]
+
+        try:
+            with timed("redis_get"):
+                cached = self.client.get(key)
+        except redis.RedisError as e:
+            logger.error(f"Redis lookup failed for {key}: {e}")
+            cached = None
+
+        with self._lock:
+            if cached is None:
+                self._count(family, 'misses')
+                return None
+            value = json.loads(cached)
+            self._remember(key, value)
+            self._count(family, 'redisHits')
+            return value
+
+    def get_many(self, family, digests, version=None):
+        """
+        Resolves many content hashes of one family at once.
+
+        Entries missing from the in-process LRU are fetched from Redis with
+        pipelined MGETs of CACHE_PIPELINE_BATCH keys each.
+
+        Returns:
+        - found (dict): Content hash -> cached value, for the hashes that were found.
+        """
+        found, remote = self.local_lookup(family, digests, version)
+
+        for start in range(0, len(remote), CACHE_PIPELINE_BATCH):
+            batch = remote[start:start + CACHE_PIPELINE_BATCH]
+            try:
+                with timed("redis_mget"):
+                    values = self.client.mget([self.key(family, digest, version) for digest in batch])
+            except redis.RedisError as e:
+                logger.error(f"Redis batch lookup failed for {family}: {e}")
+                values = [None] * len(batch)
+            found.update(self.remember_fetched(family, batch, values, version))
+        return found
+
+    def local_lookup(self, family, digests, version=None):
+        """
+        Looks content hashes up in the in-process LRU only.
+
+        Returns:
+        - (found, remote): {content hash: value} for local hits, and the hashes still to fetch from Redis.
+        """
+        found = {}
+        remote = []
+        with self._lock:
+            for digest in dict.fromkeys(digests):
+                key = self.key(family, digest, version)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._count(family, 'localHits')
+                    found[digest] = self._entries[key]
+                else:
+                    remote.append(digest)
+        return found, remote
+
+    def remember_fetched(self, family, digests, values, version=None):
+        """
+        Records raw values fetched from Redis (None for misses) in the LRU and the counters.
+
+        Returns:
+        - found (dict): Content hash -> decoded value, for the hashes that were found.
+        """
+        found = {}
+        with self._lock:
+            for digest, cached in zip(digests, values):
+                if cached is None:
+                    self._count(family, 'misses')
+                    continue
+                value = json.loads(cached)
+                self._remember(self.key(family, digest, version), value)
+                self._count(family, 'redisHits')
+                found[digest] = value
+        return found
+
+    def remember(self, family, digest, value, version=None):
+        """
+        Stores a value in the in-process LRU only, for callers that write Redis themselves.
+        """
+        with self._lock:
+            self._remember(self.key(family, digest, version), value)
+
+    def prefetch(self, lookups):
+        """
+        Resolves every key an analysis run is going to need before any LLM work starts.
+
+        Parameters:
+        - lookups (dict): Key family -> list of content hashes.
+
+        Returns:
+        - prefetched (dict): Key family -> {content hash: cached value}. Pass it to get()
+          so that lookups for prefetched families never go back to Redis.
+        """
+        return {family: self.get_many(family, digests) for family, digests in lookups.items()}
+
+    def set(self, family, digest, value, version=None):
+        """
+        Stores a value in both the in-process LRU and Redis.
+
+        Inside a batched_writes() block the Redis write is buffered and sent
+        with the block's next pipelined flush.
+        """
+        key = self.key(family, digest, version)
+        batch = self._write_batch.get()
+        with self._lock:
+            self._remember(key, value)
+            if batch is not None:
+                batch[key] = value
+                if len(batch) < CACHE_PIPELINE_BATCH:
+                    return
+                pending = dict(batch)
+                batch.clear()
+            else:
+                pending = {key: value}
+        self._write(pending)
+
+    def _write(self, pending):
+        if not pending:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in pending.items():
+                pipe.set(key, json.dumps(value))
+            with timed("redis_write"):
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Redis write failed for {len(pending)} key(s): {e}")
+
+    def flush(self):
+        """
+        Sends the writes buffered by the current batched_writes() block to Redis.
+        """
+        batch = self._write_batch.get()
+        if batch is None:
+            return
+        with self._lock:
+            pending = dict(batch)
+            batch.clear()
+        self._write(pending)
+
+    @contextmanager
+    def batched_writes(self):
+        """
+        Buffers Redis writes made inside the block, and by the threads it starts, and
+        sends them in pipelined batches. Each block has its own buffer and flushes it on
+        exit, whatever other blocks (of other jobs) are still open.
+        """
+        token = self._write_batch.set({})
+        try:
+            yield self
+        finally:
+            try:
+                self.flush()
+            finally:
+                self._write_batch.reset(token)
+
+    def stats(self):
+        """
+        Returns a copy of the hit/miss counters, per key family.
+        """
+        with self._lock:
+            return {family: dict(counters) for family, counters in self._stats.items()}
+
+    def clear(self):
+        """
+        Drops the in-process entries. Redis is left untouched.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+analysis_cache = AnalysisCache(redis_client)
+
+
+def cacheMetrics():
+    """
+    Lookup counters and hit ratio of the analysis cache per key family, for /metrics.
+    """
+    lookups = {}
+    ratios = {}
+    for family, counters in analysis_cache.stats().items():
+        for counter, result in (('localHits', 'local_hit'), ('redisHits', 'redis_hit'), ('misses', 'miss')):
+            lookups[(('family', family), ('result', result))] = counters[counter]
+        total = counters['localHits'] + counters['redisHits'] + counters['misses']
+        ratios[(('family', family),)] = round((counters['localHits'] + counters['redisHits']) / total, 4) if total else 0
+    return [
+        ('scanner_cache_lookups_total', 'counter', 'Analysis cache lookups, by key family and result', lookups),
+        ('scanner_cache_hit_ratio', 'gauge', 'Share of analysis cache lookups answered from the LRU or Redis, by key family', ratios),
+    ]
+
+registry.collector('cache', cacheMetrics)
+
+
 def read_file(file_path):
     """
     Reads the content of a file and returns it as a string.
@@ -154,662 +578,2387 @@ def read_file(file_path):
         return None
 
 
-def fullRepoAnalysis(repoPath):
+def runConcurrently(items, worker, max_workers=None, on_done=None):
     """
-    Analyzes all relevant files in the repository.
+    Runs worker(item) for every item on a bounded thread pool.
 
     Parameters:
-    - repoPath (str): The path to the repository.
+    - items (list): The work items.
+    - worker (callable): Function called once per item.
+    - max_workers (int): Maximum number of in-flight calls. Defaults to LLM_MAX_WORKERS.
+    - on_done (callable): Optional on_done(item, result), called from the calling thread
+      as soon as each item completes.
 
     Returns:
-    - repo_analysis (dict): A dictionary with file paths as keys and analysis results as values.
+    - results (list): The worker results, in the same order as items.
     """
-    accepted_extensions = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
+    max_workers = max_workers or LLM_MAX_WORKERS
+    if max_workers <= 1 or len(items) <= 1:
+        results = []
+        for item in items:
+            results.append(worker(item))
+            if on_done is not None:
+                on_done(item, results[-1])
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each task runs in a copy of the caller's context so that job state (e.g. cancellation) follows it
+        futures = {executor.submit(contextvars.copy_context().run, worker, item): index for index, item in enumerate(items)}
+        results = [None] * len(items)
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_done is not None:
+                on_done(items[index], results[index])
+        return results
+
+
+# Minimum number of seconds between two progress notifications of a scan
+PROGRESS_INTERVAL_SECONDS = float(os.getenv('PROGRESS_INTERVAL_SECONDS', 2))
+
+
+class ScanProgress:
+    """
+    Reports the per-file results of a scan as they complete.
 
-    repo_path = repoPath  # repoPath is the absolute path to the repository
+    on_result(entry) is called for every report entry; on_progress(progress) is
+    called at most every PROGRESS_INTERVAL_SECONDS (and once the scan is done)
+    with the number of files done, the total, and an ETA extrapolated from the
+    average time per file so far.
+    """
 
-    if not os.path.isdir(repo_path):
-        logger.error(f"Repository {repoPath} not found!")
-        return {}
+    def __init__(self, on_result=None, on_progress=None, interval=None):
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.interval = PROGRESS_INTERVAL_SECONDS if interval is None else interval
+        self.total = 0
+        self.done = 0
+        self.succeeded = 0
+        self.pending = []
+        self.started_at = time.monotonic()
+        self._last_notified = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, total):
+        with self._lock:
+            self.total = total
+            self.started_at = time.monotonic()
+        self._notify(force=True)
+
+    def fileDone(self, entry, pending=None):
+        """
+        Records one finished file. entry is its report entry, or None if the file failed.
+        pending is the file's path when (some of) its analysis was left out because the
+        check ran out of time.
+        """
+        with self._lock:
+            self.done += 1
+            if entry is not None:
+                self.succeeded += 1
+            if pending is not None:
+                self.pending.append(pending)
+        if entry is not None and self.on_result is not None:
+            self.on_result(entry)
+        self._notify(force=self.done >= self.total)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            remaining = self.total - self.done
+            eta = elapsed / self.done * remaining if self.done else None
+            return {
+                'done': self.done,
+                'total': self.total,
+                'succeeded': self.succeeded,
+                'pending': len(self.pending),
+                'elapsedSeconds': round(elapsed, 1),
+                'etaSeconds': round(eta, 1) if eta is not None else None,
+            }
 
-    repo_analysis = {}
-    # Walk through all files in the repo
-    for dirpath, _, filenames in os.walk(repo_path):
-        for filename in filenames:
-            # Get the full file path
-            file_path = os.path.join(dirpath, filename)
-
-            # Check if the file has an accepted extension
-            _, file_extension = os.path.splitext(filename)
-            if file_extension.lower() not in accepted_extensions:
-                logger.info(f"Skipping {file_path} (not a programming file)")
-                continue
-            
-            # Read the file content
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    file_content = file.read()
-                # Analyze the file
-                logger.info(f"Analyzing {file_path}...")
-                logger.debug(f"File content: {file_content}")    
-                data = {
-                    'fileName': filename,
-                    'filePath': file_path,
-                    'fileContent': file_content
-                }
+    def pendingFiles(self):
+        with self._lock:
+            return list(self.pending)
 
-                searchQuery = "repoAnalysis:" + file_content
-                cached_analysis = redis_client.get(searchQuery)
-                analysis_result = None
-                if cached_analysis:
-                    # If found in Redis, use the cached result
-                    analysis_result = json.loads(cached_analysis)
-                    print(f"Cache hit for {file_path}")
-                else:
-                    # Send the request to the API
-                    try:
-                        response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_repo_code', json=data)
-                        response.raise_for_status()
-                    except requests.RequestException as e:
-                        logger.error(f"Error sending request to the API for {file_path}: {e}")
-                        continue
-    
-                    # Parse the response
-                    analysis_result = response.json() if response.status_code == 200 else None
-                    if analysis_result != None:
-                        redis_client.set(searchQuery, json.dumps(analysis_result))
+    def _notify(self, force=False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notified < self.interval:
+                return
+            self._last_notified = now
+        self.on_progress(self.snapshot())
 
-                if analysis_result is None:
-                    logger.warning(f"Failed to analyze {file_path}, Status Code: {response.status_code}")
-                    continue
 
-                # Store the analysis result in the dictionary
-                repo_analysis[file_path] = analysis_result
+# Cancellation flag (a threading.Event) of the job the current code runs for, if any
+current_cancel_event = contextvars.ContextVar('current_cancel_event', default=None)
 
-            except Exception as e:
-                logger.error(f"Error reading or analyzing file {file_path}: {e}")
-    
-    return repo_analysis
+
+def scanCancelled():
+    """
+    Returns True once the job the calling code runs for has been cancelled.
+    Analysis loops check it before issuing any new LLM request.
+    """
+    cancel_event = current_cancel_event.get()
+    return cancel_event is not None and cancel_event.is_set()
+
+
+# (start, seconds) time budget of the check the current code runs for, if it was given one
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+# Share of a check's time budget after which the repo analysis (fMap) stops issuing requests
+REPO_ANALYSIS_DEADLINE_SHARE = float(os.getenv('REPO_ANALYSIS_DEADLINE_SHARE', 0.5))
 
 
-def analyzeRepositoryForContextAndReport(repoPath, repo_analysis):
+def deadlineRemaining(share=1.0):
     """
-    Analyzes the repository for context and generates a vulnerability report.
+    Seconds left of the current check's time budget (or of the given share of it),
+    or None if the check has no budget.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    started, seconds = deadline
+    return started + seconds * share - time.monotonic()
 
-    Parameters:
-    - repoPath (str): The path to the repository.
-    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
 
-    Returns:
-    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+def deadlineReached(share=1.0):
     """
-    relatedFiles = {}
-    report = []
-    accepted_extensions = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
-    repo_path = repoPath  # repoPath is the absolute path to the repository
+    Returns True once the current check's time budget (or the given share of it) is used up.
+    Analysis loops check it before issuing any new LLM request, like scanCancelled().
+    """
+    remaining = deadlineRemaining(share)
+    return remaining is not None and remaining <= 0
 
-    if not os.path.isdir(repo_path):
-        logger.error(f"Repository {repoPath} not found!")
-        return report
 
-    
-    # Walk through all files in the repo
-    for dirpath, _, filenames in os.walk(repo_path):
-        for filename in filenames:
-            # Get the full file path
-            file_path = os.path.join(dirpath, filename)
-
-            # Check if the file has an accepted extension
-            _, file_extension = os.path.splitext(filename)
-            if file_extension.lower() not in accepted_extensions:
-                logger.info(f"Skipping {file_path} (not a programming file)")
-                continue
-            
-            # Read the file content
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    file_content = file.read()
+@contextmanager
+def scanDeadline(seconds):
+    """
+    Gives the code run in the block (and the threads it starts) a time budget of
+    `seconds`; no budget when seconds is empty.
+    """
+    token = current_deadline.set((time.monotonic(), float(seconds)) if seconds else None)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+# Requests to the LLM service in flight at once, shared by every stage, chunk and scan of the process
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', LLM_MAX_WORKERS))
+# Connections kept open to the LLM service: one per request in flight is enough
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', LLM_MAX_IN_FLIGHT))
+# Time allowed to open a connection to the LLM service
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', 5))
+# Time allowed between bytes of an LLM response; model inference can be slow
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv('LLM_READ_TIMEOUT_SECONDS', 600))
+# Retries of an idempotent LLM request after a connection error, a timeout or a 429/502/503/504
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+# Base delay of the exponential backoff between retries (full jitter)
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv('LLM_RETRY_BACKOFF_SECONDS', 0.5))
+# Consecutive failures after which requests fail fast instead of reaching the service
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+# How long the breaker stays open before letting a trial request through
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+
+# Analysis endpoints have no side effects and can be retried; /register_fmap creates a handle
+IDEMPOTENT_LLM_ENDPOINTS = {'analyze_repo_code', 'analyze_context', 'analyze_vulnerabilities', 'analyze_compliance'}
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class LLMServiceUnavailable(requests.ConnectionError):
+    """
+    Raised without contacting the service while the circuit breaker is open.
+    """
 
-                logger.info(f"Analyzing {file_path} for context...")
 
-                # Send a request to the API for context analysis
-                data = {
-                    'fileName': filename,
-                    'fileContent': file_content,
-                    'fMap': repo_analysis
-                }
-                context_search_query = "context:" + string_to_sha256(file_content)
-                vulnerability_search_query = "vulnerability:" + string_to_sha256(file_content)
-
-                cached_context_analysis = redis_client.get(context_search_query)
-                analysis_result = None
-                
-                if cached_context_analysis:
-                    analysis_result = json.loads(cached_context_analysis)
-                else:
-                    try:
-                        response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_context', json=data)
-                        response.raise_for_status()
-                    except requests.RequestException as e:
-                        logger.error(f"Error sending context request to the API for {file_path}: {e}")
-                        continue
-    
-                    # Parse the context analysis response
-                    analysis_result = response.json() if response.status_code == 200 else None
-                    if analysis_result != None:
-                        redis_client.set(context_search_query, json.dumps(analysis_result))
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_seconds`.
+    Then a single trial call is let through: success closes the breaker, failure opens it again.
 
-                if analysis_result is None:
-                    logger.warning(f"Failed to analyze context for {file_path}, Status Code: {response.status_code}")
-                    continue
+    allow() returns the permit of the call. Callers pass it to abandoned() once the call is
+    over, so a trial that ended without a success or a failure (cut short by a deadline, or
+    an unexpected error) doesn't keep the breaker half-open for good.
+    """
 
-                # Store the analysis result in the dictionary
-                relatedFiles[filename] = analysis_result
-
-                # Prepare the codes for vulnerability analysis
-                codes = "_____________________________________\n"
-                codes += "Code File under analysis : \n"
-                codes += f"{filename}\n{file_content}"
-                saast_report = generateSaastReport(file_path)
-                if saast_report:
-                    codes += "\n_____________________________________\n"
-                    codes += "Static Application Security Testing (SAST) report : \n"
-                    codes += json.dumps(saast_report, indent=2)
-                codes += "_____________________________________"
-                codes += "\n Related / Dependant Code files \n"
-
-                for rf in analysis_result:
-                    related_file_name = rf.get("relatedFileName")
-                    related_file_path = rf.get("relatedFilePath")
-
-                    if not related_file_name or not related_file_path:
-                        logger.warning(f"Invalid related file info for {file_path}: {rf}")
-                        continue
-
-                    related_full_path = related_file_path
-                    logger.info(f"Using absolute path for related file: {related_full_path}")
-          
-                    # Read the related file content
-                    related_content = read_file(related_full_path)
-                    
-                    if related_content:
-                        codes += f"{related_file_name}\n{related_content}\n"
-                        codes += "_____________________________________\n"
-                    else:
-                        logger.warning(f"Could not read related file: {related_full_path}")
-                
-                # Analyze vulnerabilities
-                vulnerability_data = {
-                    'fileName': filename,
-                    'fileContent': codes
-                }
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns False while the breaker is open, else a (truthy) permit for the call.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial is not None:
+                return False
+            self._trial = object()
+            return self._trial
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            trial = self._trial is not None
+            if trial or self.failures >= self.threshold:
+                if self.opened_at is None or trial:
+                    logger.error(f"LLM service failing ({self.failures} consecutive errors), failing fast for {self.reset_seconds}s")
+                self.opened_at = time.monotonic()
+                self._trial = None
+
+    def abandoned(self, permit):
+        """
+        Ends the call given `permit` by allow(). When it was the trial and neither
+        succeeded() nor failed() was reported, the next call may be the trial instead.
+        """
+        with self._lock:
+            if permit is self._trial:
+                self._trial = None
+
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+
+class EndpointLatency:
+    """
+    Per-endpoint request counters and latency (in seconds) of the LLM service.
+    Percentiles are computed over the last `window` requests of each endpoint.
+    """
 
-                cached_vulnerability_report = redis_client.get(vulnerability_search_query)
-                c_report = None
-                if cached_vulnerability_report:
-                    c_report = json.loads(cached_vulnerability_report)
-                    print(f"Vulnerability cache hit for {file_path}")
-                else:
-                    try:
-                        vulnerability_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_vulnerabilities', json=vulnerability_data)
-                        vulnerability_response.raise_for_status()
-                    except requests.RequestException as e:
-                        logger.error(f"Error sending vulnerability request to the API for {file_path}: {e}")
-                        continue
-    
-                    # Parse the vulnerability analysis response
-                    c_report = vulnerability_response.json() if vulnerability_response.status_code == 200 else None
-                    if c_report !=None : 
-                        redis_client.set(vulnerability_search_query, json.dumps(c_report))
-                        
-                    if c_report is None:
-                        logger.warning(f"Failed to analyze vulnerabilities for {file_path}, Status Code: {vulnerability_response.status_code}")
-                        continue
-
-                logger.info(f"Vulnerability Report for {file_path}: {c_report}")
-                report.append({"fileName": filename, "report": c_report})
-               
-                
-            except Exception as e:
-                logger.error(f"Error reading or analyzing file {file_path}: {e}")
-            
-            
-     
-    
-    return report
+    def __init__(self, window=1000):
+        self.window = window
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error=False):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {'requests': 0, 'errors': 0, 'retries': 0, 'totalSeconds': 0.0, 'samples': []})
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['totalSeconds'] += seconds
+            stats['samples'].append(seconds)
+            del stats['samples'][:-self.window]
+        llm_request_seconds.observe(seconds, endpoint)
+        llm_requests_total.inc(endpoint)
+        if error:
+            llm_errors_total.inc(endpoint)
+
+    def retried(self, endpoint):
+        with self._lock:
+            self._endpoints.setdefault(endpoint, {'requests': 0, 'errors': 0, 'retries': 0, 'totalSeconds': 0.0, 'samples': []})['retries'] += 1
+        llm_retries_total.inc(endpoint)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                samples = sorted(stats['samples'])
+                percentile = lambda p: round(samples[min(int(p * len(samples)), len(samples) - 1)], 3) if samples else None
+                result[endpoint] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'averageSeconds': round(stats['totalSeconds'] / stats['requests'], 3) if stats['requests'] else None,
+                    'p50Seconds': percentile(0.5),
+                    'p95Seconds': percentile(0.95),
+                    'maxSeconds': round(samples[-1], 3) if samples else None,
+                }
+            return result
 
 
-def analyzeASetOfFilesForContextAndReport(repoPath, filepathsArr, repo_analysis):
+def encodeJson(payload):
     """
-    Analyzes a specific set of files within a repository for context and generates vulnerability reports.
+    Encodes a request body as UTF-8 JSON.
+    """
+    return json.dumps(payload).encode('utf-8')
 
-    Parameters:
-    - repoPath (str): The path to the repository.
-    - filepathsArr (list): List of file paths to analyze within the repository.
-    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
 
-    Returns:
-    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+def retryDelay(attempt):
     """
-    report = []
-    accepted_extensions = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
-    repo_path = repoPath  # repoPath is the absolute path to the repository
+    Full-jitter exponential backoff: a random delay up to base * 2^attempt seconds.
+    """
+    return random.uniform(0, LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt))
 
-    if not os.path.isdir(repo_path):
-        logger.error(f"Repository {repoPath} not found!")
-        return report
 
-    for file_relative_path in filepathsArr:
-        # Construct the absolute file path
-        file_path = os.path.join(repo_path, file_relative_path)
+class LLMClient:
+    """
+    Shared HTTP client for the LLM service.
 
-        # Check if the file exists
-        if not os.path.isfile(file_path):
-            logger.warning(f"File {file_path} does not exist. Skipping.")
-            continue
+    A single keep-alive requests.Session with a pool of LLM_POOL_SIZE connections
+    serves every endpoint. At most max_in_flight requests are sent at once, however
+    many stages and scans are posting. Requests have connect and read timeouts, idempotent
+    calls are retried with jittered backoff, and a circuit breaker fails fast
+    (LLMServiceUnavailable, a requests.ConnectionError) while the service is down.
+    """
 
-        # Check if the file has an accepted extension
-        _, file_extension = os.path.splitext(file_path)
-        if file_extension.lower() not in accepted_extensions:
-            logger.info(f"Skipping {file_path} (not a programming file)")
-            continue
+    def __init__(self, base_url=LLM_SERVICE_URL, pool_size=LLM_POOL_SIZE, max_in_flight=LLM_MAX_IN_FLIGHT):
+        self.base_url = base_url
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker()
+        self.latency = EndpointLatency()
+
+    def post(self, endpoint, json=None, data=None, headers=None):
+        """
+        Posts to an LLM service endpoint (e.g. "analyze_context").
+
+        Returns:
+        - response (requests.Response): The last response, including non-retryable error statuses.
+          Raises requests.RequestException when the service can't be reached.
+        """
+        if json is not None:
+            # Encoded once here rather than by requests on every attempt, which also gives its size
+            data, json = encodeJson(json), None
+            headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        llm_request_bytes.observe(len(data) if data else 0, endpoint)
+        retries = LLM_MAX_RETRIES if endpoint in IDEMPOTENT_LLM_ENDPOINTS else 0
+        for attempt in range(retries + 1):
+            permit = self.breaker.allow()
+            if not permit:
+                raise LLMServiceUnavailable(f"LLM service circuit breaker is open, not calling {endpoint}")
+            try:
+                # A check with a time budget doesn't wait for answers past its deadline
+                remaining = deadlineRemaining()
+                if remaining is not None and remaining <= 0:
+                    raise requests.Timeout(f"Time budget of the check used up, not calling {endpoint}")
+                # Waits for one of the process's LLM_MAX_IN_FLIGHT slots, held only while the request is out
+                if not self.slots.acquire(timeout=remaining):
+                    raise requests.Timeout(f"Time budget of the check used up waiting to call {endpoint}")
+                remaining = deadlineRemaining()
+                read_timeout = LLM_READ_TIMEOUT_SECONDS if remaining is None else max(min(LLM_READ_TIMEOUT_SECONDS, remaining), 0.001)
+
+                started = time.monotonic()
+                try:
+                    try:
+                        response = self.session.post(
+                            f'{self.base_url}/{endpoint}', json=json, data=data, headers=headers,
+                            timeout=(LLM_CONNECT_TIMEOUT_SECONDS, read_timeout)
+                        )
+                    finally:
+                        self.slots.release()
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.latency.record(endpoint, time.monotonic() - started, error=True)
+                    if deadlineReached():
+                        # Cut short by the check's deadline, which says nothing about the service's health
+                        raise
+                    self.breaker.failed()
+                    if attempt == retries or scanCancelled():
+                        raise
+                    logger.warning(f"{endpoint} request failed ({e}), retrying")
+                else:
+                    failed = response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500
+                    self.latency.record(endpoint, time.monotonic() - started, error=failed)
+                    if failed:
+                        self.breaker.failed()
+                    else:
+                        self.breaker.succeeded()
+                    if response.status_code not in RETRYABLE_STATUS_CODES or attempt == retries or scanCancelled() or deadlineReached():
+                        return response
+                    logger.warning(f"{endpoint} returned {response.status_code}, retrying")
+            finally:
+                self.breaker.abandoned(permit)
 
-        try:
-            # Read the file content
-            with open(file_path, 'r', encoding='utf-8') as file:
-                file_content = file.read()
+            self.latency.retried(endpoint)
+            time.sleep(retryDelay(attempt))
 
-            logger.info(f"Analyzing {file_path} for context...")
+    def stats(self):
+        return {'breaker': self.breaker.state(), 'endpoints': self.latency.stats()}
 
-            # Send a request to the context analysis API
-            context_data = {
-                'fileName': os.path.basename(file_path),
-                'fileContent': file_content,
-                'fMap': repo_analysis
-            }
-            context_search_query = "context:" + string_to_sha256(file_content)
-            vulnerability_search_query = "vulnerability:" + string_to_sha256(file_content)
-
-            cached_context_analysis = redis_client.get(context_search_query)
-            
-            context_analysis = None
-            if cached_context_analysis:
-                context_analysis = json.loads(cached_context_analysis)
-                print(f"Context cache hit for {file_path}")
-            else:
-                try:
-                    context_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_context', json=context_data)
-                    context_response.raise_for_status()
-                except requests.RequestException as e:
-                    logger.error(f"Error sending context request to the API for {file_path}: {e}")
-                    continue
-    
-                # Parse the context analysis response
-                context_analysis = context_response.json() if context_response.status_code == 200 else None
 
-                if context_analysis != None : 
-                    redis_client.set(context_search_query, json.dumps(context_analysis))
-    
-                if context_analysis is None:
-                    logger.warning(f"Failed to analyze context for {file_path}, Status Code: {context_response.status_code}")
-                    continue
+llm_client = LLMClient()
 
-            # Prepare the combined code for vulnerability analysis
-            combined_code = "_____________________________________\n"
-            combined_code += "Code File under analysis : \n"
-            combined_code += f"{os.path.basename(file_path)}\n{file_content}"
-            saast_report = generateSaastReport(file_path)
-            if saast_report:
-                combined_code += "\n_____________________________________\n"
-                combined_code += "Static Application Security Testing (SAST) report : \n"
-                combined_code += json.dumps(saast_report, indent = 2)
-            combined_code += "_____________________________________\n"
-            combined_code += "Related / Dependant Code files \n"
-
-            for related_file in context_analysis:
-                related_file_name = related_file.get("relatedFileName")
-                related_file_path = related_file.get("relatedFilePath")
-                
-                if not related_file_name or not related_file_path:
-                    logger.warning(f"Invalid related file info for {file_path}: {related_file}")
-                    continue
 
-                # Construct the absolute path to the related file
-           
-                related_full_path = related_file_path
-                logger.info(f"Using absolute path for related file: {related_full_path}")
-               
-                
-                related_content = read_file(related_full_path)
-                
-                if related_content:
-                    combined_code += f"{related_file_name}\n{related_content}\n"
-                    combined_code += "_____________________________________\n"
-                else:
-                    logger.warning(f"Could not read related file: {related_full_path}")
+ACCEPTED_EXTENSIONS = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
 
-            # Send the combined code to the vulnerability analysis API
-            vulnerability_data = {
-                'fileName': os.path.basename(file_path),
-                'fileContent': combined_code
-            }
 
-            cached_vulnerability_report = redis_client.get(vulnerability_search_query)
-            vulnerability_report = None
-            if cached_vulnerability_report:
-                vulnerability_report = json.loads(cached_vulnerability_report)
-                print(f"Vulnerability cache hit for {file_path}")
-            else:
-                try:
-                    vulnerability_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_vulnerabilities', json=vulnerability_data)
-                    vulnerability_response.raise_for_status()
-                except requests.RequestException as e:
-                    logger.error(f"Error sending vulnerability request to the API for {file_path}: {e}")
-                    continue
-    
-                # Parse the vulnerability analysis response
-                vulnerability_report = vulnerability_response.json() if vulnerability_response.status_code == 200 else None
-                if vulnerability_report !=None : 
-                    redis_client.set(vulnerability_search_query, json.dumps(vulnerability_report))
-                if vulnerability_report is None:
-                    logger.warning(f"Failed to analyze vulnerabilities for {file_path}, Status Code: {vulnerability_response.status_code}")
-                    continue
+# Directories that never hold first-party code worth analyzing
+SKIPPED_DIRECTORIES = {'.git', 'node_modules', 'vendor', 'vendors', 'third_party', 'thirdparty',
+                       'bower_components', 'site-packages', '.venv', 'venv', '__pycache__'}
 
-            logger.info(f"Vulnerability Report for {file_path}: {vulnerability_report}")
 
-            report.append({
-                "fileName": os.path.basename(file_path),
-                "report": vulnerability_report
-            })
+def isRepoFile(relative_path):
+    """
+    Returns True for paths (relative to the repository, '/'-separated) of programming
+    files outside SKIPPED_DIRECTORIES: the files scans analyze.
+    """
+    if SKIPPED_DIRECTORIES.intersection(relative_path.split('/')[:-1]):
+        return False
+    _, file_extension = os.path.splitext(relative_path)
+    return file_extension.lower() in ACCEPTED_EXTENSIONS
 
-        except Exception as e:
-            logger.error(f"Error processing file {file_path}: {e}")
 
-    return report
+def collectRepoFiles(repo_path):
+    """
+    Returns the paths of all programming files in the repository.
 
+    Uses `git ls-files` (tracked and untracked, ignoring .gitignore'd files) when the
+    path is a git work tree and falls back to os.walk otherwise. Files under
+    SKIPPED_DIRECTORIES are left out.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True, text=True, check=True
+        )
+        relative_paths = [path for path in result.stdout.split("\0") if path]
+    except (OSError, subprocess.CalledProcessError):
+        relative_paths = []
+        for dirpath, dirnames, filenames in os.walk(repo_path):
+            dirnames[:] = [dirname for dirname in dirnames if dirname not in SKIPPED_DIRECTORIES]
+            for filename in filenames:
+                relative_paths.append(os.path.relpath(os.path.join(dirpath, filename), repo_path))
+
+    file_paths = []
+    for relative_path in dict.fromkeys(relative_paths):
+        # Get the full file path
+        file_path = os.path.join(repo_path, relative_path)
+
+        # Check if the file has an accepted extension and lies outside SKIPPED_DIRECTORIES
+        if not isRepoFile(relative_path):
+            logger.info(f"Skipping {file_path} (not a programming file, or vendored)")
+            continue
+        file_paths.append(file_path)
+    return file_paths
 
 
-def analyzeRepositoryForContextAndComplianceReport(repoPath, repo_analysis, userCompText):
+class RepoSnapshot:
     """
-    Analyzes the repository for context and generates a vulnerability report.
-
-    Parameters:
-    - repoPath (str): The path to the repository.
-    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    The programming files of a repository, enumerated once per request.
 
-    Returns:
-    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+    Contents and SHA-256 hashes are loaded on first use and then shared by every
+    analysis stage, so each file is read from disk at most once per request.
     """
-    relatedFiles = {}
-    report = []
-    accepted_extensions = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
-    repo_path = repoPath  # repoPath is the absolute path to the repository
 
-    if not os.path.isdir(repo_path):
-        logger.error(f"Repository {repoPath} not found!")
-        return report
-
-   
-    # Walk through all files in the repo
-    for dirpath, _, filenames in os.walk(repo_path):
-        for filename in filenames:
-            # Get the full file path
-            file_path = os.path.join(dirpath, filename)
-
-            # Check if the file has an accepted extension
-            _, file_extension = os.path.splitext(filename)
-            if file_extension.lower() not in accepted_extensions:
-                logger.info(f"Skipping {file_path} (not a programming file)")
-                continue
-            
-            # Read the file content
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    file_content = file.read()
+    def __init__(self, repo_path, file_paths):
+        self.repo_path = repo_path
+        self.paths = list(file_paths)
+        self._known = {os.path.normpath(path): path for path in self.paths}
+        self._loaded = {}
+        self._external = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, repo_path):
+        """
+        Snapshots every programming file in the repository.
+        """
+        return cls(repo_path, collectRepoFiles(repo_path))
+
+    def __contains__(self, file_path):
+        return os.path.normpath(file_path) in self._known
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self, file_path):
+        """
+        Returns (file_content, content_hash) for a snapshot file, or None if it can't be read.
+        """
+        file_path = self._known.get(os.path.normpath(file_path), file_path)
+        with self._lock:
+            if file_path in self._loaded:
+                return self._loaded[file_path]
+        try:
+            with timed("file_read"), open(file_path, 'r', encoding='utf-8') as file:
+                file_content = file.read()
+            loaded = (file_content, string_to_sha256(file_content))
+        except Exception as e:
+            logger.error(f"Error reading or analyzing file {file_path}: {e}")
+            loaded = None
+        with self._lock:
+            return self._loaded.setdefault(file_path, loaded)
+
+    def files(self, file_paths=None):
+        """
+        Returns (file_path, file_content, content_hash) tuples for the given paths
+        (all snapshot files by default), skipping files that could not be read.
+        """
+        files = []
+        for file_path in self.paths if file_paths is None else file_paths:
+            loaded = self.load(file_path)
+            if loaded is not None:
+                files.append((file_path, loaded[0], loaded[1]))
+        return files
+
+    def exists(self, file_path):
+        """
+        Returns True if the file can be read through the snapshot.
+        """
+        return os.path.isfile(file_path)
+
+    def version(self, file_path):
+        """
+        Returns a value that changes whenever the file does (its size and modification time),
+        or None if the file can't be found.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @contextmanager
+    def materialized(self, file_paths):
+        """
+        Yields file path -> path of a file on disk with the same content, for tools
+        such as Bandit that read files themselves. Working-tree files are used as is.
+        """
+        yield {file_path: file_path for file_path in file_paths}
+
+    def read(self, file_path):
+        """
+        Returns the content of a file, served from the snapshot when it is part of it.
+        Files outside the snapshot (e.g. related files in skipped directories) are
+        read once and remembered as well.
+        """
+        if file_path in self:
+            loaded = self.load(file_path)
+            return loaded[0] if loaded else None
+        with self._lock:
+            if file_path in self._external:
+                return self._external[file_path]
+        content = read_file(file_path)
+        with self._lock:
+            return self._external.setdefault(file_path, content)
+
+
+def analyzeRepoFile(file_path, filename, file_content, content_hash=None, prefetched=None):
+    """
+    Runs the repo-code analysis for a single file, using the analysis cache when possible.
+    Files longer than CHUNK_THRESHOLD_LINES are analyzed chunk by chunk.
 
-                logger.info(f"Analyzing {file_path} for context...")
+    Returns:
+    - analysis_result (dict): The analysis result, or None if the analysis failed.
+    """
+    content_hash = content_hash or string_to_sha256(file_content)
+    cached_analysis = analysis_cache.get("repoAnalysis", content_hash, prefetched=prefetched)
+    if cached_analysis is not None:
+        # If found in the cache, use the cached result
+        print(f"Cache hit for {file_path}")
+        return cached_analysis
+
+    # With a time budget, part of it is kept for the report itself
+    if scanCancelled() or deadlineReached(REPO_ANALYSIS_DEADLINE_SHARE):
+        return None
 
-                # Send a request to the API for context analysis
-                data = {
-                    'fileName': filename,
-                    'fileContent': file_content,
-                    'fMap': repo_analysis
-                }
-                context_search_query = "context:" + string_to_sha256(file_content)
-                compliance_search_query = "compliance:" + string_to_sha256(file_content)
+    if needsChunking(file_content):
+        analysis_result = analyzeInChunks(
+            file_path, "repoAnalysis", splitIntoChunks(file_content), chunkTextDigest,
+            lambda first_line, text: postRepoCodeRequest(file_path, filename, text)
+        )
+    else:
+        analysis_result = postRepoCodeRequest(file_path, filename, file_content)
+    if analysis_result != None:
+        analysis_cache.set("repoAnalysis", content_hash, analysis_result)
+    return analysis_result
 
-                cached_context_analysis = redis_client.get(context_search_query)
-                analysis_result = None
 
-                if cached_context_analysis:
-                    analysis_result = json.loads(cached_context_analysis)
-                    print(f"Context cache hit for {file_path}")
-                else:
-                    try:
-                        response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_context', json=data)
-                        response.raise_for_status()
-                    except requests.RequestException as e:
-                        logger.error(f"Error sending context request to the API for {file_path}: {e}")
-                        continue
-    
-                    # Parse the context analysis response
-                    analysis_result = response.json() if response.status_code == 200 else None
-                    if analysis_result != None:
-                        redis_client.set(context_search_query, json.dumps(analysis_result))
-                    if analysis_result is None:
-                        logger.warning(f"Failed to analyze context for {file_path}, Status Code: {response.status_code}")
-                        continue
-
-                # Store the analysis result in the dictionary
-                relatedFiles[filename] = analysis_result
-
-                # Prepare the codes for vulnerability analysis
-                codes = "_____________________________________\n"
-                codes += "Code File under analysis : \n"
-                codes += f"{filename}\n{file_content}"
-                codes += "_____________________________________"
-                codes += "\n Related / Dependant Code files \n"
-
-                for rf in analysis_result:
-                    related_file_name = rf.get("relatedFileName")
-                    related_file_path = rf.get("relatedFilePath")
-
-                    if not related_file_name or not related_file_path:
-                        logger.warning(f"Invalid related file info for {file_path}: {rf}")
-                        continue
-
-                    # Construct the absolute path to the related file
-                    related_full_path = related_file_path
-
-                    # Read the related file content
-                    related_content = read_file(related_full_path)
-                    
-                    if related_content:
-                        codes += f"{related_file_name}\n{related_content}\n"
-                        codes += "_____________________________________\n"
-                    else:
-                        logger.warning(f"Could not read related file: {related_full_path}")
-                
-   
-
-                vulnerability_data = {
-                    'fileName': filename,
-                    'fileContent': codes,
-                    'userDefinedPolicies': userCompText
-                }
-                cached_compliance_analysis = redis_client.get(compliance_search_query)
+def postRepoCodeRequest(file_path, filename, file_content):
+    """
+    Sends an /analyze_repo_code request for a file (or a chunk of it).
 
-                c_report = None
-                if cached_compliance_analysis:
-                    c_report = json.loads(cached_compliance_analysis)
-                    print(f"Compliance cache hit for {file_path}")
-                else:
-                    try:
-                        vulnerability_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_compliance', json=vulnerability_data)
-                        vulnerability_response.raise_for_status()
-                    except requests.RequestException as e:
-                        logger.error(f"Error sending vulnerability request to the API for {file_path}: {e}")
-                        continue
-    
-                    # Parse the vulnerability analysis response
-                    c_report = vulnerability_response.json() if vulnerability_response.status_code == 200 else None
-                    if c_report != None : 
-                        redis_client.set(compliance_search_query, json.dumps(c_report))
-                    if c_report is None:
-                        logger.warning(f"Failed to analyze vulnerabilities for {file_path}, Status Code: {vulnerability_response.status_code}")
-                        continue
-
-                logger.info(f"Vulnerability Report for {file_path}: {c_report}")
-                report.append({"fileName": filename, "report": c_report})
-             
-                
-            except Exception as e:
-                logger.error(f"Error reading or analyzing file {file_path}: {e}")
-            
+    Returns:
+    - analysis_result (dict): The analysis result, or None if the request failed.
+    """
+    data = {
+        'fileName': filename,
+        'filePath': file_path,
+        'fileContent': file_content
+    }
 
-    
-    return report
+    # Send the request to the API
+    try:
+        response = llm_client.post('analyze_repo_code', json=data)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Error sending request to the API for {file_path}: {e}")
+        return None
 
+    # Parse the response
+    analysis_result = response.json() if response.status_code == 200 else None
+    if analysis_result is None:
+        logger.warning(f"Failed to analyze {file_path}, Status Code: {response.status_code}")
+    return analysis_result
 
 
-def analyzeASetOfFilesForContextAndComplianceReport(repoPath, filepathsArr, repo_analysis,userCompText):
+def fullRepoAnalysis(repoPath, max_workers=None, snapshot=None):
     """
-    Analyzes a specific set of files within a repository for context and generates vulnerability reports.
+    Analyzes all relevant files in the repository.
 
     Parameters:
     - repoPath (str): The path to the repository.
-    - filepathsArr (list): List of file paths to analyze within the repository.
-    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - max_workers (int): Maximum number of concurrent LLM requests. Defaults to LLM_MAX_WORKERS.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
 
     Returns:
-    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+    - repo_analysis (dict): A dictionary with file paths as keys and analysis results as values.
     """
-    report = []
-    accepted_extensions = {'.js', '.py', '.cpp', '.c', '.java', '.rb', '.go', '.ts', '.php', '.cs', '.swift', '.rs', '.kt'}
     repo_path = repoPath  # repoPath is the absolute path to the repository
 
     if not os.path.isdir(repo_path):
         logger.error(f"Repository {repoPath} not found!")
-        return report
+        return {}
 
-    for file_relative_path in filepathsArr:
-        # Construct the absolute file path
-        file_path = os.path.join(repo_path, file_relative_path)
+    if snapshot is None:
+        snapshot = RepoSnapshot.build(repo_path)
+    files = snapshot.files()
+    if RISK_FIRST_SCHEDULING:
+        # Files are started riskiest first, so an interrupted or time-budgeted scan covers those
+        files = snapshot.files(scheduleFiles(repo_path, [file_path for file_path, _, _ in files], snapshot))
+    # Resolve every cached result in a few pipelined round-trips before any LLM work
+    prefetched = analysis_cache.prefetch({"repoAnalysis": [content_hash for _, _, content_hash in files]})
+
+    def analyze(source_file):
+        file_path, file_content, content_hash = source_file
+        if scanCancelled():
+            return None
+        try:
+            # Analyze the file
+            logger.info(f"Analyzing {file_path}...")
+            logger.debug(f"File content: {file_content}")
+            return analyzeRepoFile(file_path, os.path.basename(file_path), file_content, content_hash, prefetched)
+        except Exception as e:
+            logger.error(f"Error reading or analyzing file {file_path}: {e}")
+            return None
 
-        # Check if the file exists
-        if not os.path.isfile(file_path):
-            logger.warning(f"File {file_path} does not exist. Skipping.")
-            continue
+    with analysis_cache.batched_writes():
+        results = runConcurrently(files, analyze, max_workers)
 
-        # Check if the file has an accepted extension
-        _, file_extension = os.path.splitext(file_path)
-        if file_extension.lower() not in accepted_extensions:
-            logger.info(f"Skipping {file_path} (not a programming file)")
-            continue
+    repo_analysis = {}
+    for (file_path, _, _), analysis_result in zip(files, results):
+        # Store the analysis result in the dictionary
+        if analysis_result is not None:
+            repo_analysis[file_path] = analysis_result
 
-        try:
-            # Read the file content
-            with open(file_path, 'r', encoding='utf-8') as file:
-                file_content = file.read()
+    return repo_analysis
 
-            logger.info(f"Analyzing {file_path} for context...")
 
-            # Send a request to the context analysis API
-            context_data = {
-                'fileName': os.path.basename(file_path),
-                'fileContent': file_content,
-                'fMap': repo_analysis
-            }
+def getCommitBlobs(repo_path, commit='HEAD'):
+    """
+    Lists the programming files tracked at a commit together with their git blob hashes.
 
-            context_search_query = "context:" + string_to_sha256(file_content)
-            compliance_search_query = "compliance:" + string_to_sha256(file_content)
+    Parameters:
+    - repo_path (str): The path to the repository.
+    - commit (str): The commit to list. Defaults to HEAD.
 
-            cached_context_analysis = redis_client.get(context_search_query)
-            context_analysis = None
+    Returns:
+    - (commit_sha, blobs): The resolved commit hash and a dict of relative path -> blob hash,
+      or (None, None) if the path is not a git repository.
+    """
+    try:
+        commit_sha = subprocess.run(
+            ["git", "-C", repo_path, "rev-parse", commit],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        with timed("git_ls_tree"):
+            result = subprocess.run(
+                ["git", "-C", repo_path, "ls-tree", "-r", "-z", commit_sha],
+                capture_output=True, text=True, check=True
+            )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not list git blobs for {repo_path}: {e}")
+        return None, None
+
+    blobs = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        # "<mode> <type> <object>\t<path>"
+        meta, relative_path = entry.split("\t", 1)
+        _, object_type, blob_hash = meta.split()
+        # Same rules as the working-tree snapshot, so vendored code stays out of commit scans too
+        if object_type == "blob" and isRepoFile(relative_path):
+            blobs[relative_path] = blob_hash
+    return commit_sha, blobs
 
-            if cached_context_analysis:
-                context_analysis = json.loads(cached_context_analysis)
-                print(f"Context cache hit for {file_path}")
-            else:
-                try:
-                    context_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_context', json=context_data)
-                    context_response.raise_for_status()
-                except requests.RequestException as e:
-                    logger.error(f"Error sending context request to the API for {file_path}: {e}")
-                    continue
-    
-                # Parse the context analysis response
-                context_analysis = context_response.json() if context_response.status_code == 200 else None
-                if context_analysis != None: 
-                    redis_client.set(context_search_query, json.dumps(context_analysis))
-                    
-                if context_analysis is None:
-                    logger.warning(f"Failed to analyze context for {file_path}, Status Code: {context_response.status_code}")
-                    continue
 
-            # Prepare the combined code for vulnerability analysis
-            combined_code = "_____________________________________\n"
-            combined_code += "Code File under analysis : \n"
-            combined_code += f"{os.path.basename(file_path)}\n{file_content}"
-            combined_code += "_____________________________________\n"
-            combined_code += "Related / Dependant Code files \n"
-
-            for related_file in context_analysis:
-                related_file_name = related_file.get("relatedFileName")
-                related_file_path = related_file.get("relatedFilePath")
-                
-                if not related_file_name or not related_file_path:
-                    logger.warning(f"Invalid related file info for {file_path}: {related_file}")
-                    continue
+def readBlobs(repo_path, blob_hashes):
+    """
+    Reads blobs straight from the object database with a single `git cat-file --batch`.
 
-                # Construct the absolute path to the related file
-                related_full_path =related_file_path
-                related_content = read_file(related_full_path)
-                
-                if related_content:
-                    combined_code += f"{related_file_name}\n{related_content}\n"
-                    combined_code += "_____________________________________\n"
-                else:
-                    logger.warning(f"Could not read related file: {related_full_path}")
+    Returns:
+    - contents (dict): Blob hash -> raw bytes, for the blobs that exist.
+    """
+    blob_hashes = list(dict.fromkeys(blob_hashes))
+    if not blob_hashes:
+        return {}
+    try:
+        with timed("git_cat_file"):
+            result = subprocess.run(
+                ["git", "-C", repo_path, "cat-file", "--batch"],
+                input="".join(f"{blob_hash}\n" for blob_hash in blob_hashes).encode(),
+                capture_output=True, check=True
+            )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Could not read blobs from {repo_path}: {e}")
+        return {}
 
-            # Send the combined code to the vulnerability analysis API
-            vulnerability_data = {
-                'fileName': os.path.basename(file_path),
-                'fileContent': combined_code,
-                'userDefinedPolicies': userCompText
-            }
-            cached_compliance_analysis = redis_client.get(compliance_search_query)
+    contents = {}
+    output = result.stdout
+    position = 0
+    for blob_hash in blob_hashes:
+        # "<object> <type> <size>\n<content>\n", or "<object> missing\n"
+        header_end = output.index(b"\n", position)
+        header = output[position:header_end].split()
+        position = header_end + 1
+        if len(header) < 3:
+            continue
+        size = int(header[2])
+        contents[blob_hash] = output[position:position + size]
+        position += size + 1
+    return contents
 
-            vulnerability_report = None
-            if cached_compliance_analysis:
-                vulnerability_report = json.loads(cached_compliance_analysis)
-                print(f"Compliance cache hit for {file_path}")
-            else:
+
+def promisorRemote(repo_path):
+    """
+    Returns the remote a partial clone (e.g. `--filter=blob:none`) fetches its missing objects from,
+    or None for a complete clone.
+    """
+    try:
+        # Recent git marks the remote itself; older versions set extensions.partialClone
+        result = subprocess.run(
+            ["git", "-C", repo_path, "config", "--get-regexp", r"^(remote\..*\.promisor|extensions\.partialclone)$"],
+            capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "extensions.partialclone" and value:
+            return value
+        if key.startswith("remote.") and value.lower() == "true":
+            return key[len("remote."):-len(".promisor")]
+    return None
+
+
+def fetchMissingBlobs(repo_path, commit, blob_hashes):
+    """
+    Downloads the blobs of a commit that a partial clone doesn't have yet, in one fetch.
+
+    Without this, git fetches every missing blob lazily with its own request as soon as
+    it is read.
+
+    Parameters:
+    - repo_path (str): The path to the repository.
+    - commit (str): The commit whose tree holds the blobs.
+    - blob_hashes (list): The blobs that are about to be read.
+
+    Returns:
+    - fetched (int): The number of blobs requested from the remote.
+    """
+    remote = promisorRemote(repo_path)
+    if remote is None or not blob_hashes:
+        return 0
+    try:
+        # Trees are always local, so listing the commit's missing objects costs no round trip
+        result = subprocess.run(
+            ["git", "-C", repo_path, "rev-list", "--objects", "--no-walk", "--missing=print", commit],
+            capture_output=True, text=True, check=True
+        )
+        missing = {line[1:].strip() for line in result.stdout.splitlines() if line.startswith("?")}
+        wanted = [blob_hash for blob_hash in dict.fromkeys(blob_hashes) if blob_hash in missing]
+        if wanted:
+            with timed("git_fetch_blobs"):
+                subprocess.run(
+                    ["git", "-C", repo_path, "fetch", "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no",
+                     "--filter=blob:none", "--stdin", remote],
+                    input="".join(f"{blob_hash}\n" for blob_hash in wanted),
+                    capture_output=True, text=True, check=True
+                )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not prefetch blobs of {commit} in {repo_path}: {e}")
+        return 0
+    return len(wanted)
+
+
+class CommitSnapshot(RepoSnapshot):
+    """
+    The programming files of a repository at a given commit, read from the git object
+    database instead of the working tree.
+
+    File paths are the usual absolute paths under the clone, so reports look the
+    same as for a working-tree scan, but nothing is checked out: several commits of
+    the same clone can be analyzed at once, whatever is currently checked out.
+    """
+
+    def __init__(self, repo_path, commit, blobs=None):
+        if blobs is None:
+            commit, blobs = getCommitBlobs(repo_path, commit)
+        self.commit = commit
+        self.blobs = {os.path.join(repo_path, relative_path): blob_hash for relative_path, blob_hash in (blobs or {}).items()}
+        super().__init__(repo_path, self.blobs)
+
+    def exists(self, file_path):
+        return file_path in self
+
+    def version(self, file_path):
+        # Blob hashes identify contents, so they stay valid across commits
+        return self.blobs.get(file_path)
+
+    def load(self, file_path):
+        file_path = self._known.get(os.path.normpath(file_path), file_path)
+        with self._lock:
+            if file_path in self._loaded:
+                return self._loaded[file_path]
+        self.preload([file_path])
+        with self._lock:
+            return self._loaded.get(file_path)
+
+    def preload(self, file_paths):
+        """
+        Loads many files with a single `git cat-file --batch`.
+        """
+        with self._lock:
+            missing = [path for path in file_paths if path in self.blobs and path not in self._loaded]
+        fetchMissingBlobs(self.repo_path, self.commit, [self.blobs[path] for path in missing])
+        contents = readBlobs(self.repo_path, [self.blobs[path] for path in missing])
+        with self._lock:
+            for file_path in missing:
                 try:
-                    vulnerability_response = requests.post('http://llama3_1CodeSecu_service:8000/analyze_compliance', json=vulnerability_data)
-                    vulnerability_response.raise_for_status()
-                except requests.RequestException as e:
-                    logger.error(f"Error sending vulnerability request to the API for {file_path}: {e}")
-                    continue
-    
-                # Parse the vulnerability analysis response
-                vulnerability_report = vulnerability_response.json() if vulnerability_response.status_code == 200 else None
-                if vulnerability_report != None : 
-                    redis_client.set(compliance_search_query, json.dumps(vulnerability_report))
-                    
-                if vulnerability_report is None:
-                    logger.warning(f"Failed to analyze vulnerabilities for {file_path}, Status Code: {vulnerability_response.status_code}")
+                    file_content = contents[self.blobs[file_path]].decode('utf-8')
+                    loaded = (file_content, string_to_sha256(file_content))
+                except (KeyError, UnicodeDecodeError) as e:
+                    logger.error(f"Error reading {file_path} at {self.commit}: {e}")
+                    loaded = None
+                self._loaded.setdefault(file_path, loaded)
+            for file_path in file_paths:
+                if file_path not in self.blobs:
+                    self._loaded.setdefault(file_path, None)
+
+    def files(self, file_paths=None):
+        self.preload(self.paths if file_paths is None else file_paths)
+        return super().files(file_paths)
+
+    def read(self, file_path):
+        # Files outside the commit's tree don't exist at that commit
+        loaded = self.load(file_path) if file_path in self else None
+        return loaded[0] if loaded else None
+
+    @contextmanager
+    def materialized(self, file_paths):
+        with tempfile.TemporaryDirectory(prefix="snapshot-") as directory:
+            paths = {}
+            for file_path in file_paths:
+                loaded = self.load(file_path)
+                if loaded is None:
                     continue
+                scan_path = os.path.join(directory, os.path.relpath(file_path, self.repo_path))
+                os.makedirs(os.path.dirname(scan_path), exist_ok=True)
+                with open(scan_path, 'w', encoding='utf-8') as file:
+                    file.write(loaded[0])
+                paths[file_path] = scan_path
+            yield paths
+
+
+def getCommitRangeChanges(repo_path, base, head):
+    """
+    Lists the programming files changed between two commits, with rename detection.
+
+    Parameters:
+    - repo_path (str): The path to the repository.
+    - base (str): The commit the range starts from (excluded).
+    - head (str): The commit the range ends at.
+
+    Returns:
+    - changes (list): {"status", "path", "previousPath", "blob", "similarity"} per changed file,
+      where status is one of added, modified, renamed, copied, deleted, or None if the range
+      can't be resolved.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path, "diff-tree", "-r", "-z", "-M", "--raw", "--no-commit-id", base, head],
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Could not diff {base}..{head} in {repo_path}: {e}")
+        return None
+
+    statuses = {'A': 'added', 'M': 'modified', 'T': 'modified', 'R': 'renamed', 'C': 'copied', 'D': 'deleted'}
+    fields = result.stdout.split("\0")
+    changes = []
+    index = 0
+    while index < len(fields) and fields[index].startswith(":"):
+        # ":<old mode> <new mode> <old blob> <new blob> <status><score>" then one or two paths
+        _, _, _, new_blob, status = fields[index][1:].split()
+        paths = fields[index + 1:index + (3 if status[0] in "RC" else 2)]
+        index += 1 + len(paths)
+        path = paths[-1]
+        if not isRepoFile(path):
+            continue
+        changes.append({
+            "status": statuses.get(status[0], 'modified'),
+            "path": path,
+            "previousPath": paths[0] if len(paths) == 2 else None,
+            "blob": None if status[0] == 'D' else new_blob,
+            "similarity": int(status[1:]) if status[1:] else None,
+        })
+    return changes
+
+
+def manifestKey(repo_path, commit):
+    return f"manifest:{string_to_sha256(os.path.abspath(repo_path))}:{commit}"
+
+
+def loadRepoManifest(repo_path, commit='latest'):
+    """
+    Loads the file manifest stored for an analyzed commit.
+
+    The manifest maps each relative path to {"blob", "sha256", "key"}: its git blob
+    hash, the SHA-256 of its content and the repoAnalysis cache key of its result.
+    The special commit "latest" resolves to the most recently analyzed commit.
+
+    Returns:
+    - manifest (dict): {"commit": ..., "files": {...}}, or None if nothing was stored.
+    """
+    try:
+        if commit == 'latest':
+            latest = redis_client.get(manifestKey(repo_path, 'latest'))
+            if latest is None:
+                return None
+            commit = latest.decode('utf-8')
+        stored = redis_client.get(manifestKey(repo_path, commit))
+    except redis.RedisError as e:
+        logger.error(f"Could not load manifest for {repo_path}@{commit}: {e}")
+        return None
+    return json.loads(stored) if stored else None
+
+
+def saveRepoManifest(repo_path, commit, files):
+    """
+    Stores the file manifest of an analyzed commit and marks it as the latest one.
+    """
+    manifest = {"commit": commit, "files": files}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(manifestKey(repo_path, commit), json.dumps(manifest))
+        pipe.set(manifestKey(repo_path, 'latest'), commit)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Could not save manifest for {repo_path}@{commit}: {e}")
 
-            logger.info(f"Vulnerability Report for {file_path}: {vulnerability_report}")
 
-            report.append({
-                "fileName": os.path.basename(file_path),
-                "report": vulnerability_report
-            })
+def incrementalRepoAnalysis(repoPath, max_workers=None, snapshot=None, commit='HEAD', previous_commit='latest'):
+    """
+    Analyzes the repository at a commit (HEAD by default), only recomputing files whose
+    blob changed since a previously analyzed commit (the latest one by default).
+
+    Files whose blob hash matches the previous manifest reuse their cached result
+    without being read; added and changed files are analyzed; deleted files drop out.
+    Falls back to fullRepoAnalysis when the path is not a git repository.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - max_workers (int): Maximum number of concurrent LLM requests. Defaults to LLM_MAX_WORKERS.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - commit (str): The commit to analyze. Other commits than HEAD are read from the object
+      database (CommitSnapshot), without touching the working tree.
+    - previous_commit (str): The analyzed commit to reuse results from; falls back to the latest one.
+
+    Returns:
+    - repo_analysis (dict): A dictionary with file paths as keys and analysis results as values.
+    """
+    repo_path = repoPath  # repoPath is the absolute path to the repository
+
+    if not os.path.isdir(repo_path):
+        logger.error(f"Repository {repoPath} not found!")
+        return {}
 
+    in_working_tree = commit == 'HEAD'
+    commit, blobs = getCommitBlobs(repo_path, commit)
+    if commit is None:
+        return fullRepoAnalysis(repo_path, max_workers)
+
+    previous = loadRepoManifest(repo_path, previous_commit)
+    if previous is None and previous_commit != 'latest':
+        previous = loadRepoManifest(repo_path)
+    previous = previous or {"commit": None, "files": {}}
+    previous_files = previous["files"]
+
+    # Reuse every entry whose blob is unchanged and whose cache key is still current
+    unchanged = {}
+    for relative_path, blob_hash in blobs.items():
+        entry = previous_files.get(relative_path)
+        if entry and entry["blob"] == blob_hash and entry["key"] == analysis_cache.key("repoAnalysis", entry["sha256"]):
+            unchanged[relative_path] = entry
+    reused = analysis_cache.get_many("repoAnalysis", [entry["sha256"] for entry in unchanged.values()])
+
+    results = {}
+    manifest_files = {}
+    changed_paths = []
+    for relative_path in blobs:
+        entry = unchanged.get(relative_path)
+        if entry and entry["sha256"] in reused:
+            results[relative_path] = reused[entry["sha256"]]
+            manifest_files[relative_path] = entry
+        else:
+            changed_paths.append(relative_path)
+
+    deleted = len(set(previous_files) - set(blobs))
+    logger.info(
+        f"Incremental analysis of {repo_path} at {commit} (previous: {previous['commit']}): "
+        f"{len(results)} reused, {len(changed_paths)} to analyze, {deleted} deleted"
+    )
+
+    changed_files = [os.path.join(repo_path, relative_path) for relative_path in changed_paths]
+    if snapshot is None:
+        snapshot = RepoSnapshot(repo_path, changed_files) if in_working_tree else CommitSnapshot(repo_path, commit)
+    files = snapshot.files(changed_files)
+    prefetched = analysis_cache.prefetch({"repoAnalysis": [content_hash for _, _, content_hash in files]})
+
+    def analyze(source_file):
+        file_path, file_content, content_hash = source_file
+        if scanCancelled():
+            return None
+        try:
+            logger.info(f"Analyzing {file_path}...")
+            return analyzeRepoFile(file_path, os.path.basename(file_path), file_content, content_hash, prefetched)
         except Exception as e:
-            logger.error(f"Error processing file {file_path}: {e}")
+            logger.error(f"Error reading or analyzing file {file_path}: {e}")
+            return None
+
+    with analysis_cache.batched_writes():
+        analyzed = runConcurrently(files, analyze, max_workers)
+
+    for (file_path, _, content_hash), analysis_result in zip(files, analyzed):
+        if analysis_result is None:
+            continue
+        relative_path = os.path.relpath(file_path, repo_path)
+        results[relative_path] = analysis_result
+        manifest_files[relative_path] = {
+            "blob": blobs[relative_path],
+            "sha256": content_hash,
+            "key": analysis_cache.key("repoAnalysis", content_hash)
+        }
+
+    saveRepoManifest(repo_path, commit, manifest_files)
+
+    # Keep the tree order and the absolute-path keys used by fullRepoAnalysis
+    return {
+        os.path.join(repo_path, relative_path): results[relative_path]
+        for relative_path in blobs if relative_path in results
+    }
+
+
+# How repo_analysis travels with /analyze_context requests:
+#   inline - the full map is embedded in every request (the service's original contract)
+#   digest - only file paths and summaries are embedded
+#   handle - the map is registered with the service once per scan and only its handle is sent
+FMAP_TRANSPORT = os.getenv('FMAP_TRANSPORT', 'inline')
+# Maximum length of a file summary in the digest form of the fMap
+FMAP_DIGEST_SUMMARY_CHARS = int(os.getenv('FMAP_DIGEST_SUMMARY_CHARS', 300))
+
+
+def fileMapDigest(repo_analysis):
+    """
+    Returns the compact form of the fMap: file path -> short summary of its analysis.
+    """
+    digest = {}
+    for file_path, analysis in repo_analysis.items():
+        summary = None
+        if isinstance(analysis, dict):
+            summary = analysis.get('summary') or analysis.get('description')
+        if not isinstance(summary, str):
+            summary = analysis if isinstance(analysis, str) else json.dumps(analysis)
+        digest[file_path] = summary[:FMAP_DIGEST_SUMMARY_CHARS]
+    return digest
+
+
+def registerFileMap(fmap):
+    """
+    Registers an fMap with the LLM service and returns its handle, or None if the
+    service doesn't support registration.
+    """
+    try:
+        response = llm_client.post('register_fmap', json={'fMap': fmap})
+        response.raise_for_status()
+        return response.json().get('handle')
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Could not register the fMap with the LLM service: {e}")
+        return None
+
+
+class FileMapTransport:
+    """
+    Builds /analyze_context request bodies for one scan.
+
+    The fMap (inline or digest form) is JSON-encoded once and spliced into every
+    request body, and in handle mode only the registered handle is sent. The
+    encoded size of each request is recorded.
+    """
+
+    def __init__(self, repo_analysis, mode=None, handle=None):
+        self.repo_analysis = repo_analysis
+        self.mode = mode or FMAP_TRANSPORT
+        self.handle = handle
+        self.requests = 0
+        self.bytes_sent = 0
+        self.max_request_bytes = 0
+        self._lock = threading.Lock()
+
+        # A handle already registered by the caller (e.g. the asyncio path) is used as is
+        if self.mode == 'handle' and self.handle is None:
+            self.handle = registerFileMap(repo_analysis)
+            if self.handle is None:
+                self.mode = 'inline'
+        self._encoded_fmap = None
+        if self.mode != 'handle':
+            fmap = fileMapDigest(repo_analysis) if self.mode == 'digest' else repo_analysis
+            self._encoded_fmap = json.dumps(fmap)
+
+    def reregister(self):
+        """
+        Registers the fMap again, e.g. after the service forgot the previous handle.
+        Falls back to inline transport if registration fails.
+        """
+        self.useHandle(registerFileMap(self.repo_analysis))
+
+    def useHandle(self, handle):
+        """
+        Switches to a newly registered handle, or to inline transport if there is none.
+        """
+        self.handle = handle
+        if self.handle is None:
+            self.mode = 'inline'
+            self._encoded_fmap = json.dumps(self.repo_analysis)
+
+    def body(self, filename, file_content):
+        """
+        Returns the encoded JSON body of an /analyze_context request.
+        """
+        prefix = json.dumps({'fileName': filename, 'fileContent': file_content})[:-1]
+        if self.mode == 'handle':
+            encoded = f'{prefix}, "fMapHandle": {json.dumps(self.handle)}}}'
+        else:
+            encoded = f'{prefix}, "fMap": {self._encoded_fmap}}}'
+        encoded = encoded.encode('utf-8')
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(encoded)
+            self.max_request_bytes = max(self.max_request_bytes, len(encoded))
+        logger.info(f"analyze_context request for {filename}: {len(encoded)} bytes ({self.mode} fMap)")
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'requests': self.requests,
+                'bytesSent': self.bytes_sent,
+                'maxRequestBytes': self.max_request_bytes,
+                'averageRequestBytes': self.bytes_sent // self.requests if self.requests else 0,
+            }
+
+
+def postContextRequest(fmap_transport, filename, file_content):
+    """
+    Sends an /analyze_context request using the scan's fMap transport.
+
+    In handle mode a 404 means the service no longer knows the handle; the fMap is
+    registered again and the request retried once.
+    """
+    headers = {'Content-Type': 'application/json'}
+    response = llm_client.post('analyze_context', data=fmap_transport.body(filename, file_content), headers=headers)
+    if response.status_code == 404 and fmap_transport.mode == 'handle':
+        fmap_transport.reregister()
+        response = llm_client.post('analyze_context', data=fmap_transport.body(filename, file_content), headers=headers)
+    response.raise_for_status()
+    return response
+
+
+PROMPT_SEPARATOR = "_____________________________________"
+# Token budget of a single vulnerability/compliance prompt; 0 disables packing
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 32000))
+# Related files are only truncated if at least this many tokens are left for them
+PROMPT_MIN_EXCERPT_TOKENS = int(os.getenv('PROMPT_MIN_EXCERPT_TOKENS', 256))
+# Lines kept around each referenced symbol when a related file is truncated
+PROMPT_EXCERPT_CONTEXT_LINES = int(os.getenv('PROMPT_EXCERPT_CONTEXT_LINES', 15))
+
+DEFINITION_PATTERN = re.compile(
+    r"^\s*(?:export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+|pub\s+)*"
+    r"(?:def|class|function|func|fn|interface|struct|enum|trait|module|object)\s+(\w+)",
+    re.M
+)
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_]\w{2,}")
+
+
+def estimateTokens(text):
+    """
+    Cheap token estimate (about four characters per token for source code).
+    """
+    return (len(text) + 3) // 4
+
+
+def excerptAroundSymbols(content, symbols, max_tokens):
+    """
+    Cuts a file down to the lines around the given symbols, within max_tokens.
+
+    Omitted ranges are marked so the model knows the excerpt is partial. Without
+    any matching line, the head of the file is kept.
+    """
+    lines = content.splitlines()
+    hits = [index for index, line in enumerate(lines) if symbols and any(symbol in line for symbol in symbols)]
+    if not hits:
+        hits = [0]
+
+    # Merge the windows around every hit
+    windows = []
+    for index in hits:
+        start = max(index - PROMPT_EXCERPT_CONTEXT_LINES, 0)
+        end = min(index + PROMPT_EXCERPT_CONTEXT_LINES + 1, len(lines))
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+
+    parts = []
+    remaining = max_tokens * 4
+    previous_end = 0
+    for start, end in windows:
+        if start > previous_end:
+            parts.append(f"... (lines {previous_end + 1}-{start} omitted) ...")
+        for line in lines[start:end]:
+            if len(line) + 1 > remaining:
+                parts.append("... (truncated to fit the prompt budget) ...")
+                return "\n".join(parts)
+            parts.append(line)
+            remaining -= len(line) + 1
+        previous_end = end
+    if previous_end < len(lines):
+        parts.append(f"... (lines {previous_end + 1}-{len(lines)} omitted) ...")
+    return "\n".join(parts)
+
+
+class PromptBuilder:
+    """
+    Assembles the vulnerability and compliance prompts of one scan.
+
+    Prompts are built from a list of parts joined once, and related files are
+    read through the scan's snapshot, so popular files (utils, config, models)
+    are loaded a single time however many files reference them.
+
+    Related files are packed into a per-prompt token budget: they are ranked by
+    how many of their definitions the file under analysis references (then by
+    size), added whole while they fit, and cut down to the lines around the
+    referenced symbols once they don't. The decisions are kept per file for the
+    report metadata.
+    """
+
+    def __init__(self, snapshot, token_budget=None):
+        self.snapshot = snapshot
+        self.token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.prompt_bytes = {}
+        self.budget_decisions = {}
+        self._lock = threading.Lock()
+
+    def _rankRelatedFiles(self, file_path, file_content, related_files):
+        referenced = set(IDENTIFIER_PATTERN.findall(file_content))
+        candidates = []
+        for related_file in related_files:
+            related_file_name = related_file.get("relatedFileName")
+            related_file_path = related_file.get("relatedFilePath")
+
+            if not related_file_name or not related_file_path:
+                logger.warning(f"Invalid related file info for {file_path}: {related_file}")
+                continue
+
+            related_content = self.snapshot.read(related_file_path)
+            if not related_content:
+                logger.warning(f"Could not read related file: {related_file_path}")
+                continue
+
+            symbols = set(DEFINITION_PATTERN.findall(related_content)) & referenced
+            candidates.append((related_file_name, related_file_path, related_content, symbols))
+
+        if self.token_budget:
+            # Most referenced first, smaller files first among equals
+            candidates.sort(key=lambda candidate: (-len(candidate[3]), len(candidate[2])))
+        return candidates
+
+    def _pack(self, file_path, file_content, related_files, saast_report):
+        """
+        Returns the parts of a prompt and its token budget metadata.
+        """
+        parts = [PROMPT_SEPARATOR, "\n", "Code File under analysis : \n", os.path.basename(file_path), "\n", file_content]
+        if saast_report:
+            parts += ["\n", PROMPT_SEPARATOR, "\n", "Static Application Security Testing (SAST) report : \n", json.dumps(saast_report, indent=2)]
+        parts += [PROMPT_SEPARATOR, "\n", "Related / Dependant Code files \n"]
+
+        # The file under analysis and its SAST report are always sent in full
+        used_tokens = sum(estimateTokens(part) for part in parts)
+        decisions = []
+        for related_file_name, related_file_path, related_content, symbols in self._rankRelatedFiles(file_path, file_content, related_files):
+            tokens = estimateTokens(related_content)
+            overhead = estimateTokens(related_file_name) + estimateTokens(PROMPT_SEPARATOR) + 1
+            remaining = self.token_budget - used_tokens - overhead
+            decision = {"relatedFilePath": related_file_path, "tokens": tokens, "referencedSymbols": sorted(symbols)}
+
+            if not self.token_budget or tokens <= remaining:
+                decision["decision"] = "included"
+            elif remaining >= PROMPT_MIN_EXCERPT_TOKENS:
+                related_content = excerptAroundSymbols(related_content, symbols, remaining)
+                decision["decision"] = "truncated"
+                decision["includedTokens"] = estimateTokens(related_content)
+            else:
+                decision["decision"] = "dropped"
+                decisions.append(decision)
+                continue
+
+            parts += [related_file_name, "\n", related_content, "\n", PROMPT_SEPARATOR, "\n"]
+            used_tokens += estimateTokens(related_content) + overhead
+            decisions.append(decision)
+
+        metadata = {"budgetTokens": self.token_budget, "estimatedTokens": used_tokens, "relatedFiles": decisions}
+        with self._lock:
+            self.budget_decisions[file_path] = metadata
+        return parts, metadata
+
+    def buildWithBudget(self, file_path, file_content, related_files, saast_report=None):
+        """
+        Returns the prompt for a file under analysis, its SAST report (if any) and the
+        related files returned by the context analysis, with its token budget metadata.
+        """
+        parts, metadata = self._pack(file_path, file_content, related_files, saast_report)
+        prompt = "".join(parts)
+        size = len(prompt) if prompt.isascii() else len(prompt.encode('utf-8'))
+        with self._lock:
+            self.prompt_bytes[file_path] = size
+        logger.info(f"Assembled {size} byte prompt for {file_path}")
+        return prompt, metadata
+
+    def build(self, file_path, file_content, related_files, saast_report=None):
+        """
+        Returns the prompt for a file under analysis, its SAST report (if any) and
+        the related files returned by the context analysis.
+        """
+        return self.buildWithBudget(file_path, file_content, related_files, saast_report)[0]
+
+    def budget(self, file_path, file_content, related_files, saast_report=None):
+        """
+        Returns the token budget decisions the prompt would get, without assembling it.
+        """
+        return self._pack(file_path, file_content, related_files, saast_report)[1]
+
+    def metadata(self, file_path):
+        """
+        Returns the token budget decisions taken for a file's prompt.
+        """
+        with self._lock:
+            return self.budget_decisions.get(file_path)
+
+    def stats(self):
+        with self._lock:
+            sizes = list(self.prompt_bytes.values())
+            decisions = [decision["decision"] for metadata in self.budget_decisions.values() for decision in metadata["relatedFiles"]]
+        return {
+            'prompts': len(sizes),
+            'bytesAssembled': sum(sizes),
+            'maxPromptBytes': max(sizes, default=0),
+            'relatedFilesTruncated': decisions.count("truncated"),
+            'relatedFilesDropped': decisions.count("dropped"),
+        }
+
+
+# Files with more lines than this are analyzed chunk by chunk (0: never chunk)
+CHUNK_THRESHOLD_LINES = int(os.getenv('CHUNK_THRESHOLD_LINES', 3000))
+# Upper bound on the number of lines of one chunk
+CHUNK_MAX_LINES = int(os.getenv('CHUNK_MAX_LINES', 1000))
+# Threads sending chunk requests, shared by every chunked file of the process
+CHUNK_MAX_WORKERS = int(os.getenv('CHUNK_MAX_WORKERS', LLM_MAX_WORKERS))
+
+# One pool for all chunk requests, so chunked files analyzed side by side don't each start their own
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_MAX_WORKERS, thread_name_prefix="chunk")
+
+# Result fields holding line numbers, moved from chunk lines to file lines when chunks are merged
+LINE_NUMBER_KEYS = {'line', 'line_number', 'lineNumber', 'start_line', 'startLine', 'end_line', 'endLine'}
+CHUNK_PREAMBLE_PATTERN = re.compile(r"\s*(?:@|#|//|/\*|\*|--)")
+
+
+def needsChunking(content):
+    """
+    Returns True for files too long to be sent in a single request.
+    """
+    return CHUNK_THRESHOLD_LINES > 0 and content.count("\n") >= CHUNK_THRESHOLD_LINES
+
+
+def splitIntoChunks(content, max_lines=None):
+    """
+    Splits a file into chunks of at most max_lines lines.
+
+    Chunks are cut in front of a definition (function, class, ...) whenever one starts
+    in the second half of the chunk, outermost definitions first, so that each chunk
+    holds whole definitions. Decorators and comments right above a definition stay
+    with it. Without any definition the chunk is cut at max_lines.
+
+    Returns:
+    - chunks (list): (first_line, text) tuples, first_line being 1-based.
+    """
+    max_lines = max_lines or CHUNK_MAX_LINES
+    lines = content.splitlines(keepends=True)
+    if len(lines) <= max_lines:
+        return [(1, content)]
+
+    # Line index -> indentation of the definition starting there
+    boundaries = {}
+    for index, line in enumerate(lines):
+        if DEFINITION_PATTERN.match(line):
+            start = index
+            while start > 0 and CHUNK_PREAMBLE_PATTERN.match(lines[start - 1]):
+                start -= 1
+            boundaries.setdefault(start, len(line) - len(line.lstrip()))
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = min(start + max_lines, len(lines))
+        if end < len(lines):
+            candidates = [index for index in range(start + max_lines // 2, end + 1) if index in boundaries and index > start]
+            if candidates:
+                end = min(candidates, key=lambda index: (boundaries[index], -index))
+        chunks.append((start + 1, "".join(lines[start:end])))
+        start = end
+    return chunks
+
+
+def shiftLineNumbers(value, offset):
+    """
+    Returns a copy of a result with the line numbers it holds moved by offset.
+    """
+    if isinstance(value, list):
+        return [shiftLineNumbers(item, offset) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: item + offset if key in LINE_NUMBER_KEYS and isinstance(item, int) and not isinstance(item, bool) else shiftLineNumbers(item, offset)
+            for key, item in value.items()
+        }
+    return value
+
+
+def _mergeValues(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    if all(isinstance(value, list) for value in values):
+        return [item for value in values for item in value]
+    if all(isinstance(value, dict) for value in values):
+        keys = dict.fromkeys(key for value in values for key in value)
+        return {key: _mergeValues([value.get(key) for value in values]) for key in keys}
+    if all(isinstance(value, str) for value in values):
+        return "\n".join(dict.fromkeys(values))
+    return values[0]
+
+
+def mergeChunkResults(results):
+    """
+    Merges (first_line, result) chunk results into a single result for the file.
+
+    Line numbers are moved to file lines, lists (findings, related files, symbols) are
+    concatenated in chunk order, dicts merged key by key, and distinct strings (e.g.
+    summaries) joined line by line.
+    """
+    return _mergeValues([shiftLineNumbers(result, first_line - 1) for first_line, result in results])
+
+
+def uniqueRelatedFiles(related_files):
+    """
+    Drops the repeated entries of a merged context result; chunks of a file often relate to the same files.
+    """
+    unique = {}
+    for related_file in related_files:
+        unique.setdefault(related_file.get("relatedFilePath") if isinstance(related_file, dict) else json.dumps(related_file), related_file)
+    return list(unique.values())
+
+
+def chunkSaastReport(saast_report, first_line, text):
+    """
+    Returns the SAST findings located in a chunk, with chunk-relative line numbers.
+    """
+    if not saast_report:
+        return saast_report
+    last_line = first_line + text.count("\n")
+    return [
+        shiftLineNumbers(issue, 1 - first_line) for issue in saast_report
+        if first_line <= issue.get("line_number", 0) <= last_line
+    ]
+
+
+def chunkTextDigest(first_line, text):
+    """
+    Digest of a chunk analyzed from its text alone, the same wherever the chunk sits in its file.
+    """
+    return string_to_sha256(text)
+
+
+def analyzeInChunks(file_path, family, chunks, chunk_digest, request):
+    """
+    Map-reduce analysis of a file split by splitIntoChunks.
+
+    Every chunk is cached on its own under chunk_digest(first_line, text), with chunk-relative line
+    numbers, so an edit only re-analyzes the chunks it touched, even when it moved the
+    others. The missing chunks are sent side by side on chunk_executor, and their
+    requests count against the same LLM_MAX_IN_FLIGHT limit as every other request.
+
+    Parameters:
+    - file_path (str): The file, for logging.
+    - family (str): Cache family of the chunk results.
+    - chunks (list): (first_line, text) tuples.
+    - chunk_digest (callable): chunk_digest(first_line, text) -> cache digest of a chunk.
+    - request (callable): request(first_line, text) -> result of a chunk, or None if it failed.
+
+    Returns:
+    - result: The merged result of the file, or None if any chunk failed.
+    """
+    digests = [chunk_digest(first_line, text) for first_line, text in chunks]
+    found = analysis_cache.get_many(family, list(set(digests)))
+    missing = [index for index, digest in enumerate(digests) if digest not in found]
+    logger.info(f"Analyzing {file_path} for {family} in {len(chunks)} chunks, {len(chunks) - len(missing)} cached")
+
+    def analyze(index):
+        if scanCancelled() or deadlineReached():
+            return None
+        first_line, text = chunks[index]
+        result = request(first_line, text)
+        if result is not None:
+            analysis_cache.set(family, digests[index], result)
+        return result
+
+    # Each chunk runs in a copy of the caller's context so that job state (cancellation, deadline) follows it
+    futures = [chunk_executor.submit(contextvars.copy_context().run, analyze, index) for index in missing]
+    results = [future.result() for future in futures]
+    for index, result in zip(missing, results):
+        if result is None:
+            logger.warning(f"Chunk at line {chunks[index][0]} of {file_path} could not be analyzed for {family}")
+            return None
+        found[digests[index]] = result
+    return mergeChunkResults([(first_line, found[digest]) for (first_line, _), digest in zip(chunks, digests)])
+
+
+# Threads reading files in the first stage of a report pipeline
+PIPELINE_READ_WORKERS = int(os.getenv('PIPELINE_READ_WORKERS', 4))
+# Files handed to one Bandit run by the SAST stage; smaller batches reach the LLM stages sooner
+PIPELINE_SAST_BATCH_SIZE = int(os.getenv('PIPELINE_SAST_BATCH_SIZE', 50))
+# Answer related-file lookups from the static import index, calling /analyze_context only for files it can't resolve
+IMPORT_GRAPH_ENABLED = os.getenv('IMPORT_GRAPH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# check -> (cache family, LLM endpoint, log label)
+REPORT_CHECKS = {
+    "security": ("vulnerability", "analyze_vulnerabilities", "Vulnerability"),
+    "compliance": ("compliance", "analyze_compliance", "Compliance"),
+}
+# Cache version of whole-file reports, stored as {"report", "promptBudget"} so that a cache hit needs no
+# prompt to report its budget decisions. Chunk results stay bare reports under CACHE_SCHEMA_VERSION
+REPORT_ENTRY_VERSION = f"{CACHE_SCHEMA_VERSION}-r2"
+
+
+# Leading list markers of a policy line: "-", "*", "•", "1.", "2)", "a)", "(b)". Letters followed by a
+# period are left alone, since "I." or "A." may just as well start the rule's text
+POLICY_MARKER_PATTERN = re.compile(r"^\s*(?:[-*\u2022]+|\(?\d{1,3}[.)]|\(?[a-zA-Z]\))\s+")
+
+_prepared_policies = {}
+_prepared_policies_lock = threading.Lock()
+
+
+def normalizePolicy(userCompText):
+    """
+    Normalizes policy text into its set of rules: one rule per line, list markers and
+    repeated whitespace removed, blank lines and duplicates dropped, rules sorted.
+    Policy texts that only differ in formatting or rule order normalize identically.
+    Only used for cache keys: the sorted rules lose the structure the LLM needs.
+    """
+    rules = {}
+    for line in (userCompText or "").splitlines():
+        rule = " ".join(POLICY_MARKER_PATTERN.sub("", line).split())
+        if rule:
+            rules.setdefault(rule.casefold(), rule)
+    return [rules[key] for key in sorted(rules)]
+
+
+def preparePolicy(userCompText):
+    """
+    Returns a policy text with its normalized hash, computed once per distinct text.
+
+    The normalized rules only key the compliance cache; the LLM gets the policy text as
+    written, in order, so section headers stay next to their rules. Prepared policies
+    are remembered in-process and in Redis (family "policy", keyed by the SHA-256 of
+    the raw text), so every scan and container reuses them.
+
+    Returns:
+    - policy (dict): {"hash": SHA-256 of the case-folded rules, "text": the policy text sent to the LLM, "rules": [...]}
+    """
+    raw_hash = string_to_sha256(userCompText or "")
+    with _prepared_policies_lock:
+        if raw_hash in _prepared_policies:
+            return _prepared_policies[raw_hash]
+
+    normalized = analysis_cache.get("policy", raw_hash)
+    if normalized is None:
+        rules = normalizePolicy(userCompText)
+        # Rules that only differ in case are the same policy
+        normalized = {"hash": string_to_sha256("\n".join(rule.casefold() for rule in rules)), "rules": rules}
+        analysis_cache.set("policy", raw_hash, normalized)
+    policy = {"hash": normalized["hash"], "text": userCompText or "", "rules": normalized["rules"]}
+
+    with _prepared_policies_lock:
+        return _prepared_policies.setdefault(raw_hash, policy)
+
+
+def complianceDigest(policy, prompt_digest):
+    """
+    Cache digest of a compliance result: the normalized policy hash and the prompt digest,
+    so the key reads compliance:<version>:<policy hash>:<prompt digest>.
+    """
+    return f"{policy['hash']}:{prompt_digest}"
+
+
+def promptDigest(content_hash, related_files, snapshot, saast_report=None):
+    """
+    Cache digest of a report: the hash of everything its prompt is built from, i.e. the
+    file's content, the content of each related file (by path relative to the
+    repository) under the prompt token budget and, for security prompts, the SAST
+    findings. A file whose dependencies or findings changed gets a new digest, and a
+    new report, even when its own content didn't change.
+
+    Parameters:
+    - content_hash (str): SHA-256 of the file's content.
+    - related_files (list): The context result, [{"relatedFileName", "relatedFilePath"}, ...].
+    - snapshot (RepoSnapshot): The scan's snapshot, which the prompt reads related files from.
+    - saast_report (list): The SAST findings the prompt carries, if any.
+    """
+    inputs = [content_hash, f"budget={PROMPT_TOKEN_BUDGET}"]
+    if saast_report:
+        # Locations name the clone the file was scanned in; line numbers are kept in line_number
+        findings = [{key: value for key, value in issue.items() if key != "location"} for issue in saast_report]
+        inputs.append(f"sast={string_to_sha256(json.dumps(findings, sort_keys=True))}")
+    related = []
+    for related_file in related_files or []:
+        related_file_path = related_file.get("relatedFilePath")
+        if not related_file_path:
+            continue
+        loaded = snapshot.load(related_file_path) if related_file_path in snapshot else None
+        if loaded is not None:
+            related_hash = loaded[1]
+        else:
+            related_content = snapshot.read(related_file_path)
+            related_hash = string_to_sha256(related_content) if related_content else None
+        related.append(f"{os.path.relpath(related_file_path, snapshot.repo_path)}:{related_hash}")
+    return string_to_sha256("\n".join(inputs + sorted(related)))
+
+
+def selectRepoFiles(repo_path, filepathsArr):
+    """
+    Returns the absolute paths of the existing programming files among paths relative to the repository.
+    """
+    file_paths = []
+    for file_relative_path in filepathsArr:
+        # Construct the absolute file path
+        file_path = os.path.join(repo_path, file_relative_path)
+
+        # Check if the file exists
+        if not os.path.isfile(file_path):
+            logger.warning(f"File {file_path} does not exist. Skipping.")
+            continue
+
+        # Check if the file has an accepted extension
+        _, file_extension = os.path.splitext(file_path)
+        if file_extension.lower() not in ACCEPTED_EXTENSIONS:
+            logger.info(f"Skipping {file_path} (not a programming file)")
+            continue
+        file_paths.append(file_path)
+    return file_paths
+
+
+# Levels of dependents of a changed file that commit checks re-analyze (0: only the changed files)
+IMPACT_DEPTH = int(os.getenv('IMPACT_DEPTH', 1))
+
+
+def reverseDependencies(repoPath, repo_analysis, snapshot):
+    """
+    Maps every file to the files that depend on it.
+
+    Dependencies come from the static import index, and for the files it can't resolve,
+    from their cached /analyze_context result (which may have been computed in another
+    clone of the repository, so its paths are matched relative to the repository).
+
+    Returns:
+    - dependents (dict): Absolute path -> set of absolute paths of the files relating to it.
+    """
+    file_paths = list(dict.fromkeys([*repo_analysis, *snapshot.paths]))
+    import_graph = ImportGraph.build(snapshot, file_paths) if IMPORT_GRAPH_ENABLED else None
+    related = {}
+    unresolved = {}
+    for file_path in file_paths:
+        found = import_graph.related(file_path) if import_graph is not None else None
+        if found is not None:
+            related[file_path] = found
+            continue
+        loaded = snapshot.load(file_path) if file_path in snapshot else None
+        if loaded is not None:
+            unresolved[file_path] = loaded[1]
+
+    known = {os.path.relpath(file_path, repoPath).replace(os.sep, '/'): file_path for file_path in file_paths}
+
+    def localPath(related_file_path):
+        # The shortest trailing part of the path that names a file of this repository
+        parts = related_file_path.replace(os.sep, '/').split('/')
+        for start in range(len(parts) - 1, -1, -1):
+            if '/'.join(parts[start:]) in known:
+                return known['/'.join(parts[start:])]
+        return None
+
+    cached = analysis_cache.get_many("context", list(set(unresolved.values())))
+    for file_path, content_hash in unresolved.items():
+        if content_hash in cached:
+            related[file_path] = [localPath(entry.get("relatedFilePath") or "") for entry in cached[content_hash]]
+
+    dependents = {}
+    for file_path, dependencies in related.items():
+        for dependency in dependencies:
+            if dependency and dependency != file_path:
+                dependents.setdefault(dependency, set()).add(file_path)
+    logger.info(f"Reverse dependencies of {repoPath}: {len(related)} of {len(file_paths)} files known, "
+                f"{len(unresolved) - len(set(unresolved) & set(related))} without context")
+    return dependents
+
+
+def impactedFiles(repoPath, changedPaths, repo_analysis, snapshot, depth=None):
+    """
+    Extends the files changed by a commit with the files whose prompts include them,
+    up to `depth` levels of dependents.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - changedPaths (list): Paths relative to the repository, including deleted and renamed-away paths.
+    - repo_analysis (dict): Analysis data of the commit.
+    - snapshot (RepoSnapshot): The files at the commit.
+    - depth (int): Levels of dependents to add. Defaults to IMPACT_DEPTH.
+
+    Returns:
+    - impacted (list): Relative paths of the changed files followed by their dependents.
+    """
+    depth = IMPACT_DEPTH if depth is None else depth
+    changed = [os.path.join(repoPath, path) for path in changedPaths]
+    impacted = dict.fromkeys(changed)
+    if depth > 0 and changed:
+        dependents = reverseDependencies(repoPath, repo_analysis, snapshot)
+        level = changed
+        for _ in range(depth):
+            level = [dependent for file_path in level for dependent in sorted(dependents.get(file_path, ())) if dependent not in impacted]
+            impacted.update(dict.fromkeys(level))
+            if not level:
+                break
+    logger.info(f"Commit impact for {repoPath}: {len(changed)} changed file(s), {len(impacted) - len(changed)} dependent(s) within depth {depth}")
+    return [os.path.relpath(file_path, repoPath) for file_path in impacted]
+
+
+# Files are analyzed riskiest first, so interrupted or time-budgeted scans cover those
+RISK_FIRST_SCHEDULING = os.getenv('RISK_FIRST_SCHEDULING', 'true').lower() in ('1', 'true', 'yes')
+# Number of recent commits whose changes count towards a file's churn
+SCHEDULER_CHURN_COMMITS = int(os.getenv('SCHEDULER_CHURN_COMMITS', 200))
+
+SEVERITY_WEIGHTS = {"High": 10, "Medium": 4, "Low": 1}
+# Calls and names that usually sit close to vulnerabilities, for files Bandit doesn't cover
+RISK_HINT_PATTERN = re.compile(
+    r"\b(?:eval|exec|system|popen|subprocess|shell_exec|pickle|marshal|unserialize|deserialize|yaml\.load"
+    r"|innerHTML|dangerouslySetInnerHTML|execute|raw_query|rawQuery|password|secret|token|md5|sha1"
+    r"|strcpy|strcat|sprintf|gets|memcpy|Runtime\.getRuntime|ProcessBuilder|unsafe)\b"
+)
+ENTRY_POINT_NAMES = {'main', 'app', 'server', 'index', 'manage', 'wsgi', 'asgi', 'routes', 'views',
+                     'handlers', 'api', 'urls', 'controller', 'controllers', 'cli'}
+ENTRY_POINT_PATTERN = re.compile(
+    r"if __name__ == ['\"]__main__['\"]|\bfunc main\(|\bstatic void [Mm]ain\(|\bint main\("
+    r"|@(?:app|router|bp|blueprint)\.(?:route|get|post|put|delete)\b|\bapp\.listen\("
+)
+
+
+def fileChurn(repo_path):
+    """
+    Counts how often each file changed in the last SCHEDULER_CHURN_COMMITS commits.
+
+    Returns:
+    - churn (dict): Absolute path -> number of commits touching it; empty outside a git repository.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path, "log", "-n", str(SCHEDULER_CHURN_COMMITS), "--name-only", "--format=", "--no-renames"],
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    churn = {}
+    for relative_path in result.stdout.splitlines():
+        if relative_path:
+            file_path = os.path.join(repo_path, relative_path)
+            churn[file_path] = churn.get(file_path, 0) + 1
+    return churn
+
+
+def scheduleFiles(repoPath, file_paths, snapshot):
+    """
+    Orders files riskiest first.
+
+    A file's score adds up the severity of its cached Bandit findings (or, without them,
+    the risky calls it contains), how often it changed recently, whether it is an entry
+    point and its size, each on a log scale so that no signal drowns the others.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - file_paths (list): Absolute paths of the files to order.
+    - snapshot (RepoSnapshot): The files' contents.
+
+    Returns:
+    - ordered (list): The same paths, highest score first; ties keep their order.
+    """
+    loaded = {file_path: snapshot.load(file_path) for file_path in file_paths}
+    version = banditVersion()
+    python_hashes = [entry[1] for file_path, entry in loaded.items() if entry is not None and file_path.endswith(".py")]
+    sast = analysis_cache.get_many("sast", python_hashes, version=version) if version and python_hashes else {}
+    churn = fileChurn(repoPath)
+
+    scores = {}
+    for file_path, entry in loaded.items():
+        if entry is None:
+            scores[file_path] = 0.0
+            continue
+        content, content_hash = entry
+        if content_hash in sast:
+            risk = sum(SEVERITY_WEIGHTS.get(issue.get("severity"), 0) for issue in sast[content_hash])
+        else:
+            risk = len(RISK_HINT_PATTERN.findall(content))
+        stem = os.path.splitext(os.path.basename(file_path))[0].lower()
+        entry_point = stem in ENTRY_POINT_NAMES or ENTRY_POINT_PATTERN.search(content) is not None
+        scores[file_path] = (
+            2 * math.log2(1 + risk)
+            + math.log2(1 + churn.get(file_path, 0))
+            + (2 if entry_point else 0)
+            + 0.5 * math.log2(1 + len(content) / 1024)
+        )
+    ordered = sorted(file_paths, key=lambda file_path: -scores[file_path])
+    logger.info(f"Scheduled {len(ordered)} file(s) of {repoPath}, riskiest first: "
+                f"{[os.path.relpath(file_path, repoPath) for file_path in ordered[:5]]}")
+    return ordered
+
+
+class ReportScan:
+    """
+    The report checks of one scan, run as a staged Pipeline.
+
+    Stages, each with its own workers and connected by bounded queues:
+    read -> cache (static import index, else cached context, MGET per batch)
+    -> context (/analyze_context for the rest) -> sast (batched Bandit, security only,
+    files without cached findings) -> reportCache (reports keyed on the prompt inputs,
+    MGET per batch) -> one stage per check (prompt + LLM request).
+    Files move on as soon as a stage is done with them, so Bandit, context lookups and
+    report requests for different files overlap. They enter riskiest first (see
+    scheduleFiles), and once the check's time budget is used up the remaining files are
+    reported as pending instead of being sent to the LLM.
+    Files longer than CHUNK_THRESHOLD_LINES get their context and reports analyzed
+    chunk by chunk (see analyzeInChunks).
+
+    The stage workers here block on the LLM and Redis; AsyncUtils.AsyncReportScan
+    overrides those that make requests with coroutines and keeps the rest.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - checks (tuple): "security" and/or "compliance".
+    - file_paths (list): Absolute paths of the files to analyze; every snapshot file if omitted.
+    - userCompText (str): The user's policies, for the compliance check.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - annotations (dict): Optional {absolute file path: {field: value}}, extra fields added to that file's report entries.
+    - max_workers (int): Workers per LLM stage. Defaults to LLM_MAX_WORKERS.
+    """
+
+    def __init__(self, repoPath, repo_analysis, checks, file_paths=None, userCompText=None, snapshot=None, annotations=None, max_workers=None):
+        self.repoPath = repoPath
+        self.repo_analysis = repo_analysis
+        self.checks = checks
+        self.combined = len(checks) > 1
+        self.families = [REPORT_CHECKS[check][0] for check in checks]
+        self.annotations = annotations
+        self.max_workers = max_workers or LLM_MAX_WORKERS
+        if snapshot is None:
+            snapshot = RepoSnapshot.build(repoPath) if file_paths is None else RepoSnapshot(repoPath, file_paths)
+        self.snapshot = snapshot
+        self.file_paths = snapshot.paths if file_paths is None else file_paths
+        if RISK_FIRST_SCHEDULING:
+            self.file_paths = scheduleFiles(repoPath, self.file_paths, snapshot)
+        # Compliance results are keyed on the normalized policy as well as the prompt inputs
+        self.policy = preparePolicy(userCompText) if "compliance" in checks else None
+        self.prompt_builder = PromptBuilder(snapshot)
+        self.import_graph = ImportGraph.build(snapshot, dict.fromkeys([*repo_analysis, *self.file_paths])) if IMPORT_GRAPH_ENABLED else None
+        # Set by run(), which encodes repo_analysis (or registers it with the service) once for the whole scan
+        self.fmap_transport = None
+        # Files left (partly) unanalyzed when the time budget ran out
+        self.pending = set()
+
+    def digest(self, family, content_hash, related_files, saast_report=None):
+        # Only the security prompt carries the SAST report
+        prompt_digest = promptDigest(content_hash, related_files, self.snapshot, saast_report if family == "vulnerability" else None)
+        return complianceDigest(self.policy, prompt_digest) if family == "compliance" else prompt_digest
+
+    def read(self, file_path):
+        if scanCancelled():
+            return None
+        loaded = self.snapshot.load(file_path)
+        if loaded is None:
+            return None
+        content, content_hash = loaded
+        # Files too long for a single request are analyzed chunk by chunk
+        chunks = splitIntoChunks(content) if needsChunking(content) else None
+        return {"path": file_path, "content": content, "hash": content_hash, "chunks": chunks, "cached": {}, "reports": {}}
+
+    def unresolvedContext(self, tasks):
+        """
+        Gives the tasks the import index resolves their related files, and returns the others.
+        """
+        unresolved = []
+        for task in tasks:
+            related = self.import_graph.relatedFiles(task["path"]) if self.import_graph is not None else None
+            if related is not None:
+                task["context"] = related
+            else:
+                unresolved.append(task)
+        return unresolved
+
+    @staticmethod
+    def useCached(tasks, key, digests, found):
+        for task, digest in zip(tasks, digests):
+            if digest in found:
+                task["cached"][key] = found[digest]
+
+    def reportDigests(self, tasks):
+        # Reports are keyed on their prompt inputs, which are only known once the context and SAST report are
+        for task in tasks:
+            task["digests"] = {family: self.digest(family, task["hash"], task["context"], task.get("saast")) for family in self.families}
+
+    def lookupContext(self, tasks):
+        unresolved = self.unresolvedContext(tasks)
+        hashes = [task["hash"] for task in unresolved]
+        self.useCached(unresolved, "context", hashes, analysis_cache.get_many("context", hashes))
+        return tasks
+
+    def lookupReports(self, tasks):
+        self.reportDigests(tasks)
+        for family in self.families:
+            digests = [task["digests"][family] for task in tasks]
+            self.useCached(tasks, family, digests, analysis_cache.get_many(family, digests, version=REPORT_ENTRY_VERSION))
+        return tasks
+
+    def sast(self, tasks):
+        # Findings are part of the security prompt inputs; Bandit only runs for files without cached findings.
+        # The stage's workers are the scan's Bandit processes, so each one runs a single process
+        saast_reports = generateSaastReports([task["path"] for task in tasks], self.snapshot, max_processes=1)
+        for task in tasks:
+            task["saast"] = saast_reports.get(task["path"])
+        return tasks
+
+    def proceed(self, task):
+        """
+        Returns whether the LLM may still be asked about a file; past the time budget the file is left pending.
+        """
+        if scanCancelled():
+            return False
+        if deadlineReached():
+            self.pending.add(task["path"])
+            return False
+        return True
+
+    def knownContext(self, task):
+        """
+        Returns whether the file's related files are known without asking the LLM.
+        """
+        logger.info(f"Analyzing {task['path']} for context...")
+        if "context" in task:
+            return True
+        if "context" in task["cached"]:
+            print(f"Context cache hit for {task['path']}")
+            task["context"] = task["cached"]["context"]
+            return True
+        return False
+
+    def useContext(self, task, context_analysis):
+        if context_analysis is None:
+            return None
+        task["context"] = uniqueRelatedFiles(context_analysis) if task["chunks"] is not None else context_analysis
+        return task
+
+    def context(self, task):
+        if self.knownContext(task):
+            return task
+        if not self.proceed(task):
+            return None
+        if task["chunks"] is not None:
+            context_analysis = analyzeInChunks(
+                task["path"], "context", task["chunks"], chunkTextDigest,
+                lambda first_line, text: self.requestContext(task["path"], text)
+            )
+        else:
+            context_analysis = self.requestContext(task["path"], task["content"])
+        if self.useContext(task, context_analysis) is None:
+            return None
+        analysis_cache.set("context", task["hash"], task["context"])
+        return task
+
+    def requestContext(self, file_path, content):
+        try:
+            response = postContextRequest(self.fmap_transport, os.path.basename(file_path), content)
+        except requests.RequestException as e:
+            logger.error(f"Error sending context request to the API for {file_path}: {e}")
+            return None
+        return self.answer("context", file_path, response)
+
+    @staticmethod
+    def answer(family, file_path, response):
+        result = response.json() if response.status_code == 200 else None
+        if result is None:
+            logger.warning(f"Failed to analyze {family} for {file_path}, Status Code: {response.status_code}")
+        return result
+
+    def saastReport(self, task, check, first_line=None, text=None):
+        # Only the security prompt carries the SAST report; a chunk's prompt carries the chunk's findings
+        if check != "security":
+            return None
+        return task.get("saast") if text is None else chunkSaastReport(task.get("saast"), first_line, text)
+
+    def prompt(self, task, check):
+        """
+        Returns the prompt of an unchunked file and its token budget metadata.
+        """
+        return self.prompt_builder.buildWithBudget(task["path"], task["content"], task["context"], self.saastReport(task, check))
+
+    def chunkBudget(self, task, check):
+        # The budget decisions of a chunked file are those of its first chunk
+        first_line, text = task["chunks"][0]
+        return self.prompt_builder.budget(task["path"], text, task["context"], self.saastReport(task, check, first_line, text))
+
+    def chunkDigest(self, task, check, first_line, text):
+        # Chunks are keyed on their own prompt inputs, so unchanged chunks are reused
+        return self.digest(REPORT_CHECKS[check][0], string_to_sha256(text), task["context"], self.saastReport(task, check, first_line, text))
+
+    def chunkPrompt(self, task, check, first_line, text):
+        return self.prompt_builder.build(task["path"], text, task["context"], self.saastReport(task, check, first_line, text))
+
+    def requestData(self, check, file_path, codes):
+        request_data = {'fileName': os.path.basename(file_path), 'fileContent': codes}
+        if check == "compliance":
+            request_data['userDefinedPolicies'] = self.policy["text"]
+        return request_data
+
+    def cachedReport(self, task, check):
+        """
+        Returns (report, prompt budget metadata) of a check found in the cache, or None.
+        """
+        family, _, label = REPORT_CHECKS[check]
+        cached = task["cached"].get(family)
+        if cached is None:
+            return None
+        print(f"{label} cache hit for {task['path']}")
+        return cached["report"], cached["promptBudget"]
+
+    def record(self, task, check, c_report, budget):
+        """
+        Adds a check's report to the file's entries.
+
+        Returns:
+        - task (dict): The task to pass on to the next stage, or None to drop it.
+        """
+        if c_report is not None:
+            file_path = task["path"]
+            filename = os.path.basename(file_path)
+            logger.info(f"{REPORT_CHECKS[check][2]} Report for {file_path}: {c_report}")
+            task["reports"][check] = {"fileName": filename, "report": c_report, "promptBudget": budget}
+            if task["chunks"] is not None:
+                task["reports"][check]["chunks"] = len(task["chunks"])
+            if self.annotations and file_path in self.annotations:
+                task["reports"][check].update(self.annotations[file_path])
+        # A combined scan still runs the other check when this one failed
+        return task if self.combined or c_report is not None else None
+
+    def checkWorker(self, check):
+        family, endpoint, _ = REPORT_CHECKS[check]
+
+        def request(file_path, codes):
+            try:
+                response = llm_client.post(endpoint, json=self.requestData(check, file_path, codes))
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.error(f"Error sending {family} request to the API for {file_path}: {e}")
+                return None
+            return self.answer(family, file_path, response)
+
+        def run(task):
+            cached = self.cachedReport(task, check)
+            if cached is not None:
+                return self.record(task, check, *cached)
+            if not self.proceed(task):
+                return self.record(task, check, None, None)
+            if task["chunks"] is None:
+                codes, budget = self.prompt(task, check)
+                c_report = request(task["path"], codes)
+            else:
+                budget = self.chunkBudget(task, check)
+                c_report = analyzeInChunks(
+                    task["path"], family, task["chunks"],
+                    lambda first_line, text: self.chunkDigest(task, check, first_line, text),
+                    lambda first_line, text: request(task["path"], self.chunkPrompt(task, check, first_line, text))
+                )
+            if c_report is not None:
+                analysis_cache.set(family, task["digests"][family], {"report": c_report, "promptBudget": budget}, version=REPORT_ENTRY_VERSION)
+            return self.record(task, check, c_report, budget)
+
+        return run
+
+    def pipeline(self):
+        stages = [
+            Stage("read", self.read, concurrency=PIPELINE_READ_WORKERS),
+            Stage("cache", self.lookupContext, batch_size=CACHE_PIPELINE_BATCH),
+            Stage("context", self.context, concurrency=self.max_workers),
+        ]
+        if "security" in self.checks:
+            stages.append(Stage("sast", self.sast, concurrency=BANDIT_MAX_PROCESSES, batch_size=PIPELINE_SAST_BATCH_SIZE))
+        stages.append(Stage("reportCache", self.lookupReports, batch_size=CACHE_PIPELINE_BATCH))
+        stages += [Stage(check, self.checkWorker(check), concurrency=self.max_workers) for check in self.checks]
+        return Pipeline(stages)
+
+    def entry(self, task):
+        if task is None or not task["reports"]:
+            return None
+        if not self.combined:
+            return task["reports"][self.checks[0]]
+        return dict(task["reports"], fileName=os.path.basename(task["path"]))
+
+    def track(self, progress):
+        """
+        Starts reporting the scan's progress and returns the pipeline's on_done callback.
+        """
+        if progress is None:
+            return None
+        progress.start(len(self.file_paths))
+        return lambda file_path, task: progress.fileDone(self.entry(task), file_path if file_path in self.pending else None)
+
+    def report(self, pipeline, tasks):
+        """
+        Logs the scan's stats and returns the file reports of a single check, or {check: [...]} when several checks run.
+        """
+        if self.pending:
+            logger.warning(f"Time budget used up for {self.repoPath}: {len(self.pending)} of {len(self.file_paths)} file(s) left pending")
+        logger.info(f"Pipeline stages for {self.repoPath}: {pipeline.stats()}")
+        logger.info(f"fMap transport for {self.repoPath}: {self.fmap_transport.stats()}")
+        logger.info(f"Prompts for {self.repoPath}: {self.prompt_builder.stats()}")
+        if self.import_graph is not None:
+            logger.info(f"Import graph for {self.repoPath}: {self.import_graph.stats()}")
+        if self.combined:
+            return {check: [task["reports"][check] for task in tasks if task is not None and check in task["reports"]] for check in self.checks}
+        return [entry for entry in map(self.entry, tasks) if entry is not None]
+
+    def run(self, progress=None):
+        """
+        Runs the scan.
+
+        Parameters:
+        - progress (ScanProgress): Optional listener notified as each file completes.
+
+        Returns:
+        - report (list): The file reports of a single check, or {check: [...]} when several checks run.
+        """
+        self.fmap_transport = FileMapTransport(self.repo_analysis)
+        pipeline = self.pipeline()
+        on_done = self.track(progress)
+        with analysis_cache.batched_writes():
+            tasks = pipeline.run(self.file_paths, on_done)
+        return self.report(pipeline, tasks)
+
+
+def runReportPipeline(repoPath, repo_analysis, checks, file_paths=None, userCompText=None, max_workers=None, snapshot=None, progress=None, annotations=None):
+    """
+    Runs the report checks of a scan as a staged pipeline (see ReportScan).
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - checks (tuple): "security" and/or "compliance".
+    - file_paths (list): Absolute paths of the files to analyze; every snapshot file if omitted.
+    - userCompText (str): The user's policies, for the compliance check.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+    - annotations (dict): Optional {absolute file path: {field: value}}, extra fields added to that file's report entries.
+
+    Returns:
+    - report (list): The file reports of a single check, or {check: [...]} when several checks run.
+    """
+    if not os.path.isdir(repoPath):
+        logger.error(f"Repository {repoPath} not found!")
+        return {check: [] for check in checks} if len(checks) > 1 else []
+    return ReportScan(repoPath, repo_analysis, checks, file_paths, userCompText, snapshot, annotations, max_workers).run(progress)
+
+
+def analyzeRepositoryForContextAndReport(repoPath, repo_analysis, max_workers=None, snapshot=None, progress=None):
+    """
+    Analyzes the repository for context and generates a vulnerability report.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+
+    Returns:
+    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+    """
+    return runReportPipeline(repoPath, repo_analysis, ("security",), max_workers=max_workers, snapshot=snapshot, progress=progress)
+
+
+def analyzeASetOfFilesForContextAndReport(repoPath, filepathsArr, repo_analysis, snapshot=None, progress=None, max_workers=None):
+    """
+    Analyzes a specific set of files within a repository for context and generates vulnerability reports.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - filepathsArr (list): List of file paths to analyze within the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+
+    Returns:
+    - report (list): A list of dictionaries containing file names and their vulnerability reports.
+    """
+    if not os.path.isdir(repoPath):
+        logger.error(f"Repository {repoPath} not found!")
+        return []
+    file_paths = selectRepoFiles(repoPath, filepathsArr)
+    return runReportPipeline(repoPath, repo_analysis, ("security",), file_paths, max_workers=max_workers, snapshot=snapshot, progress=progress)
+
+
+def analyzeRepositoryForContextAndComplianceReport(repoPath, repo_analysis, userCompText, snapshot=None, progress=None, max_workers=None):
+    """
+    Analyzes the repository for context and generates a compliance report.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - userCompText (str): The user's policies.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+
+    Returns:
+    - report (list): A list of dictionaries containing file names and their compliance reports.
+    """
+    return runReportPipeline(repoPath, repo_analysis, ("compliance",), userCompText=userCompText, max_workers=max_workers, snapshot=snapshot, progress=progress)
+
+
+def analyzeASetOfFilesForContextAndComplianceReport(repoPath, filepathsArr, repo_analysis,userCompText, snapshot=None, progress=None, max_workers=None):
+    """
+    Analyzes a specific set of files within a repository for context and generates compliance reports.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - filepathsArr (list): List of file paths to analyze within the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - userCompText (str): The user's policies.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+
+    Returns:
+    - report (list): A list of dictionaries containing file names and their compliance reports.
+    """
+    if not os.path.isdir(repoPath):
+        logger.error(f"Repository {repoPath} not found!")
+        return []
+    file_paths = selectRepoFiles(repoPath, filepathsArr)
+    return runReportPipeline(repoPath, repo_analysis, ("compliance",), file_paths, userCompText, max_workers, snapshot, progress)
+
+
+def analyzeRepositoryForContextAndCombinedReport(repoPath, repo_analysis, userCompText, filepathsArr=None, max_workers=None, snapshot=None, progress=None):
+    """
+    Runs the security and the compliance check in one pass.
+
+    The tree walk, the context analysis, the SAST run and the related-file reads are
+    done once per file; the vulnerability and compliance stages then run side by side.
+
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - repo_analysis (dict): Analysis data from fullRepoAnalysis.
+    - userCompText (str): The user's policies for the compliance check.
+    - filepathsArr (list): Optional paths relative to the repository; the whole repository if omitted.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+    - snapshot (RepoSnapshot): Snapshot shared with the other stages of the request. Built here if omitted.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+
+    Returns:
+    - reports (dict): {"security": [...], "compliance": [...]}, each shaped like the single-check reports.
+    """
+    file_paths = None
+    if filepathsArr is not None and os.path.isdir(repoPath):
+        file_paths = selectRepoFiles(repoPath, filepathsArr)
+    return runReportPipeline(repoPath, repo_analysis, ("security", "compliance"), file_paths, userCompText, max_workers, snapshot, progress)
+
+
+def analyzeCommitRange(repoPath, base, head, checks=("security",), userCompText=None, max_workers=None, progress=None):
+    """
+    Analyzes the files changed in base..head and their dependents, reading every file
+    from the git object database. The working tree is neither read nor changed, so
+    ranges of the same clone can be analyzed concurrently.
 
-    return report
+    Parameters:
+    - repoPath (str): The path to the repository.
+    - base (str): The commit the range starts from (excluded).
+    - head (str): The commit the range ends at.
+    - checks (tuple): "security" and/or "compliance".
+    - userCompText (str): The user's policies, for the compliance check.
+    - max_workers (int): Worker threads per LLM stage. Defaults to LLM_MAX_WORKERS.
+    - progress (ScanProgress): Optional listener notified as each file completes.
+
+    Returns:
+    - result (dict): {"base", "head", "changes": [...], "dependents": [...], "report": ...}, where changes
+      comes from getCommitRangeChanges, dependents lists the unchanged files re-checked because a
+      file they depend on changed (see impactedFiles), and report is shaped like the output of runReportPipeline.
+      Renamed files carry "renamedFrom" in their report entries. None if the range can't be resolved.
+    """
+    head_commit, blobs = getCommitBlobs(repoPath, head)
+    base_commit, _ = getCommitBlobs(repoPath, base)
+    if head_commit is None or base_commit is None:
+        logger.error(f"Could not resolve {base}..{head} in {repoPath}")
+        return None
+    changes = getCommitRangeChanges(repoPath, base_commit, head_commit)
+    if changes is None:
+        return None
 
+    snapshot = CommitSnapshot(repoPath, head_commit, blobs)
+    # The fMap reflects the tree at head; results of the base commit are reused when it was analyzed
+    repo_analysis = incrementalRepoAnalysis(repoPath, max_workers, snapshot, commit=head_commit, previous_commit=base_commit)
+    analyzed = [change for change in changes if change["status"] != 'deleted']
+    logger.info(f"Commit range {base_commit[:12]}..{head_commit[:12]} of {repoPath}: {len(analyzed)} changed file(s), {len(changes) - len(analyzed)} deleted")
+
+    # Files including a changed (or deleted, or renamed-away) file are re-checked as well
+    changed_paths = [path for change in changes for path in (change["path"], change["previousPath"]) if path]
+    impacted = [path for path in impactedFiles(repoPath, changed_paths, repo_analysis, snapshot) if os.path.join(repoPath, path) in snapshot]
+    file_paths = [os.path.join(repoPath, path) for path in impacted]
+    dependents = [path for path in impacted if path not in set(changed_paths)]
+    # Keyed on the full path: renamed files sharing a basename with another file must not be mixed up
+    renamed_from = {
+        os.path.join(repoPath, change["path"]): {"renamedFrom": change["previousPath"]} for change in analyzed if change["previousPath"]
+    }
+    report = runReportPipeline(repoPath, repo_analysis, tuple(checks), file_paths, userCompText, max_workers, snapshot, progress, renamed_from)
+    return {"base": base_commit, "head": head_commit, "changes": changes, "dependents": dependents, "report": report}
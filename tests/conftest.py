@@ -0,0 +1,112 @@
+import os
+import shutil
+import subprocess
+import sys
+from json import loads
+
+import fakeredis
+import pytest
+import redis
+import redis.asyncio
+
+# The modules under test create their Redis clients on import; tests use one in-memory server instead
+redis_server = fakeredis.FakeServer()
+redis.Redis = lambda *args, **kwargs: fakeredis.FakeRedis(server=redis_server)
+redis.asyncio.Redis = lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=redis_server)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AsyncUtils  # noqa: E402
+import Utils  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class Response:
+    """
+    Minimal stand-in for the requests.Response of an LLM service call.
+    """
+
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def emptyCaches():
+    Utils.analysis_cache.clear()
+    Utils.redis_client.flushall()
+    yield
+
+
+class FakeLLM:
+    """
+    Stand-in for the LLM service: records every call and answers per endpoint, for
+    the synchronous (post) and the asyncio (postAsync) clients alike.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.answers = {
+            'analyze_repo_code': lambda body: {'summary': f"summary of {body['fileName']}"},
+            'analyze_context': lambda body: [],
+        }
+
+    def post(self, endpoint, json=None, data=None, headers=None):
+        # Bodies sent already encoded (data) are recorded decoded, like json ones
+        body = json if data is None else loads(data)
+        self.calls.append((endpoint, body))
+        answer = self.answers.get(endpoint, lambda body: {'endpoint': endpoint, 'fileName': body['fileName']})
+        # An answer may be a Response, to reply with another status than 200
+        result = answer(body)
+        return result if isinstance(result, Response) else Response(result)
+
+    async def postAsync(self, endpoint, json=None, data=None):
+        response = self.post(endpoint, json=json, data=data)
+        return AsyncUtils.LLMResponse(response.status_code, response.body)
+
+    def endpoints(self):
+        return [endpoint for endpoint, _ in self.calls]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(Utils.llm_client, 'post', fake.post)
+    monkeypatch.setattr(AsyncUtils.llm_client, 'post', fake.postAsync)
+    return fake
+
+
+def git(repo_path, *args):
+    return subprocess.run(['git', '-C', repo_path, *args], capture_output=True, text=True, check=True).stdout.strip()
+
+
+@pytest.fixture
+def gitRepo(tmp_path):
+    """
+    Returns a function creating an empty git repository (branch main) under tmp_path.
+    """
+    def create(name='repo'):
+        repo_path = str(tmp_path / name)
+        os.makedirs(repo_path)
+        git(repo_path, 'init', '-q', '-b', 'main')
+        git(repo_path, 'config', 'user.email', 'tests@example.com')
+        git(repo_path, 'config', 'user.name', 'tests')
+        return repo_path
+    return create
+
+
+@pytest.fixture
+def polyglotRepo(tmp_path):
+    """
+    A copy of fixtures/polyglot_repo: 33 files in 11 languages, 4 of which (a Swift file
+    and three with unresolvable local imports) can't be answered by the import graph.
+    """
+    repo_path = str(tmp_path / 'polyglot_repo')
+    shutil.copytree(os.path.join(FIXTURES, 'polyglot_repo'), repo_path)
+    return repo_path
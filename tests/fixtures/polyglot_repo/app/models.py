@@ -0,0 +1,5 @@
+import json
+
+
+class User:
+    pass
@@ -0,0 +1,3 @@
+from .models import User
+from app import services
+import requests
@@ -0,0 +1,3 @@
+#include <stdio.h>
+#include "util.h"
+#include "other/helper.h"
@@ -0,0 +1 @@
+int h() { return 1; }
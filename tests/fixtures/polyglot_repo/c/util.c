@@ -0,0 +1 @@
+int util() { return 0; }
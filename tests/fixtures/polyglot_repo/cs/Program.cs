@@ -0,0 +1,3 @@
+using System;
+using Acme.Data;
+namespace Acme.App { class Program { Store s; Util u; } }
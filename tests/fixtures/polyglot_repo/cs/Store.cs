@@ -0,0 +1 @@
+namespace Acme.Data { class Store {} }
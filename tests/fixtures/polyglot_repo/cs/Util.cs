@@ -0,0 +1 @@
+namespace Acme.App { class Util {} }
@@ -0,0 +1,2 @@
+package store
+func Get() {}
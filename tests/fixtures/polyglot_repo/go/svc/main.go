@@ -0,0 +1,6 @@
+package main
+import (
+  "fmt"
+  "github.com/acme/proj/go/store"
+)
+func main() { helper(); store.Get() }
@@ -0,0 +1,4 @@
+package com.acme;
+import com.acme.db.Repo;
+import java.util.List;
+class App { Helper h; Repo r; }
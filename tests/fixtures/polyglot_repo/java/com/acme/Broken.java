@@ -0,0 +1,2 @@
+package com.acme;
+import com.acme.gone.Thing;
@@ -0,0 +1,2 @@
+package com.acme.db;
+public class Repo {}
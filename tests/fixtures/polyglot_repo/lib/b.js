@@ -0,0 +1 @@
+module.exports = {}
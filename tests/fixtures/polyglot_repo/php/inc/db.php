@@ -0,0 +1 @@
+<?php
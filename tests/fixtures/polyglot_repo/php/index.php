@@ -0,0 +1,4 @@
+<?php
+require_once __DIR__ . '/inc/db.php';
+use App\Models\User;
+use Symfony\Foo;
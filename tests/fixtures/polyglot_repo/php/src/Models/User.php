@@ -0,0 +1 @@
+<?php class User {}
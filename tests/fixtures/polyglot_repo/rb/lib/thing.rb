@@ -0,0 +1 @@
+class Thing; end
@@ -0,0 +1,3 @@
+mod net;
+use crate::net::client::Client;
+use std::io;
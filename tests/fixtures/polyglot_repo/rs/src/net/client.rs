@@ -0,0 +1 @@
+pub struct Client;
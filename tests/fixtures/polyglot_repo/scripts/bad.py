@@ -0,0 +1 @@
+from app.missing import thing
@@ -0,0 +1,2 @@
+from pkg.core import X
+import app.views
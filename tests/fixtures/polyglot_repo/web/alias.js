@@ -0,0 +1 @@
+import x from '@/components/x'
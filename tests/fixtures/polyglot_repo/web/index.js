@@ -0,0 +1,3 @@
+import React from 'react';
+import { a } from './util';
+const b = require('../lib/b.js');
@@ -0,0 +1 @@
+export const a = 1;
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+
+import redis
+
+import AsyncUtils
+import Utils
+from Utils import AnalysisCache, runConcurrently
+
+
+def stored(cache, family, digest):
+    return cache.client.get(cache.key(family, digest)) is not None
+
+
+class FailingRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError('down')
+        return fail
+
+
+def test_entries_are_keyed_by_family_version_and_digest():
+    cache = AnalysisCache(Utils.redis_client, version='v9')
+    cache.set('context', 'abc', [1])
+    assert json.loads(Utils.redis_client.get('context:v9:abc')) == [1]
+    cache.set('vulnerability', 'abc', {'issues': []}, version='v9-r2')
+    assert cache.get('vulnerability', 'abc') is None
+    assert cache.get('vulnerability', 'abc', version='v9-r2') == {'issues': []}
+
+
+def test_redis_hits_are_kept_in_the_local_tier():
+    Utils.redis_client.set('context:v1:abc', json.dumps([1]))
+    cache = AnalysisCache(Utils.redis_client, version='v1')
+    assert cache.get('context', 'abc') == [1]
+    Utils.redis_client.delete('context:v1:abc')
+    assert cache.get('context', 'abc') == [1]
+    assert cache.get('context', 'missing') is None
+    assert cache.stats() == {'context': {'localHits': 1, 'redisHits': 1, 'misses': 1}}
+
+
+def test_local_tier_evicts_the_least_recently_used_entry():
+    cache = AnalysisCache(Utils.redis_client, max_entries=2)
+    cache.set('context', 'a', 'a')
+    cache.set('context', 'b', 'b')
+    cache.get('context', 'a')
+    cache.set('context', 'c', 'c')
+    assert cache.get_many('context', ['a', 'b', 'c']) == {'a': 'a', 'b': 'b', 'c': 'c'}
+    # b was evicted, so only it came from Redis
+    assert cache.stats()['context'] == dict(cache.stats()['context'], localHits=3, redisHits=1)
+
+
+def test_redis_errors_are_treated_as_misses():
+    cache = AnalysisCache(FailingRedis())
+    cache.set('context', 'a', [1])
+    assert cache.get('context', 'a') == [1]
+    assert cache.get('context', 'b') is None
+    assert cache.get_many('context', ['a', 'b']) == {'a': [1]}
+
+
+class CountingRedis:
+    """
+    Passes calls on to the shared fake Redis, counting them per command.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = {}
+
+    def __getattr__(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        return getattr(self.client, name)
+
+
+def test_prefetch_sends_one_mget_per_batch(monkeypatch):
+    monkeypatch.setattr(Utils, 'CACHE_PIPELINE_BATCH', 4)
+    for index in range(6):
+        Utils.redis_client.set(f'context:v1:{index}', json.dumps(index))
+    client = CountingRedis(Utils.redis_client)
+    cache = AnalysisCache(client, version='v1')
+
+    prefetched = cache.prefetch({'context': [str(index) for index in range(10)]})
+
+    assert prefetched == {'context': {str(index): index for index in range(6)}}
+    assert client.calls == {'mget': 3}
+
+
+def test_prefetched_families_never_go_back_to_redis():
+    client = CountingRedis(Utils.redis_client)
+    cache = AnalysisCache(client)
+    prefetched = cache.prefetch({'context': ['a']})
+    Utils.redis_client.set(cache.key('context', 'a'), json.dumps([1]))
+
+    # A miss at prefetch time stays a miss; other families are looked up as usual
+    assert cache.get('context', 'a', prefetched=prefetched) is None
+    assert cache.get('repoAnalysis', 'a', prefetched=prefetched) is None
+    assert client.calls == {'mget': 1, 'get': 1}
+
+
+def test_async_cache_shares_entries_with_the_sync_cache():
+    Utils.redis_client.set(Utils.analysis_cache.key('context', 'remote'), json.dumps('from redis'))
+    Utils.analysis_cache.set('context', 'local', 'from the lru')
+
+    async def scan():
+        cache = AsyncUtils.AsyncAnalysisCache(Utils.analysis_cache, AsyncUtils.async_redis_client)
+        prefetched = await cache.prefetch({'context': ['remote', 'local', 'missing']})
+        await cache.set('context', 'written', 'by the async path')
+        buffered = Utils.redis_client.get(Utils.analysis_cache.key('context', 'written'))
+        await cache.flush()
+        return prefetched, buffered
+
+    prefetched, buffered = asyncio.run(scan())
+    assert prefetched == {'context': {'remote': 'from redis', 'local': 'from the lru'}}
+    assert buffered is None
+    Utils.analysis_cache.clear()
+    assert Utils.analysis_cache.get('context', 'written') == 'by the async path'
+
+
+def test_unchanged_files_are_not_analyzed_again(tmp_path, llm):
+    for name in 'abc':
+        (tmp_path / f'{name}.py').write_text(f'{name} = 1\n')
+
+    def scan():
+        llm.calls.clear()
+        snapshot = Utils.RepoSnapshot(str(tmp_path), [str(tmp_path / f'{name}.py') for name in 'abc'])
+        return Utils.fullRepoAnalysis(str(tmp_path), snapshot=snapshot), llm.endpoints().count('analyze_repo_code')
+
+    first, requests = scan()
+    assert requests == 3 and len(first) == 3
+    # Results are keyed on the content alone, so a fresh process (empty local tier) finds them in Redis
+    Utils.analysis_cache.clear()
+    (tmp_path / 'b.py').write_text('b = 2\n')
+    second, requests = scan()
+    assert requests == 1
+    assert second[str(tmp_path / 'a.py')] == first[str(tmp_path / 'a.py')]
+
+
+def test_batched_writes_reach_redis_when_the_block_exits():
+    cache = AnalysisCache(Utils.redis_client)
+    with cache.batched_writes():
+        cache.set('context', 'a', [1])
+        assert cache.get('context', 'a') == [1]
+        assert not stored(cache, 'context', 'a')
+    assert stored(cache, 'context', 'a')
+
+
+def test_full_batches_are_sent_before_the_block_exits(monkeypatch):
+    monkeypatch.setattr(Utils, 'CACHE_PIPELINE_BATCH', 3)
+    cache = AnalysisCache(Utils.redis_client)
+    with cache.batched_writes():
+        for digest in 'abc':
+            cache.set('context', digest, digest)
+        assert all(stored(cache, 'context', digest) for digest in 'abc')
+
+
+def test_writes_from_worker_threads_join_the_block():
+    cache = AnalysisCache(Utils.redis_client)
+    with cache.batched_writes():
+        runConcurrently(list('abcd'), lambda digest: cache.set('context', digest, digest), max_workers=4)
+        assert not any(stored(cache, 'context', digest) for digest in 'abcd')
+    assert all(stored(cache, 'context', digest) for digest in 'abcd')
+
+
+def test_each_block_flushes_its_own_writes():
+    cache = AnalysisCache(Utils.redis_client)
+    other_open = threading.Event()
+    other_may_exit = threading.Event()
+
+    def otherJob():
+        with cache.batched_writes():
+            cache.set('context', 'other', 1)
+            other_open.set()
+            other_may_exit.wait(5)
+
+    thread = threading.Thread(target=otherJob)
+    thread.start()
+    assert other_open.wait(5)
+    with cache.batched_writes():
+        cache.set('context', 'mine', 1)
+    # Flushed although the other job's block is still open, whose write is still buffered
+    assert stored(cache, 'context', 'mine')
+    assert not stored(cache, 'context', 'other')
+    other_may_exit.set()
+    thread.join(5)
+    assert stored(cache, 'context', 'other')
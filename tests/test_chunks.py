@@ -0,0 +1,129 @@
+import asyncio
+
+import AsyncUtils
+import Utils
+from Utils import splitIntoChunks, mergeChunkResults, shiftLineNumbers, chunkSaastReport, uniqueRelatedFiles
+
+
+def pythonFile(functions, body_lines):
+    parts = []
+    for index in range(functions):
+        parts.append(f"def function_{index}():\n" + "".join(f"    x = {line}\n" for line in range(body_lines)))
+    return "".join(parts)
+
+
+def test_small_files_are_one_chunk():
+    assert splitIntoChunks("a = 1\nb = 2\n", max_lines=10) == [(1, "a = 1\nb = 2\n")]
+
+
+def test_chunks_cover_the_file_and_respect_the_size_limit():
+    content = pythonFile(12, 9)
+    chunks = splitIntoChunks(content, max_lines=25)
+
+    assert "".join(text for _, text in chunks) == content
+    assert all(text.count("\n") <= 25 for _, text in chunks)
+    first_lines = [first_line for first_line, _ in chunks]
+    assert first_lines[0] == 1
+    for (first_line, text), next_first_line in zip(chunks, first_lines[1:]):
+        assert first_line + text.count("\n") == next_first_line
+
+
+def test_chunks_are_cut_in_front_of_definitions():
+    chunks = splitIntoChunks(pythonFile(12, 9), max_lines=25)
+    assert len(chunks) > 1
+    assert all(text.startswith("def function_") for _, text in chunks)
+
+
+def test_decorators_stay_with_their_definition():
+    content = ("x = 1\n" * 14) + "@decorator\ndef decorated():\n    pass\n" + ("y = 2\n" * 10)
+    chunks = splitIntoChunks(content, max_lines=20)
+    assert chunks[1][1].startswith("@decorator\ndef decorated():")
+
+
+def test_files_without_definitions_are_cut_at_the_limit():
+    content = "x = 1\n" * 45
+    assert [first_line for first_line, _ in splitIntoChunks(content, max_lines=20)] == [1, 21, 41]
+
+
+def test_merge_moves_line_numbers_to_file_lines():
+    merged = mergeChunkResults([
+        (1, {"summary": "parses input", "issues": [{"issue": "eval", "line": 3}]}),
+        (101, {"summary": "writes output", "issues": [{"issue": "exec", "line": 2, "endLine": 4}]}),
+    ])
+    assert merged == {
+        "summary": "parses input\nwrites output",
+        "issues": [{"issue": "eval", "line": 3}, {"issue": "exec", "line": 102, "endLine": 104}],
+    }
+
+
+def test_merge_concatenates_lists_and_drops_repeated_strings():
+    assert mergeChunkResults([(1, [{"line": 1}]), (11, [{"line": 1}])]) == [{"line": 1}, {"line": 11}]
+    assert mergeChunkResults([(1, {"summary": "same"}), (11, {"summary": "same"})]) == {"summary": "same"}
+
+
+def test_shift_leaves_other_numbers_alone():
+    assert shiftLineNumbers({"line": 5, "severity": 3, "flag": True, "lineNumber": True}, 10) == {
+        "line": 15, "severity": 3, "flag": True, "lineNumber": True
+    }
+
+
+def test_chunk_saast_report_keeps_chunk_findings_with_chunk_lines():
+    report = [{"issue": "a", "line_number": 5}, {"issue": "b", "line_number": 25}, {"issue": "c", "line_number": 45}]
+    text = "x = 1\n" * 20
+    assert chunkSaastReport(report, 21, text) == [{"issue": "b", "line_number": 5}]
+    assert chunkSaastReport(None, 21, text) is None
+
+
+def test_unique_related_files():
+    related = [{"relatedFilePath": "/r/a.py"}, {"relatedFilePath": "/r/b.py"}, {"relatedFilePath": "/r/a.py"}]
+    assert uniqueRelatedFiles(related) == [{"relatedFilePath": "/r/a.py"}, {"relatedFilePath": "/r/b.py"}]
+
+
+def test_unchanged_chunks_are_reused_after_an_edit(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(Utils, 'CHUNK_THRESHOLD_LINES', 30)
+    monkeypatch.setattr(Utils, 'CHUNK_MAX_LINES', 25)
+    monkeypatch.setattr(Utils, 'IMPORT_GRAPH_ENABLED', False)
+    llm.answers['analyze_compliance'] = lambda body: {"issues": [{"line": 1, "text": body['fileContent'].count("\n")}]}
+    file_path = tmp_path / 'big.py'
+    file_path.write_text(pythonFile(12, 9))
+
+    def scan():
+        llm.calls.clear()
+        snapshot = Utils.RepoSnapshot(str(tmp_path), [str(file_path)])
+        report = Utils.analyzeRepositoryForContextAndComplianceReport(str(tmp_path), {}, 'policy', snapshot=snapshot)
+        return report, llm.endpoints().count('analyze_compliance')
+
+    report, requests = scan()
+    chunks = splitIntoChunks(file_path.read_text(), max_lines=25)
+    assert requests == len(chunks) > 1
+    assert report[0]['chunks'] == len(chunks)
+    # Each chunk's finding is reported on the chunk's first line in the file
+    assert [issue['line'] for issue in report[0]['report']['issues']] == [first_line for first_line, _ in chunks]
+
+    # Editing the last function only re-sends its chunk
+    file_path.write_text(pythonFile(12, 9) + "    x = 'changed'\n")
+    _, requests = scan()
+    assert requests == 1
+
+
+def test_async_scan_runs_the_same_stages(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(Utils, 'CHUNK_THRESHOLD_LINES', 30)
+    monkeypatch.setattr(Utils, 'CHUNK_MAX_LINES', 25)
+    monkeypatch.setattr(Utils, 'IMPORT_GRAPH_ENABLED', False)
+    for endpoint in ('analyze_compliance', 'analyze_vulnerabilities'):
+        llm.answers[endpoint] = lambda body: {"issues": [{"line": 1}]}
+    (tmp_path / 'big.py').write_text(pythonFile(12, 9))
+    (tmp_path / 'small.py').write_text("print('small')\n")
+
+    def snapshot():
+        return Utils.RepoSnapshot(str(tmp_path), [str(tmp_path / 'big.py'), str(tmp_path / 'small.py')])
+
+    expected = Utils.analyzeRepositoryForContextAndCombinedReport(str(tmp_path), {}, 'policy', snapshot=snapshot())
+    llm.calls.clear()
+    Utils.analysis_cache.clear()
+    report = asyncio.run(AsyncUtils.analyzeRepositoryForContextAndCombinedReportAsync(str(tmp_path), {}, 'policy', snapshot=snapshot()))
+
+    # Both paths key their cache entries the same way, so the async scan sends nothing
+    assert llm.calls == []
+    assert report == expected
+    assert [entry['chunks'] for entry in report['security'] if 'chunks' in entry] == [len(splitIntoChunks(pythonFile(12, 9), max_lines=25))]
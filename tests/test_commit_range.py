@@ -0,0 +1,110 @@
+import asyncio
+import os
+
+import pytest
+
+import AsyncUtils
+import Utils
+from conftest import git
+
+
+def write(repo_path, relative_path, content):
+    file_path = os.path.join(repo_path, relative_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def utilModule(name):
+    return "".join(f"def {name}_{index}(value):\n    return value * {index}\n\n\n" for index in range(8))
+
+
+@pytest.fixture
+def history(gitRepo):
+    """
+    A repository whose last commit renames a/util.py to b/util.py, edits c/util.py
+    (same basename), deletes old.py, adds new.py and touches a vendored file.
+    """
+    repo_path = gitRepo()
+    write(repo_path, 'a/util.py', utilModule('moved'))
+    write(repo_path, 'c/util.py', utilModule('kept'))
+    write(repo_path, 'old.py', 'print("old")\n')
+    write(repo_path, 'node_modules/dep/index.js', 'module.exports = 1;\n')
+    git(repo_path, 'add', '-A')
+    git(repo_path, 'commit', '-qm', 'base')
+    base = git(repo_path, 'rev-parse', 'HEAD')
+
+    os.makedirs(os.path.join(repo_path, 'b'))
+    git(repo_path, 'mv', 'a/util.py', 'b/util.py')
+    write(repo_path, 'c/util.py', utilModule('kept') + 'CHANGED = True\n')
+    git(repo_path, 'rm', '-q', 'old.py')
+    write(repo_path, 'new.py', 'print("new")\n')
+    write(repo_path, 'node_modules/dep/index.js', 'module.exports = 2;\n')
+    git(repo_path, 'add', '-A')
+    git(repo_path, 'commit', '-qm', 'head')
+    return repo_path, base, git(repo_path, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def compliance(llm):
+    # The answer tells the renamed util.py from the edited one
+    llm.answers['analyze_compliance'] = lambda body: {'moved': 'def moved_0' in body['fileContent']}
+    return llm
+
+
+def test_changes_list_renames_deletions_and_additions(history):
+    repo_path, base, head = history
+    changes = {change['path']: change for change in Utils.getCommitRangeChanges(repo_path, base, head)}
+
+    # node_modules is skipped like it is in full scans
+    assert sorted(changes) == ['b/util.py', 'c/util.py', 'new.py', 'old.py']
+    assert changes['b/util.py']['status'] == 'renamed'
+    assert changes['b/util.py']['previousPath'] == 'a/util.py'
+    assert changes['c/util.py']['status'] == 'modified'
+    assert changes['c/util.py']['previousPath'] is None
+    assert changes['old.py']['status'] == 'deleted'
+    assert changes['old.py']['blob'] is None
+    assert changes['new.py']['status'] == 'added'
+
+
+def test_unresolvable_range(history):
+    repo_path, base, _ = history
+    assert Utils.getCommitRangeChanges(repo_path, base, 'no-such-commit') is None
+    assert Utils.analyzeCommitRange(repo_path, base, 'no-such-commit') is None
+
+
+def renames(report):
+    return sorted(
+        (entry['fileName'], entry['report']['moved'], entry.get('renamedFrom')) for entry in report
+    )
+
+
+EXPECTED_RENAMES = [('new.py', False, None), ('util.py', False, None), ('util.py', True, 'a/util.py')]
+
+
+def test_renamed_from_lands_on_the_renamed_file(history, compliance):
+    repo_path, base, head = history
+    result = Utils.analyzeCommitRange(repo_path, base, head, checks=('compliance',), userCompText='No secrets')
+
+    assert (result['base'], result['head']) == (base, head)
+    assert renames(result['report']) == EXPECTED_RENAMES
+
+
+def test_async_range_maps_renames_the_same_way(history, compliance):
+    repo_path, base, head = history
+    result = asyncio.run(AsyncUtils.analyzeCommitRangeAsync(repo_path, base, head, checks=('compliance',), userCompText='No secrets'))
+
+    assert renames(result['report']) == EXPECTED_RENAMES
+
+
+def test_range_leaves_the_working_tree_alone(history, compliance):
+    repo_path, base, head = history
+    git(repo_path, 'checkout', '-q', base)
+    write(repo_path, 'c/util.py', 'uncommitted\n')
+
+    result = Utils.analyzeCommitRange(repo_path, base, head, checks=('compliance',), userCompText='No secrets')
+
+    assert renames(result['report']) == EXPECTED_RENAMES
+    assert git(repo_path, 'rev-parse', 'HEAD') == base
+    assert open(os.path.join(repo_path, 'c/util.py')).read() == 'uncommitted\n'
+    assert not os.path.exists(os.path.join(repo_path, 'b'))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+import AsyncUtils
+import Utils
+from Utils import FileMapTransport, postContextRequest
+from conftest import Response
+
+REPO_ANALYSIS = {
+    '/repo/app.py': {'summary': 'Flask app ' + 'x' * 500, 'functions': ['index', 'login']},
+    '/repo/util.py': 'helpers',
+}
+
+
+@pytest.fixture
+def handles(llm):
+    """
+    A service that hands out handles h1, h2, ... and forgets a handle after answering it once.
+    """
+    registered = []
+    forgotten = set()
+
+    def register(body):
+        registered.append(body['fMap'])
+        return {'handle': f"h{len(registered)}"}
+
+    def context(body):
+        if 'fMap' in body:
+            return []
+        if body['fMapHandle'] in forgotten:
+            return Response({}, 404)
+        forgotten.add(body['fMapHandle'])
+        return [{'relatedFileName': 'util.py', 'relatedFilePath': '/repo/util.py'}]
+
+    llm.answers['register_fmap'] = register
+    llm.answers['analyze_context'] = context
+    return registered
+
+
+def contextBodies(llm):
+    return [body for endpoint, body in llm.calls if endpoint == 'analyze_context']
+
+
+def test_inline_bodies_carry_the_whole_fmap():
+    body = json.loads(FileMapTransport(REPO_ANALYSIS, mode='inline').body('a.py', 'print(1)'))
+    assert body == {'fileName': 'a.py', 'fileContent': 'print(1)', 'fMap': REPO_ANALYSIS}
+
+
+def test_digest_bodies_carry_short_summaries(monkeypatch):
+    monkeypatch.setattr(Utils, 'FMAP_DIGEST_SUMMARY_CHARS', 20)
+    inline = FileMapTransport(REPO_ANALYSIS, mode='inline')
+    digest = FileMapTransport(REPO_ANALYSIS, mode='digest')
+
+    body = json.loads(digest.body('a.py', 'print(1)'))
+    inline.body('a.py', 'print(1)')
+
+    assert body['fMap'] == {'/repo/app.py': ('Flask app ' + 'x' * 500)[:20], '/repo/util.py': 'helpers'}
+    assert digest.stats()['bytesSent'] < inline.stats()['bytesSent']
+
+
+def test_handle_is_registered_once_and_sent_instead_of_the_fmap(llm, handles):
+    transport = FileMapTransport(REPO_ANALYSIS, mode='handle')
+    for name in ('a.py', 'b.py'):
+        transport.body(name, 'print(1)')
+
+    assert handles == [REPO_ANALYSIS]
+    assert json.loads(transport.body('c.py', '')) == {'fileName': 'c.py', 'fileContent': '', 'fMapHandle': 'h1'}
+    assert transport.stats() == dict(transport.stats(), mode='handle', requests=3)
+
+
+def test_failed_registration_falls_back_to_inline(llm):
+    llm.answers['register_fmap'] = lambda body: {}
+    transport = FileMapTransport(REPO_ANALYSIS, mode='handle')
+    assert transport.mode == 'inline'
+    assert json.loads(transport.body('a.py', ''))['fMap'] == REPO_ANALYSIS
+
+
+def test_unknown_handle_is_registered_again(llm, handles):
+    transport = FileMapTransport(REPO_ANALYSIS, mode='handle')
+    assert postContextRequest(transport, 'a.py', '').status_code == 200
+
+    # The service forgot h1: the fMap is registered again and the request retried with h2
+    response = postContextRequest(transport, 'b.py', '')
+
+    assert response.json() == [{'relatedFileName': 'util.py', 'relatedFilePath': '/repo/util.py'}]
+    assert len(handles) == 2
+    assert [body['fMapHandle'] for body in contextBodies(llm)] == ['h1', 'h1', 'h2']
+
+
+def test_async_transport_registers_and_re_registers_the_same_way(llm, handles, monkeypatch):
+    monkeypatch.setattr(AsyncUtils, 'FMAP_TRANSPORT', 'handle')
+
+    async def scan():
+        transport = await AsyncUtils.createFileMapTransportAsync(REPO_ANALYSIS)
+        first = await AsyncUtils.postContextRequestAsync(transport, 'a.py', '')
+        second = await AsyncUtils.postContextRequestAsync(transport, 'b.py', '')
+        return transport, first, second
+
+    transport, first, second = asyncio.run(scan())
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert transport.mode == 'handle' and transport.handle == 'h2'
+    assert [body['fMapHandle'] for body in contextBodies(llm)] == ['h1', 'h1', 'h2']
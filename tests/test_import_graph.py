@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import Utils
+from ImportGraph import ImportGraph
+
+EXPECTED = {
+    'app/__init__.py': [],
+    'app/services.py': ['app/models.py'],
+    'app/views.py': ['app/models.py', 'app/services.py'],
+    'scripts/run.py': ['app/views.py', 'src/pkg/core.py'],
+    'web/index.js': ['lib/b.js', 'web/util.ts'],
+    'c/main.c': ['c/other/helper.cpp', 'c/util.c'],
+    'java/com/acme/App.java': ['java/com/acme/Helper.java', 'java/com/acme/db/Repo.java'],
+    'go/svc/main.go': ['go/store/store.go', 'go/svc/helper.go'],
+    'rb/app.rb': ['rb/lib/thing.rb'],
+    'php/index.php': ['php/inc/db.php', 'php/src/Models/User.php'],
+    'rs/src/main.rs': ['rs/src/net/client.rs', 'rs/src/net/mod.rs'],
+    'rs/src/net/mod.rs': ['rs/src/net/client.rs'],
+    'cs/Program.cs': ['cs/Store.cs', 'cs/Util.cs'],
+}
+# Local-looking imports that don't resolve, and Swift, which isn't indexed
+UNRESOLVED = ['scripts/bad.py', 'web/alias.js', 'java/com/acme/Broken.java', 'sw/a.swift']
+
+
+@pytest.fixture
+def graph(polyglotRepo):
+    snapshot = Utils.RepoSnapshot.build(polyglotRepo)
+    return ImportGraph.build(snapshot, snapshot.paths)
+
+
+def related(graph, repo_path, relative_path):
+    files = graph.related(os.path.join(repo_path, relative_path))
+    return None if files is None else sorted(os.path.relpath(file_path, repo_path) for file_path in files)
+
+
+@pytest.mark.parametrize('relative_path', sorted(EXPECTED))
+def test_imports_resolve_to_repository_files(graph, polyglotRepo, relative_path):
+    assert related(graph, polyglotRepo, relative_path) == EXPECTED[relative_path]
+
+
+@pytest.mark.parametrize('relative_path', UNRESOLVED)
+def test_unresolved_imports_fall_back_to_the_llm(graph, polyglotRepo, relative_path):
+    assert related(graph, polyglotRepo, relative_path) is None
+
+
+def test_related_files_are_shaped_like_context_results(graph, polyglotRepo):
+    related_files = graph.relatedFiles(os.path.join(polyglotRepo, 'app/views.py'))
+    assert sorted(related_file['relatedFileName'] for related_file in related_files) == ['models.py', 'services.py']
+    assert all(os.path.isabs(related_file['relatedFilePath']) for related_file in related_files)
+
+
+@pytest.mark.parametrize('enabled, context_calls', [(True, len(UNRESOLVED)), (False, 33)])
+def test_context_calls_only_for_unresolved_files(polyglotRepo, llm, monkeypatch, enabled, context_calls):
+    monkeypatch.setattr(Utils, 'IMPORT_GRAPH_ENABLED', enabled)
+    snapshot = Utils.RepoSnapshot.build(polyglotRepo)
+    repo_analysis = {file_path: {'summary': 'summary'} for file_path in snapshot.paths}
+
+    report = Utils.analyzeRepositoryForContextAndComplianceReport(polyglotRepo, repo_analysis, 'No hard-coded secrets', snapshot=snapshot)
+
+    assert len(snapshot.paths) == 33
+    assert len(report) == 33
+    assert llm.endpoints().count('analyze_context') == context_calls
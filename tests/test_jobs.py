@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from Jobs import JobManager, LocalJobStore, QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED, FINISHED_STATUSES
+from Utils import scanCancelled
+
+
+def waitFor(manager, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.status(job_id)
+        if status['status'] in statuses:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {manager.status(job_id)['status']}")
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def manager(events):
+    return JobManager(LocalJobStore(), emit=lambda event, payload, job_id: events.append((event, job_id, payload)), max_workers=1)
+
+
+def test_submitted_job_completes_with_its_report(manager, events):
+    received = []
+
+    def runner(params, progress, update):
+        received.append(params)
+        update('working')
+        return [{'fileName': 'a.py', 'report': {}}]
+
+    manager.register('check', runner)
+    job_id = manager.submit('check', {'clone_location': '/tmp/repo', 'username': 'user', 'token': 'secret'})
+    status = waitFor(manager, job_id, FINISHED_STATUSES)
+
+    assert status['status'] == COMPLETED
+    assert status['summary']['reported'] == 1
+    assert 'report' not in status and 'params' not in status
+    assert manager.status(job_id, include_report=True)['report'] == [{'fileName': 'a.py', 'report': {}}]
+    # The runner gets the credentials, the store never does
+    assert received == [{'clone_location': '/tmp/repo', 'username': 'user', 'token': 'secret'}]
+    assert manager.store.load(job_id)['params'] == {'clone_location': '/tmp/repo'}
+    assert [event for event, _, _ in events if event != 'progress'][-1] == 'processComplete'
+    assert ('processUpdate', job_id, {'jobId': job_id, 'message': 'working'}) in events
+
+
+def test_unknown_jobs_and_types(manager):
+    assert manager.status('missing') is None
+    assert manager.cancel('missing') is False
+    with pytest.raises(ValueError):
+        manager.submit('nope', {})
+
+
+def test_failing_runner_marks_the_job_failed(manager):
+    def runner(params, progress, update):
+        raise RuntimeError('boom')
+
+    manager.register('check', runner)
+    status = waitFor(manager, manager.submit('check', {}), FINISHED_STATUSES)
+    assert status['status'] == FAILED
+    assert status['error'] == 'boom'
+
+
+def test_cancel_running_job(manager):
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def runner(params, progress, update):
+        started.set()
+        while not scanCancelled():
+            time.sleep(0.01)
+        stopped.set()
+        return None
+
+    manager.register('check', runner)
+    job_id = manager.submit('check', {})
+    assert started.wait(5)
+    assert manager.status(job_id)['status'] == RUNNING
+    assert manager.activeJobs() == {'check': 1}
+
+    assert manager.cancel(job_id) is True
+    assert stopped.wait(5)
+    status = waitFor(manager, job_id, FINISHED_STATUSES)
+    assert status['status'] == CANCELLED
+    assert status['cancelRequested'] is True
+    assert manager.cancel(job_id) is False
+
+
+def test_cancelled_queued_job_never_starts(manager):
+    release = threading.Event()
+    ran = []
+
+    def runner(params, progress, update):
+        ran.append(params['n'])
+        release.wait(5)
+        return None
+
+    manager.register('check', runner)
+    first = manager.submit('check', {'n': 1})
+    second = manager.submit('check', {'n': 2})
+    waitFor(manager, first, {RUNNING})
+    assert manager.status(second)['status'] == QUEUED
+
+    assert manager.cancel(second) is True
+    assert manager.status(second)['status'] == CANCELLED
+    release.set()
+    waitFor(manager, first, FINISHED_STATUSES)
+    time.sleep(0.1)
+    assert ran == [1]
+    assert manager.status(second)['status'] == CANCELLED
+
+
+def test_cancel_owned_by(manager):
+    release = threading.Event()
+    manager.register('check', lambda params, progress, update: release.wait(5) and None)
+    jobs = [manager.submit('check', {}, owner='client') for _ in range(2)]
+    manager.cancelOwnedBy('client')
+    release.set()
+    for job_id in jobs:
+        assert waitFor(manager, job_id, FINISHED_STATUSES)['status'] == CANCELLED
@@ -0,0 +1,172 @@
+import pytest
+import requests
+
+import Utils
+from Utils import CircuitBreaker, LLMClient, LLMServiceUnavailable, scanDeadline
+from conftest import Response
+
+
+@pytest.fixture(autouse=True)
+def noBackoff(monkeypatch):
+    monkeypatch.setattr(Utils, 'retryDelay', lambda attempt: 0)
+
+
+def openBreaker(threshold=2, reset_seconds=0):
+    breaker = CircuitBreaker(threshold=threshold, reset_seconds=reset_seconds)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.failed()
+    return breaker
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.failed()
+    assert breaker.state() == 'closed' and breaker.allow()
+    breaker.failed()
+    assert breaker.state() == 'open'
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, reset_seconds=60)
+    breaker.failed()
+    breaker.succeeded()
+    breaker.failed()
+    assert breaker.state() == 'closed'
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = openBreaker()
+    assert breaker.state() == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+@pytest.mark.parametrize('outcome, state', [('succeeded', 'closed'), ('failed', 'half-open')])
+def test_trial_outcome_closes_or_reopens(outcome, state):
+    breaker = openBreaker()
+    trial = breaker.allow()
+    getattr(breaker, outcome)()
+    breaker.abandoned(trial)
+    assert breaker.state() == state
+    assert breaker.allow()
+
+
+def test_abandoned_trial_lets_the_next_call_be_the_trial():
+    breaker = openBreaker()
+    trial = breaker.allow()
+    breaker.abandoned(trial)
+    assert breaker.state() == 'half-open'
+    assert breaker.allow()
+
+
+def test_abandoning_a_stale_permit_keeps_the_current_trial():
+    breaker = openBreaker()
+    stale = breaker.allow()
+    breaker.failed()
+    current = breaker.allow()
+    breaker.abandoned(stale)
+    assert current and not breaker.allow()
+
+
+class FakeSession:
+    """
+    Answers session.post with the given responses and exceptions, in order.
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def client(*outcomes, threshold=5, reset_seconds=60):
+    llm_client = LLMClient(base_url='http://llm', max_in_flight=2)
+    llm_client.session = FakeSession(*outcomes)
+    llm_client.breaker = CircuitBreaker(threshold=threshold, reset_seconds=reset_seconds)
+    return llm_client
+
+
+def test_idempotent_requests_are_retried(monkeypatch):
+    monkeypatch.setattr(Utils, 'LLM_MAX_RETRIES', 3)
+    llm_client = client(requests.ConnectionError('down'), Response({}, 503), Response({'ok': True}))
+
+    response = llm_client.post('analyze_context', json={'fileName': 'a.py'})
+
+    assert response.json() == {'ok': True}
+    assert llm_client.session.calls == 3
+    assert llm_client.breaker.state() == 'closed'
+    assert llm_client.stats()['endpoints']['analyze_context']['retries'] == 2
+
+
+def test_retries_give_up_with_the_last_error(monkeypatch):
+    monkeypatch.setattr(Utils, 'LLM_MAX_RETRIES', 1)
+    llm_client = client(Response({}, 503), Response({}, 503))
+    assert llm_client.post('analyze_context', json={}).status_code == 503
+
+    llm_client = client(requests.Timeout('slow'), requests.Timeout('slow'))
+    with pytest.raises(requests.Timeout):
+        llm_client.post('analyze_context', json={})
+    assert llm_client.session.calls == 2
+
+
+def test_handle_registration_is_not_retried():
+    llm_client = client(requests.ConnectionError('down'), Response({}))
+    with pytest.raises(requests.ConnectionError):
+        llm_client.post('register_fmap', json={})
+    assert llm_client.session.calls == 1
+
+
+def test_client_errors_are_returned_without_retrying():
+    llm_client = client(Response({}, 404))
+    assert llm_client.post('analyze_context', json={}).status_code == 404
+    assert llm_client.session.calls == 1
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    monkeypatch.setattr(Utils, 'LLM_MAX_RETRIES', 0)
+    llm_client = client(*[requests.ConnectionError('down')] * 2, threshold=2)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            llm_client.post('analyze_context', json={})
+
+    with pytest.raises(LLMServiceUnavailable):
+        llm_client.post('analyze_context', json={})
+    assert llm_client.session.calls == 2
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.ChunkedEncodingError('cut'), ValueError('bad body')])
+def test_trial_ending_in_an_unexpected_error_releases_the_breaker(monkeypatch, error):
+    monkeypatch.setattr(Utils, 'LLM_MAX_RETRIES', 0)
+    llm_client = client(requests.ConnectionError('down'), requests.ConnectionError('down'), error, Response({}), threshold=2, reset_seconds=0)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            llm_client.post('analyze_context', json={})
+
+    with pytest.raises(type(error)):
+        llm_client.post('analyze_context', json={})
+    assert llm_client.breaker.state() == 'half-open'
+    assert llm_client.post('analyze_context', json={}).status_code == 200
+    assert llm_client.breaker.state() == 'closed'
+
+
+def test_trial_cut_short_by_the_deadline_releases_the_breaker(monkeypatch):
+    monkeypatch.setattr(Utils, 'LLM_MAX_RETRIES', 0)
+    llm_client = client(requests.ConnectionError('down'), requests.ConnectionError('down'), threshold=2, reset_seconds=0)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            llm_client.post('analyze_context', json={})
+
+    with scanDeadline(0.000001), pytest.raises(requests.Timeout):
+        llm_client.post('analyze_context', json={})
+    assert llm_client.session.calls == 2
+    assert llm_client.breaker.state() == 'half-open'
+    assert llm_client.breaker.allow()
@@ -0,0 +1,71 @@
+import pytest
+
+import Metrics
+import Utils
+from Metrics import MetricsRegistry, CONTENT_TYPE
+
+
+def test_counters_and_histograms_render_in_the_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests, by endpoint', ('endpoint',))
+    seconds = registry.histogram('request_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1))
+    requests.inc('analyze_context')
+    requests.inc('analyze_context', amount=2)
+    requests.inc('say "hi"\n')
+    for value in (0.05, 0.5, 5):
+        seconds.observe(value, 'analyze_context')
+
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests, by endpoint',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="analyze_context"} 3',
+        'requests_total{endpoint="say \\"hi\\"\\n"} 1',
+        '# HELP request_seconds Latency',
+        '# TYPE request_seconds histogram',
+        'request_seconds_bucket{endpoint="analyze_context",le="0.1"} 1',
+        'request_seconds_bucket{endpoint="analyze_context",le="1"} 2',
+        'request_seconds_bucket{endpoint="analyze_context",le="+Inf"} 3',
+        'request_seconds_sum{endpoint="analyze_context"} 5.55',
+        'request_seconds_count{endpoint="analyze_context"} 3',
+    ]
+
+
+def test_collectors_are_read_at_render_time_and_replaced_by_name():
+    registry = MetricsRegistry()
+    jobs = {'setup': 1}
+    registry.collector('jobs', lambda: [('active_jobs', 'gauge', 'Running jobs', {(('type', 'setup'),): jobs['setup']})])
+    jobs['setup'] = 2
+    assert 'active_jobs{type="setup"} 2' in registry.render().splitlines()
+
+    registry.collector('jobs', lambda: [('active_jobs', 'gauge', 'Running jobs', {})])
+    assert registry.render().splitlines() == ['# HELP active_jobs Running jobs', '# TYPE active_jobs gauge']
+
+
+def test_nothing_is_recorded_when_metrics_are_disabled(monkeypatch):
+    monkeypatch.setattr(Metrics, 'METRICS_ENABLED', False)
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests').inc()
+    registry.histogram('request_seconds', 'Latency').observe(1)
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests', '# TYPE requests_total counter',
+        '# HELP request_seconds Latency', '# TYPE request_seconds histogram',
+    ]
+
+
+def test_metrics_endpoint_reports_scan_stages_and_cache_lookups(tmp_path, llm):
+    pytest.importorskip('flask_socketio')
+    import main
+
+    (tmp_path / 'app.py').write_text("print('app')\n")
+    snapshot = Utils.RepoSnapshot(str(tmp_path), [str(tmp_path / 'app.py')])
+    Utils.analyzeRepositoryForContextAndComplianceReport(str(tmp_path), {}, 'No secrets', snapshot=snapshot)
+
+    response = main.app.test_client().get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+    assert any(line.startswith('scanner_stage_seconds_count{stage="pipeline_compliance"} ') for line in lines)
+    assert any(line.startswith('scanner_cache_lookups_total{family="compliance",result="miss"} ') for line in lines)
+    assert any(line.startswith('scanner_cache_hit_ratio{family="compliance"} ') for line in lines)
+    assert '# TYPE scanner_active_jobs gauge' in lines
@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from Pipeline import Pipeline, Stage
+
+
+def test_results_keep_the_order_of_the_items():
+    def slowForSmallNumbers(number):
+        time.sleep(0.001 * (10 - number))
+        return number
+
+    pipeline = Pipeline([Stage('wait', slowForSmallNumbers, concurrency=4), Stage('double', lambda number: number * 2, concurrency=2)])
+    assert pipeline.run(range(10)) == [number * 2 for number in range(10)]
+
+
+def test_empty_input():
+    assert Pipeline([Stage('noop', lambda item: item)]).run([]) == []
+
+
+def test_dropped_items_skip_the_later_stages():
+    seen = []
+    pipeline = Pipeline([
+        Stage('odd', lambda number: number if number % 2 else None),
+        Stage('record', lambda number: seen.append(number) or number),
+    ])
+    assert pipeline.run(range(6)) == [None, 1, None, 3, None, 5]
+    assert sorted(seen) == [1, 3, 5]
+    assert pipeline.stats()['odd'] == dict(pipeline.stats()['odd'], processed=6, dropped=3)
+    assert pipeline.stats()['record']['processed'] == 3
+
+
+def test_on_done_sees_every_item_once():
+    done = []
+    Pipeline([Stage('odd', lambda number: number if number % 2 else None)]).run(range(4), on_done=lambda item, result: done.append((item, result)))
+    assert sorted(done) == [(0, None), (1, 1), (2, None), (3, 3)]
+
+
+def test_batches_hold_at_most_batch_size_items():
+    sizes = []
+    release = threading.Event()
+
+    def first(number):
+        # Lets items pile up in front of the batched stage
+        release.wait(5)
+        return number
+
+    def batched(numbers):
+        sizes.append(len(numbers))
+        return [number + 1 for number in numbers]
+
+    pipeline = Pipeline([Stage('first', first, concurrency=8), Stage('batched', batched, batch_size=3)])
+    threading.Timer(0.05, release.set).start()
+    assert pipeline.run(range(10)) == list(range(1, 11))
+    assert sum(sizes) == 10 and max(sizes) <= 3
+
+
+def test_worker_exceptions_drop_the_item_or_batch():
+    def failOnThree(number):
+        if number == 3:
+            raise ValueError('boom')
+        return number
+
+    assert Pipeline([Stage('fail', failOnThree, concurrency=2)]).run(range(5)) == [0, 1, 2, None, 4]
+
+    def failingBatch(numbers):
+        raise ValueError('boom')
+
+    pipeline = Pipeline([Stage('fail', failingBatch, batch_size=4)])
+    assert pipeline.run(range(5)) == [None] * 5
+    assert pipeline.stats()['fail']['dropped'] == 5
+
+
+def test_short_batch_outputs_drop_the_missing_items():
+    # Used to leave run() waiting forever for the items without an output
+    pipeline = Pipeline([Stage('short', lambda numbers: numbers[:-1], batch_size=10), Stage('next', lambda number: number)])
+    results = pipeline.run(range(5))
+    assert len(results) == 5
+    assert results.count(None) >= 1
+    assert all(result in (None, number) for number, result in enumerate(results))
+
+
+def test_workers_run_in_the_callers_context():
+    variable = contextvars.ContextVar('variable', default=None)
+    variable.set('job-1')
+    assert Pipeline([Stage('read', lambda item: variable.get(), concurrency=3)]).run(range(3)) == ['job-1'] * 3
+
+
+def test_run_async_mixes_coroutine_and_thread_workers():
+    async def slowForSmallNumbers(number):
+        await asyncio.sleep(0.001 * (10 - number))
+        return number
+
+    threads = set()
+
+    def double(number):
+        threads.add(threading.current_thread().name)
+        return number * 2
+
+    pipeline = Pipeline([Stage('wait', slowForSmallNumbers, concurrency=4), Stage('double', double, concurrency=2)])
+    assert asyncio.run(pipeline.runAsync(range(10))) == [number * 2 for number in range(10)]
+    # Plain workers are kept off the event loop
+    assert threading.current_thread().name not in threads
+    assert pipeline.stats()['double']['processed'] == 10
+
+
+def test_run_async_batches_drops_and_failures():
+    async def batched(numbers):
+        return [number if number % 3 else None for number in numbers]
+
+    def failOnFour(number):
+        if number == 4:
+            raise ValueError('boom')
+        return number
+
+    done = []
+    pipeline = Pipeline([Stage('batched', batched, batch_size=4), Stage('fail', failOnFour)])
+    results = asyncio.run(pipeline.runAsync(range(6), on_done=lambda item, result: done.append(item)))
+    assert results == [None, 1, 2, None, None, 5]
+    assert sorted(done) == list(range(6))
+    assert pipeline.stats()['batched']['dropped'] == 2
+
+
+def test_run_async_short_batch_outputs_drop_the_missing_items():
+    async def short(numbers):
+        return numbers[:-1]
+
+    results = asyncio.run(Pipeline([Stage('short', short, batch_size=10)]).runAsync(range(5)))
+    assert len(results) == 5 and results.count(None) >= 1
+
+
+def test_run_async_workers_see_the_callers_context():
+    variable = contextvars.ContextVar('variable', default=None)
+
+    async def scan():
+        variable.set('job-1')
+
+        async def coroutine(item):
+            return variable.get()
+
+        pipeline = Pipeline([Stage('loop', coroutine, concurrency=2), Stage('thread', lambda value: value + '!')])
+        return await pipeline.runAsync(range(3))
+
+    assert asyncio.run(scan()) == ['job-1!'] * 3
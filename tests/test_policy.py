@@ -0,0 +1,57 @@
+import Utils
+from Utils import normalizePolicy, preparePolicy, string_to_sha256
+
+POLICY = """Security rules
+1. Never log passwords.
+2. Use   parameterized SQL queries.
+- All endpoints require authentication.
+"""
+
+REFORMATTED = """
+  * use parameterized SQL queries.
+(a) All endpoints require authentication.
+
+Security rules
+• Never log passwords.
+- Never log passwords.
+"""
+
+
+def test_formatting_order_and_case_do_not_change_the_hash():
+    assert normalizePolicy(POLICY) == [
+        "All endpoints require authentication.", "Never log passwords.", "Security rules", "Use parameterized SQL queries."
+    ]
+    assert preparePolicy(POLICY)["hash"] == preparePolicy(REFORMATTED)["hash"]
+    assert preparePolicy(POLICY)["hash"] != preparePolicy(POLICY + "3. Rotate keys yearly.\n")["hash"]
+
+
+def test_the_policy_is_sent_as_written(tmp_path, llm):
+    (tmp_path / 'app.py').write_text("print('app')\n")
+
+    def scan(policy):
+        llm.calls.clear()
+        snapshot = Utils.RepoSnapshot(str(tmp_path), [str(tmp_path / 'app.py')])
+        report = Utils.analyzeRepositoryForContextAndComplianceReport(str(tmp_path), {}, policy, snapshot=snapshot)
+        return report, [body['userDefinedPolicies'] for endpoint, body in llm.calls if endpoint == 'analyze_compliance']
+
+    report, sent = scan(POLICY)
+    assert sent == [POLICY]
+
+    # The reformatted policy is the same policy, so its result comes from the cache
+    cached, sent = scan(REFORMATTED)
+    assert sent == []
+    assert cached == report
+
+
+def test_prepared_policies_are_shared_through_redis(monkeypatch):
+    text = "1. Shared between containers.\n"
+    prepared = preparePolicy(text)
+    # A fresh process: nothing prepared in memory, nothing in the local cache tier
+    monkeypatch.setattr(Utils, '_prepared_policies', {})
+    Utils.analysis_cache.clear()
+    monkeypatch.setattr(Utils, 'normalizePolicy', lambda text: ["not called"])
+    redis_hits = Utils.analysis_cache.stats()['policy']['redisHits']
+
+    assert preparePolicy(text) == prepared
+    assert Utils.analysis_cache.stats()['policy']['redisHits'] == redis_hits + 1
+    assert Utils.redis_client.get(Utils.analysis_cache.key('policy', string_to_sha256(text))) is not None
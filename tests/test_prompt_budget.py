@@ -0,0 +1,90 @@
+import pytest
+
+import Utils
+from Utils import PromptBuilder, RepoSnapshot, estimateTokens, excerptAroundSymbols
+
+MAIN = "from helpers import parse_config, load_user\nfrom mail import send_mail\n\nsend_mail(load_user(parse_config()))\n"
+
+
+def filler(start, count):
+    return "".join(f"filler_{index} = {index}\n" for index in range(start, start + count))
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(Utils, 'PROMPT_EXCERPT_CONTEXT_LINES', 2)
+    monkeypatch.setattr(Utils, 'PROMPT_MIN_EXCERPT_TOKENS', 50)
+    files = {
+        'helpers.py': filler(0, 200) + "def parse_config():\n    return {}\n" + filler(200, 100) + "def load_user(config):\n    return config\n" + filler(300, 100),
+        'mail.py': "def send_mail(user):\n    pass\n",
+        'unrelated.py': filler(0, 10),
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+    paths = [str(tmp_path / name) for name in files]
+    related = [{"relatedFileName": name, "relatedFilePath": str(tmp_path / name)} for name in ('unrelated.py', 'mail.py', 'helpers.py')]
+    return RepoSnapshot(str(tmp_path), paths), str(tmp_path / 'main.py'), related
+
+
+def decisions(metadata):
+    return [(decision["relatedFilePath"].rsplit('/', 1)[1], decision["decision"]) for decision in metadata["relatedFiles"]]
+
+
+def test_without_a_budget_every_file_is_included_in_order(repo):
+    snapshot, main, related = repo
+    prompt, metadata = PromptBuilder(snapshot, token_budget=0).buildWithBudget(main, MAIN, related)
+
+    assert decisions(metadata) == [('unrelated.py', 'included'), ('mail.py', 'included'), ('helpers.py', 'included')]
+    assert prompt.index('unrelated.py') < prompt.index('mail.py') < prompt.index('helpers.py')
+    assert metadata["estimatedTokens"] == pytest.approx(estimateTokens(prompt), rel=0.05)
+
+
+def test_most_referenced_files_are_packed_first_and_large_ones_truncated(repo):
+    snapshot, main, related = repo
+    budget = 600
+    prompt, metadata = PromptBuilder(snapshot, token_budget=budget).buildWithBudget(main, MAIN, related)
+
+    # helpers.py defines two of the referenced symbols, mail.py one and unrelated.py none
+    assert decisions(metadata) == [('helpers.py', 'truncated'), ('mail.py', 'included'), ('unrelated.py', 'included')]
+    helpers = metadata["relatedFiles"][0]
+    assert helpers["referencedSymbols"] == ['load_user', 'parse_config']
+    assert helpers["includedTokens"] < helpers["tokens"]
+    assert metadata["estimatedTokens"] <= budget
+    # The excerpt keeps the referenced definitions and marks what was left out
+    assert "def parse_config():" in prompt and "def load_user(config):" in prompt
+    assert "... (lines 1-198 omitted) ..." in prompt
+    assert "filler_100 =" not in prompt
+
+
+def test_files_are_dropped_once_too_little_budget_is_left(repo):
+    snapshot, main, related = repo
+    builder = PromptBuilder(snapshot, token_budget=estimateTokens(MAIN) + 80)
+    prompt, metadata = builder.buildWithBudget(main, MAIN, related)
+
+    assert [decision for _, decision in decisions(metadata)] == ['dropped', 'included', 'dropped']
+    assert "def parse_config():" not in prompt
+    assert builder.stats() == dict(builder.stats(), prompts=1, relatedFilesTruncated=0, relatedFilesDropped=2)
+
+
+def test_budget_matches_the_built_prompt_without_assembling_it(repo):
+    snapshot, main, related = repo
+    builder = PromptBuilder(snapshot, token_budget=600)
+
+    metadata = builder.budget(main, MAIN, related, saast_report=[{"issue": "eval", "line_number": 4}])
+
+    assert builder.stats()['prompts'] == 0
+    assert metadata == builder.buildWithBudget(main, MAIN, related, saast_report=[{"issue": "eval", "line_number": 4}])[1]
+    assert builder.metadata(main) == metadata
+
+
+def test_excerpt_merges_windows_and_keeps_the_head_without_hits(monkeypatch):
+    monkeypatch.setattr(Utils, 'PROMPT_EXCERPT_CONTEXT_LINES', 1)
+    content = "\n".join(f"line {index}" for index in range(1, 11)) + "\nneedle\nline 12\nneedle\n" + "\n".join(f"tail {index}" for index in range(14, 21))
+
+    assert excerptAroundSymbols(content, {'needle'}, 1000).splitlines() == [
+        "... (lines 1-9 omitted) ...", "line 10", "needle", "line 12", "needle", "tail 14", "... (lines 15-20 omitted) ..."
+    ]
+    assert excerptAroundSymbols(content, {'missing'}, 1000).splitlines()[:2] == ["line 1", "line 2"]
+    assert excerptAroundSymbols(content, {'needle'}, 3).splitlines() == [
+        "... (lines 1-9 omitted) ...", "line 10", "... (truncated to fit the prompt budget) ..."
+    ]
@@ -0,0 +1,120 @@
+import os
+import shutil
+
+import pytest
+
+import Utils
+from Utils import RepoSnapshot, generateSaastReports
+
+
+def banditResult(filename, line_number, test_id='B307', severity='MEDIUM', cwe=78):
+    return {
+        "filename": filename, "line_number": line_number, "col_offset": 4,
+        "test_id": test_id, "test_name": "eval", "issue_text": "Use of possibly insecure function.",
+        "issue_severity": severity, "issue_confidence": "HIGH",
+        "issue_cwe": {"id": cwe, "link": f"https://cwe.mitre.org/data/definitions/{cwe}.html"} if cwe else {},
+        "more_info": "https://bandit.readthedocs.io/",
+    }
+
+
+@pytest.fixture
+def fakeBandit(monkeypatch):
+    """
+    Replaces the Bandit processes: records each shard and reports an eval() on line 2 of every file.
+    """
+    shards = []
+
+    def run(file_paths):
+        shards.append(list(file_paths))
+        return {"results": [banditResult(file_path, 2) for file_path in file_paths if not file_path.endswith('clean.py')]}
+
+    monkeypatch.setattr(Utils, '_runBanditShard', run)
+    monkeypatch.setattr(Utils, 'banditVersion', lambda: '1.0-test')
+    return shards
+
+
+def writeFiles(directory, names):
+    paths = []
+    for name in names:
+        path = directory / name
+        path.write_text(f"import os\nvalue = eval(os.environ['{name}'])\n")
+        paths.append(str(path))
+    return paths
+
+
+def test_one_bandit_process_per_shard(tmp_path, fakeBandit, monkeypatch):
+    monkeypatch.setattr(Utils, 'BANDIT_BATCH_SIZE', 2)
+    paths = writeFiles(tmp_path, ['a.py', 'b.py', 'c.py', 'clean.py', 'notes.txt'])
+
+    reports = generateSaastReports(paths + [str(tmp_path / 'missing.py')], RepoSnapshot(str(tmp_path), paths))
+
+    assert sorted(len(shard) for shard in fakeBandit) == [2, 2]
+    assert sorted(reports) == sorted(path for path in paths if path.endswith('.py'))
+    assert reports[str(tmp_path / 'clean.py')] == []
+
+
+def test_findings_are_parsed_like_single_file_reports(tmp_path, fakeBandit):
+    [path] = writeFiles(tmp_path, ['a.py'])
+
+    [issue] = generateSaastReports([path])[path]
+
+    assert issue == {
+        "issue": "[B307:eval] Use of possibly insecure function.",
+        "severity": "Medium",
+        "confidence": "High",
+        "cwe": "CWE-78",
+        "cwe_url": "https://cwe.mitre.org/data/definitions/78.html",
+        "more_info": "https://bandit.readthedocs.io/",
+        "location": f"{path}:2:4",
+        "line_number": 2,
+        "code_snippet": "import os\nvalue = eval(os.environ['a.py'])",
+    }
+
+
+def test_failed_shards_are_left_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(Utils, 'BANDIT_BATCH_SIZE', 1)
+    monkeypatch.setattr(Utils, 'banditVersion', lambda: '1.0-test')
+    paths = writeFiles(tmp_path, ['a.py', 'b.py'])
+
+    def run(file_paths):
+        if file_paths[0].endswith('b.py'):
+            raise ValueError('not json')
+        return {"results": []}
+
+    monkeypatch.setattr(Utils, '_runBanditShard', run)
+    assert generateSaastReports(paths) == {paths[0]: []}
+    # Nothing is cached for the file Bandit could not scan
+    assert Utils.analysis_cache.get_many('sast', [RepoSnapshot(str(tmp_path), paths).load(paths[1])[1]], version='1.0-test') == {}
+
+
+def test_findings_are_cached_by_bandit_version_and_content(tmp_path, fakeBandit, monkeypatch):
+    clone = tmp_path / 'clone'
+    clone.mkdir()
+    [path] = writeFiles(clone, ['a.py'])
+    content_hash = RepoSnapshot(str(clone), [path]).load(path)[1]
+    first = generateSaastReports([path])
+    assert Utils.redis_client.get(f'sast:1.0-test:{content_hash}') is not None
+
+    # Another clone of the same content is not scanned again, and its findings point at its own path
+    other = tmp_path / 'other'
+    shutil.copytree(clone, other)
+    Utils.analysis_cache.clear()
+    other_path = str(other / 'a.py')
+    reports = generateSaastReports([other_path])
+    assert len(fakeBandit) == 1
+    assert reports[other_path] == [dict(first[path][0], location=f"{other_path}:2:4")]
+
+    # A new Bandit version rescans
+    monkeypatch.setattr(Utils, 'banditVersion', lambda: '2.0-test')
+    generateSaastReports([other_path])
+    assert len(fakeBandit) == 2
+
+
+@pytest.mark.skipif(shutil.which('bandit') is None, reason="Bandit is not installed")
+def test_real_bandit_output_is_parsed(tmp_path):
+    path = tmp_path / 'shell.py'
+    path.write_text("import subprocess\n\n\ndef run(command):\n    subprocess.call(command, shell=True)\n")
+    reports = generateSaastReports([str(path)])
+    issues = reports[str(path)]
+    assert any(issue["issue"].startswith("[B602:") and issue["line_number"] == 5 for issue in issues)
+    assert all(issue["location"].startswith(f"{os.path.normpath(path)}:") for issue in issues)
@@ -0,0 +1,73 @@
+import time
+
+import Utils
+from Utils import RepoSnapshot, ScanProgress, scanDeadline, scheduleFiles
+from conftest import git
+
+PLAIN = "def add(left, right):\n    return left + right\n"
+RISKY = "import os\n\n\ndef run(command):\n    os.system(command)\n    return eval(command)\n"
+
+
+def writeFiles(directory, files):
+    for name, content in files.items():
+        (directory / name).write_text(content)
+    return [str(directory / name) for name in files]
+
+
+def schedule(directory, paths):
+    return [path.rsplit('/', 1)[1] for path in scheduleFiles(str(directory), paths, RepoSnapshot(str(directory), paths))]
+
+
+def test_risky_calls_and_entry_points_go_first(tmp_path):
+    paths = writeFiles(tmp_path, {
+        'plain.py': PLAIN,
+        'other.py': PLAIN.replace('add', 'sub'),
+        'main.py': PLAIN,
+        'risky.py': RISKY,
+    })
+    assert schedule(tmp_path, paths) == ['risky.py', 'main.py', 'plain.py', 'other.py']
+
+
+def test_cached_bandit_findings_replace_the_risk_hints(tmp_path, monkeypatch):
+    monkeypatch.setattr(Utils, 'banditVersion', lambda: '1.0-test')
+    paths = writeFiles(tmp_path, {'hints.py': RISKY, 'findings.py': PLAIN})
+    content_hash = RepoSnapshot(str(tmp_path), paths).load(paths[1])[1]
+    Utils.analysis_cache.set('sast', content_hash, [{"severity": "High"}] * 3, version='1.0-test')
+
+    assert schedule(tmp_path, paths) == ['findings.py', 'hints.py']
+
+
+def test_recent_churn_raises_a_file(gitRepo, tmp_path):
+    repo_path = gitRepo()
+    directory = tmp_path / 'repo'
+    # Near-identical files: without churn they would keep their order
+    paths = writeFiles(directory, {'stable.py': PLAIN, 'busy.py': PLAIN})
+    git(repo_path, 'add', '-A')
+    git(repo_path, 'commit', '-qm', 'base')
+    for index in range(5):
+        (directory / 'busy.py').write_text(PLAIN.replace('right', f'right_{index}'))
+        git(repo_path, 'commit', '-qam', f'change {index}')
+
+    assert schedule(directory, paths) == ['busy.py', 'stable.py']
+
+
+def test_files_left_at_the_deadline_are_reported_pending(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(Utils, 'IMPORT_GRAPH_ENABLED', False)
+    paths = writeFiles(tmp_path, {'plain.py': PLAIN, 'other.py': PLAIN.replace('add', 'sub'), 'risky.py': RISKY})
+
+    def slowAnswer(body):
+        time.sleep(0.5)
+        return {"issues": []}
+
+    llm.answers['analyze_compliance'] = slowAnswer
+    progress = ScanProgress()
+    with scanDeadline(0.3):
+        report = Utils.analyzeRepositoryForContextAndComplianceReport(
+            str(tmp_path), {}, 'No secrets', snapshot=RepoSnapshot(str(tmp_path), paths), progress=progress, max_workers=1
+        )
+
+    # The riskiest file was sent first; the time budget ran out while it was analyzed
+    assert [entry['fileName'] for entry in report] == ['risky.py']
+    assert sorted(progress.pendingFiles()) == sorted(paths[:2])
+    assert progress.snapshot() == dict(progress.snapshot(), done=3, succeeded=1, pending=2)
+    assert llm.endpoints().count('analyze_compliance') == 1